@@ -13,7 +13,7 @@ import {
   Legend,
 } from 'chart.js';
 import DashboardLayout from '../layouts/DashboardLayout';
-import { dashboardService, userService, disputeService, providerService } from '../services/api';
+import { dashboardService, userService, disputeService } from '../services/api';
 import { withAuth } from '../context/AuthContext';
 
 
@@ -69,65 +69,35 @@ const Dashboard = () => {
     const fetchData = async () => {
       setLoading(true);
       try {
-        // En l'absence d'un endpoint spécifique pour les statistiques,
-        // nous allons simuler en récupérant les données brutes
-        const [usersResponse, providersResponse, disputesResponse] = await Promise.all([
-          userService.getAll(1, 100),
-          providerService.getAll(1, 100),
-          disputeService.getAll(1, 100),
+        // Compteurs et graphiques pré-agrégés par l'API ; les listes ne
+        // servent qu'aux cinq derniers litiges et inscriptions
+        const [statsResponse, usersResponse, disputesResponse] = await Promise.all([
+          dashboardService.getStats(),
+          userService.getAll(1, 5),
+          disputeService.getAll(1, 5),
         ]);
 
-        // Formater les données pour le tableau de bord
+        const data = statsResponse.data;
         const users = usersResponse.data.results || [];
-        const providers = providersResponse.data.results || [];
         const disputes = disputesResponse.data.results || [];
 
-        // Statistiques des disputes par statut
-        const disputesByStatus = {
-          open: disputes.filter(d => d.status === 'open').length,
-          under_review: disputes.filter(d => d.status === 'under_review').length,
-          resolved: disputes.filter(d => d.status === 'resolved').length,
-          closed: disputes.filter(d => d.status === 'closed').length,
-        };
-
-        // Inscriptions d'utilisateurs par mois (dernier semestre)
-        const today = new Date();
-        const labels = [];
-        const data = [];
-
-        // Générer les 6 derniers mois
-        for (let i = 5; i >= 0; i--) {
-          const month = new Date(today.getFullYear(), today.getMonth() - i, 1);
-          const monthName = month.toLocaleString('fr-FR', { month: 'short' });
-          labels.push(monthName);
-
-          // Compter les utilisateurs inscrits ce mois-ci
-          const startDate = new Date(month.getFullYear(), month.getMonth(), 1);
-          const endDate = new Date(month.getFullYear(), month.getMonth() + 1, 0);
-
-          const count = users.filter(user => {
-            const registrationDate = new Date(user.date_joined);
-            return registrationDate >= startDate && registrationDate <= endDate;
-          }).length;
-
-          data.push(count);
-        }
+        // Libellés des mois (AAAA-MM) au format court
+        const labels = data.user_registrations_by_month.labels.map((label) => {
+          const [year, month] = label.split('-');
+          return new Date(Number(year), Number(month) - 1, 1).toLocaleString('fr-FR', { month: 'short' });
+        });
 
         setStats({
-          totalUsers: users.length,
-          totalProviders: providers.length,
-          totalDisputes: disputes.length,
-          newUsersThisMonth: users.filter(user => {
-            const registrationDate = new Date(user.date_joined);
-            const firstDayOfMonth = new Date(today.getFullYear(), today.getMonth(), 1);
-            return registrationDate >= firstDayOfMonth;
-          }).length,
-          recentDisputes: disputes.slice(0, 5),
-          latestRegistrations: users.slice(0, 5),
-          disputesByStatus,
+          totalUsers: data.totals.users,
+          totalProviders: data.totals.providers,
+          totalDisputes: data.totals.disputes,
+          newUsersThisMonth: data.new_users_this_month,
+          recentDisputes: disputes,
+          latestRegistrations: users,
+          disputesByStatus: data.disputes_by_status,
           userRegistrationsByMonth: {
             labels,
-            data,
+            data: data.user_registrations_by_month.data,
           },
         });
       } catch (error) {
@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'angola_api.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importé après l'initialisation de Django
+from operation.realtime import EventStreamApp  # noqa: E402
+
+STREAM_PATH = '/api/stream/'
+
+event_stream = EventStreamApp()
+
+
+async def application(scope, receive, send):
+    # Flux temps réel (Server-Sent Events) servi hors de Django
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        await event_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'django_filters',
@@ -51,7 +52,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Durée, requêtes SQL, sérialisation et taille par vue (voir operation/instrumentation.py)
+    'operation.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Compression brotli/gzip des réponses (voir operation/middleware.py)
+    'operation.middleware.CompressionMiddleware',
+    # Lectures des requêtes GET sur les réplicas (voir operation/replicas.py)
+    'operation.replicas.ReplicaRoutingMiddleware',
+    # statement_timeout par vue, 503 sur dépassement (voir operation/timeouts.py)
+    'operation.timeouts.StatementTimeoutMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -88,7 +97,8 @@ WSGI_APPLICATION = 'angola_api.wsgi.application'
 # Configuration de Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Identité de l'utilisateur lue dans le cache (voir operation/authentication.py)
+        'operation.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -98,13 +108,34 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        # orjson si installé, sinon rendu JSON standard de DRF
+        'operation.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 
     'UNICODE_JSON': True,
     'COMPACT_JSON': True,
+    # Proxys de confiance devant l'application : l'adresse du client est l'entrée de
+    # X-Forwarded-For ajoutée par le dernier d'entre eux (0 : REMOTE_ADDR)
+    'NUM_PROXIES': SECRETS.get('NUM_PROXIES', 0),
+    # Connexion : tentatives par IP, échecs par compte (voir operation/throttles.py)
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_account': '10/hour',
+    },
 }
 
+# Compression des réponses (operation.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = 1024  # octets ; en dessous, la réponse est envoyée telle quelle
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5  # 11 est le maximum, mais trop lent pour des réponses dynamiques
+# Contre BREACH : nom de fichier gzip aléatoire (0 à N octets) et chemins jamais compressés (jetons)
+COMPRESSION_MAX_RANDOM_BYTES = 100
+COMPRESSION_EXCLUDED_PATHS = ('/api/auth/',)
+
 # Configuration de Simple JWT
 from datetime import timedelta
 
@@ -132,6 +163,51 @@ SIMPLE_JWT = {
     'JTI_CLAIM': 'jti',
 }
 
+# Cache : mémoire locale par défaut, Redis (partagé entre workers) si REDIS_URL est configuré
+if SECRETS.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': SECRETS['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'angola-api',
+        }
+    }
+API_CACHE_ALIAS = 'default'
+API_CACHE_TIMEOUT = 300  # secondes, réponses des viewsets publics (voir operation/caching.py)
+
+# File de tâches d'arrière-plan (voir operation/tasks.py et la commande run_tasks)
+TASKS_EAGER = False  # True : exécution immédiate dans la requête (tests)
+TASKS_MAX_ATTEMPTS = 5
+TASKS_BACKOFF_BASE = 30  # secondes, doublé à chaque échec
+TASKS_BACKOFF_MAX = 3600
+TASKS_LOCK_TIMEOUT = 600  # au-delà, une tâche « en cours » est reprise par un autre worker
+
+# Synchronisation incrémentale de l'application mobile (/api/sync/, voir operation/sync.py)
+SYNC_SETTLE_SECONDS = 2  # délai avant qu'une modification soit servie
+SYNC_TOMBSTONE_RETENTION_DAYS = 90
+
+# Métriques Prometheus (/metrics, voir operation/metrics.py). Le cache doit
+# être partagé (Redis) pour agréger plusieurs workers.
+METRICS_CACHE_ALIAS = 'default'
+METRICS_TOKEN = SECRETS.get('METRICS_TOKEN')
+# Chaque worker reporte ses observations dans le cache au plus toutes les N secondes
+METRICS_FLUSH_INTERVAL = 5
+
+# Identité des utilisateurs authentifiés par JWT (voir operation/authentication.py)
+AUTH_CACHE_ALIAS = 'default'
+AUTH_USER_CACHE_TIMEOUT = 300  # secondes ; borne le délai des modifications faites hors signaux
+
+# Canal temps réel (Server-Sent Events sur /api/stream/, voir asgi.py)
+REALTIME_BROKER = 'operation.realtime.InProcessBroker'
+REALTIME_HEARTBEAT = 15  # secondes
+REALTIME_TICKET_TIMEOUT = 30  # validité d'un ticket d'ouverture du flux, en secondes
+
 # Configuration CORS
 CORS_ALLOW_ALL_ORIGINS = True  # Pour le développement uniquement, limitez en production
 CORS_ALLOW_CREDENTIALS = True
@@ -160,8 +236,27 @@ DATABASES = {
         'OPTIONS': {
             'client_encoding': 'UTF8',
         },
+        # Connexions persistantes (ni TLS ni authentification à chaque requête),
+        # vérifiées avant réutilisation après une erreur ou une coupure
+        'CONN_MAX_AGE': SECRETS.get('CONN_MAX_AGE', 60),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+# Limite des requêtes SQL pendant une requête HTTP, surchargée par l'attribut
+# `statement_timeout` des vues (voir operation/timeouts.py)
+DATABASE_STATEMENT_TIMEOUT = 10  # secondes
+
+# Réplicas en lecture (voir operation/replicas.py) : chaque entrée de
+# SECRETS['REPLICAS'] complète les paramètres de 'default' (HOST, PORT...).
+# En test, un réplica est par défaut un miroir de 'default'.
+for index, replica in enumerate(SECRETS.get('REPLICAS', [])):
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}, **replica}
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['operation.replicas.ReplicaRouter']
+# Un client qui vient d'écrire lit sur le primaire pendant cette durée (supérieure au retard toléré)
+REPLICA_PIN_SECONDS = 5
+REPLICA_MAX_LAG = 2  # secondes
+REPLICA_LAG_CHECK_INTERVAL = 5  # secondes, par worker
 
 
 # Configuration pour l'envoi d'emails
@@ -176,6 +271,18 @@ DEFAULT_FROM_EMAIL = 'Angola App <spinnaldev@gmail.com>'
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
+# Hachage des mots de passe : le premier hasher sert aux nouveaux hashs, les
+# autres ne font que vérifier les anciens (rehachés à la connexion suivante)
+PASSWORD_HASHERS = [
+    'operation.passwords.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# Facteur de travail PBKDF2 ; chaque connexion coûte un hash (voir password_hash_seconds sur /metrics)
+PASSWORD_PBKDF2_ITERATIONS = 1_000_000
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
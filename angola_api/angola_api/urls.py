@@ -18,7 +18,6 @@ from django.contrib import admin
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
     TokenRefreshView,
     
 )
@@ -48,7 +47,7 @@ urlpatterns = [
     path('', include(router.urls)),
     path('api/auth/login/', views.LoginView.as_view(), name='login'),  # Nouveau: endpoint de connexion
     path('api/auth/register/', views.RegisterView.as_view(), name='register'),
-    path('api/auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/auth/token/', views.TokenView.as_view(), name='token_obtain_pair'),
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
     # Password reset endpoints
@@ -62,6 +61,12 @@ urlpatterns = [
     path('providers/by_category/', views.ProviderByCategoryView.as_view(), name='provider-by-category'),
     path('providers/by_subcategory/', views.ProviderBySubcategoryView.as_view(), name='provider-by-subcategory'),
     path('providers/nearby/', views.NearbyProvidersView.as_view(), name='nearby-providers'),
+    path('api/search/', views.SearchView.as_view(), name='search'),
+    path('api/catalog/tree/', views.CatalogTreeView.as_view(), name='catalog-tree'),
+    path('api/sync/', views.SyncView.as_view(), name='sync'),
+    path('api/dashboard/stats/', views.DashboardStatsView.as_view(), name='dashboard-stats'),
+    path('api/stream/ticket/', views.StreamTicketView.as_view(), name='stream-ticket'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,99 @@
+"""
+Authentification JWT sans lecture de la table des utilisateurs à chaque requête.
+
+JWTAuthentication charge la ligne de l'utilisateur à chaque requête, et les
+vues qui testent `hasattr(user, 'provider_profile')` en ajoutent une seconde.
+CachedJWTAuthentication garde dans le cache (settings.AUTH_CACHE_ALIAS) les
+champs d'identité de l'utilisateur et l'id de son profil prestataire pendant
+AUTH_USER_CACHE_TIMEOUT secondes, et reconstruit à partir d'eux une instance
+partielle de User :
+
+- `id`, `username`, `role`, `is_staff`, `is_superuser`, `is_active` et
+  `provider_profile.id` sont lus sans requête ;
+- le premier autre champ lu (email, compteur de notifications...) charge
+  tous les champs restants en une requête ;
+- `user.provider_profile` est une instance partielle de Provider (id et
+  user_id) qui se complète de la même manière.
+
+Les signaux post_save / post_delete de User et de Provider invalident
+l'entrée (voir signals.py). Une mise à jour par `QuerySet.update()` ne passe
+pas par les signaux : elle n'est visible qu'à l'expiration de l'entrée.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import Provider, User
+
+KEY_PREFIX = 'auth:user'
+# Champs d'identité conservés dans le cache ; les modifier invalide l'entrée
+IDENTITY_FIELDS = ('id', 'username', 'role', 'is_staff', 'is_superuser', 'is_active')
+
+
+def get_cache():
+    return caches[getattr(settings, 'AUTH_CACHE_ALIAS', 'default')]
+
+
+def _key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def load_identity(user_id):
+    """Identité de l'utilisateur `user_id` (une requête en cas d'absence du cache), ou None."""
+    cache = get_cache()
+    identity = cache.get(_key(user_id))
+    if identity is None:
+        # Lue sur le primaire : un réplica en retard remettrait en cache l'état d'avant l'invalidation
+        identity = (
+            User.objects.using(DEFAULT_DB_ALIAS).filter(pk=user_id)
+            .values(*IDENTITY_FIELDS, provider_id=F('provider_profile__id'))
+            .first()
+        )
+        if identity is not None:
+            cache.set(_key(user_id), identity, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+    return identity
+
+
+def build_user(identity):
+    """Instance partielle de User (et de son profil prestataire) sans requête."""
+    # from_db attend les valeurs dans l'ordre des champs du modèle
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in IDENTITY_FIELDS]
+    user = User.from_db(DEFAULT_DB_ALIAS, field_names, [identity[name] for name in field_names])
+    provider = None
+    if identity['provider_id'] is not None:
+        provider = Provider.from_db(DEFAULT_DB_ALIAS, ('id', 'user_id'), (identity['provider_id'], user.pk))
+        Provider._meta.get_field('user').set_cached_value(provider, user)
+    # Relation inverse mise en cache : hasattr(user, 'provider_profile') ne fait pas de requête
+    User._meta.get_field('provider_profile').set_cached_value(user, provider)
+    return user
+
+
+def invalidate(user_id):
+    """Oublie l'identité en cache de `user_id`, maintenant et après la transaction en cours."""
+    cache = get_cache()
+    cache.delete(_key(user_id))
+    # Une requête concurrente a pu remettre en cache l'état d'avant la validation
+    transaction.on_commit(lambda: cache.delete(_key(user_id)))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN or api_settings.USER_ID_FIELD != 'id':
+            # La révocation compare le hash du mot de passe, qui n'est pas en cache
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        identity = load_identity(user_id)
+        if identity is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not identity['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return build_user(identity)
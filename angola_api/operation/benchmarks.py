@@ -0,0 +1,209 @@
+"""
+Mesure des points d'accès les plus sollicités (commande run_benchmarks).
+
+Les requêtes passent en mémoire par django.test.Client, donc par toute la
+pile de middlewares, de l'authentification et des vues, sans serveur HTTP :
+on peut ainsi compter les requêtes SQL de chaque appel. Les paramètres
+(prestataire, conversation, terme de recherche...) sont tirés au hasard
+dans la base avec une graine fixe, et les connexions utilisent les comptes
+générés par seed_data (voir seeding.py).
+
+Le rapport JSON donne, par scénario, les percentiles p50 / p95 / p99 de la
+durée, le nombre de requêtes SQL et la taille des réponses. compare()
+le confronte à un rapport de référence.
+"""
+import json
+import platform
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from django.utils import timezone
+
+from . import seeding
+from .models import Conversation, Provider, User
+
+PERCENTILES = (50, 95, 99)
+# Identifiants candidats chargés par type d'objet
+SAMPLE_SIZE = 1000
+SEARCH_TERMS = ('plomberie', 'électricien', 'ménage', 'réparation', 'coiffure', 'urgence', 'domicile')
+
+
+def percentile(values, rank):
+    """Percentile `rank` (0-100) de `values`, par interpolation linéaire."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * rank / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _sample(queryset, fields, rng, size=SAMPLE_SIZE):
+    """Jusqu'à `size` lignes consécutives à partir d'une clé primaire tirée au hasard."""
+    bounds = queryset.order_by('pk').values_list('pk', flat=True)
+    first, last = bounds.first(), bounds.last()
+    if first is None:
+        return []
+    start = rng.randint(first, last)
+    rows = list(queryset.filter(pk__gte=start).order_by('pk').values_list(*fields)[:size])
+    if len(rows) < size:
+        rows += list(queryset.filter(pk__lt=start).order_by('pk').values_list(*fields)[:size - len(rows)])
+    return rows
+
+
+class QueryCounter:
+    """execute_wrapper qui compte les requêtes SQL, toutes connexions confondues."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Scenario:
+    """Point d'accès mesuré : `build(rng)` retourne (méthode, chemin, données, en-têtes) d'un appel."""
+
+    def __init__(self, name, build):
+        self.name = name
+        self.build = build
+
+
+def build_scenarios(rng):
+    """Scénarios réalisables avec les données en base, et noms de ceux qui ne le sont pas."""
+    providers = [pk for pk, in _sample(Provider.objects.all(), ('pk',), rng)]
+    located = _sample(Provider.objects.filter(latitude__isnull=False), ('latitude', 'longitude'), rng)
+    conversations = _sample(Conversation.objects.all(), ('pk', 'client_id'), rng)
+    seeded_clients = seeding.seed_users().filter(role='client')
+    logins = [email for email, in _sample(seeded_clients, ('email',), rng)]
+    users = [pk for pk, in _sample(User.objects.all(), ('pk',), rng)]
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 10
+    pages = max(1, min(10, Provider.objects.count() // page_size))
+
+    def client_address():
+        # Une adresse par appel : la limite de tentatives par IP ne doit pas fausser la mesure
+        return {'REMOTE_ADDR': f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}'}
+
+    candidates = [
+        ('provider_list', providers, lambda: ('get', f'/api/providers/?page={rng.randint(1, pages)}', None, {})),
+        ('provider_detail', providers, lambda: ('get', f'/api/providers/{rng.choice(providers)}/', None, {})),
+        ('nearby', located, lambda: ('get', '/providers/nearby/?latitude={}&longitude={}&radius=10&limit=20'.format(
+            *rng.choice(located)), None, {})),
+        ('search', True, lambda: ('get', f'/api/search/?q={rng.choice(SEARCH_TERMS)}', None, {})),
+        ('conversation_inbox', conversations, lambda: (
+            'get', '/api/conversations/?user_id={1}'.format(*rng.choice(conversations)), None, {})),
+        ('conversation_messages', conversations, lambda: (
+            'get', '/api/conversations/{0}/messages/?user_id={1}'.format(*rng.choice(conversations)), None, {})),
+        ('notification_count', users, lambda: (
+            'get', f'/notifications/count/?user_id={rng.choice(users)}', None, {})),
+        ('login', logins, lambda: (
+            'post', '/api/auth/login/', {'email': rng.choice(logins), 'password': seeding.PASSWORD},
+            client_address())),
+    ]
+    available = {name: Scenario(name, build) for name, data, build in candidates if data}
+    missing = [name for name, data, _ in candidates if not data]
+    return available, missing
+
+
+def measure(client, scenario, requests, warmup=0, accept_encoding='gzip'):
+    """Exécute `warmup` appels non comptés puis `requests` appels mesurés du scénario."""
+    latencies, queries, sizes, errors = [], [], [], 0
+    for iteration in range(warmup + requests):
+        method, path, data, extra = scenario.build()
+        if accept_encoding:
+            extra = {'HTTP_ACCEPT_ENCODING': accept_encoding, **extra}
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            start = time.perf_counter()
+            if method == 'post':
+                response = client.post(path, data, content_type='application/json', **extra)
+            else:
+                response = client.get(path, **extra)
+            content = response.content if not response.streaming else b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        if iteration < warmup:
+            continue
+        latencies.append(elapsed * 1000)
+        queries.append(counter.count)
+        sizes.append(len(content))
+        errors += response.status_code >= 400
+    return {
+        'requests': requests,
+        'errors': errors,
+        'latency_ms': {
+            **{f'p{rank}': round(percentile(latencies, rank), 3) for rank in PERCENTILES},
+            'mean': round(sum(latencies) / requests, 3),
+            'max': round(max(latencies), 3),
+        },
+        'queries': {'mean': round(sum(queries) / requests, 2), 'max': max(queries)},
+        'bytes': {'mean': round(sum(sizes) / requests), 'max': max(sizes)},
+    }
+
+
+def run(names=None, requests=100, warmup=10, seed=0, accept_encoding='gzip'):
+    """Rapport des scénarios `names` (tous si None) ; retourne (rapport, scénarios ignorés)."""
+    rng = random.Random(seed)
+    scenarios, missing = build_scenarios(rng)
+    if names is not None:
+        missing = [name for name in missing if name in names]
+        scenarios = {name: scenario for name, scenario in scenarios.items() if name in names}
+    client = Client(raise_request_exception=False)
+    report = {
+        'created_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'database': connections['default'].vendor,
+            'debug': settings.DEBUG,
+        },
+        'settings': {'requests': requests, 'warmup': warmup, 'seed': seed, 'accept_encoding': accept_encoding},
+        'scenarios': {
+            name: measure(client, scenario, requests, warmup, accept_encoding)
+            for name, scenario in scenarios.items()
+        },
+    }
+    return report, missing
+
+
+def compare(report, baseline, tolerance=0.2):
+    """
+    Régressions de `report` par rapport à `baseline` : percentile de durée
+    ou taille moyenne des réponses plus de `tolerance` fois au-dessus de la
+    référence, ou davantage de requêtes SQL (sans tolérance), par scénario
+    présent dans les deux rapports. Retourne une liste de messages.
+    """
+    regressions = []
+    for name, current in report['scenarios'].items():
+        reference = baseline.get('scenarios', {}).get(name)
+        if reference is None:
+            continue
+        for rank in PERCENTILES:
+            key = f'p{rank}'
+            before, after = reference['latency_ms'][key], current['latency_ms'][key]
+            if after > before * (1 + tolerance):
+                regressions.append(f"{name} : {key} {before:.1f} ms -> {after:.1f} ms")
+        before, after = reference['queries']['max'], current['queries']['max']
+        if after > before:
+            regressions.append(f"{name} : {before} -> {after} requêtes SQL")
+        before, after = reference['bytes']['mean'], current['bytes']['mean']
+        if after > before * (1 + tolerance):
+            regressions.append(f"{name} : {before} -> {after} octets")
+    return regressions
+
+
+def load(path):
+    with open(path, encoding='utf-8') as report_file:
+        return json.load(report_file)
+
+
+def dump(report, path):
+    with open(path, 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, indent=2, ensure_ascii=False)
+        report_file.write('\n')
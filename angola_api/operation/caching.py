@@ -0,0 +1,190 @@
+"""
+Cache des réponses en lecture seule des viewsets publics.
+
+Chaque réponse est rangée sous une clé dérivée de la méthode, de l'hôte, du
+chemin, des paramètres de requête (pagination comprise) et du format de rendu
+négocié (Accept ou ?format=), dont dépendent le corps et l'ETag, préfixée par la
+version des groupes dont elle dépend (`providers`, `services`, `reviews`).
+Invalider un groupe revient à incrémenter sa version : les anciennes entrées
+ne sont plus jamais lues et expirent d'elles-mêmes. Les signaux post_save /
+post_delete des modèles concernés déclenchent ces invalidations (voir
+signals.py).
+
+Le backend est celui de `settings.API_CACHE_ALIAS` : mémoire locale par
+défaut, Redis dès que REDIS_URL est configuré, ce qui partage le cache et
+les verrous anti-stampede entre les workers.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from . import replicas
+
+KEY_PREFIX = 'api'
+# Durée maximale du calcul d'une entrée par le worker qui détient le verrou
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def default_timeout():
+    return getattr(settings, 'API_CACHE_TIMEOUT', 300)
+
+
+def _version_key(group):
+    return f'{KEY_PREFIX}:version:{group}'
+
+
+def group_versions(groups):
+    """Versions courantes des groupes, initialisées si absentes du cache."""
+    cache = get_cache()
+    keys = [_version_key(group) for group in groups]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Une version horodatée ne retombe jamais sur une ancienne valeur
+            # si la clé de version a été évincée du cache
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _invalidated_key(group):
+    return f'{KEY_PREFIX}:invalidated:{group}'
+
+
+def bump(*groups):
+    cache = get_cache()
+    for group in groups:
+        try:
+            cache.incr(_version_key(group))
+        except ValueError:
+            cache.set(_version_key(group), time.time_ns(), None)
+    # Un réplica peut encore servir l'état d'avant pendant ce délai (voir replicas.py)
+    cache.set_many({_invalidated_key(group): 1 for group in groups}, replicas.pin_seconds())
+
+
+def recently_invalidated(groups):
+    return bool(get_cache().get_many([_invalidated_key(group) for group in groups]))
+
+
+def invalidate(*groups):
+    """Invalide les groupes après la validation de la transaction courante."""
+    if groups:
+        transaction.on_commit(lambda: bump(*groups))
+
+
+def make_key(groups, request, extra=''):
+    params = sorted(
+        (name, value)
+        for name in request.query_params
+        for value in request.query_params.getlist(name)
+    )
+    renderer = getattr(request, 'accepted_renderer', None)
+    raw = repr((
+        request.method, request.get_host(), request.path, params,
+        getattr(renderer, 'format', None), extra,
+    ))
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    versions = '.'.join(str(version) for version in group_versions(groups))
+    return f"{KEY_PREFIX}:{'+'.join(groups)}:{versions}:{digest}"
+
+
+def get_or_compute(key, compute, timeout=None):
+    """
+    Retourne la valeur en cache ou la calcule. Un seul appelant calcule une
+    clé absente (verrou posé par cache.add) ; les autres attendent son
+    résultat au plus LOCK_TIMEOUT secondes avant de calculer eux-mêmes.
+    Une valeur None n'est pas mise en cache.
+    """
+    cache = get_cache()
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            if cache.get(lock_key) is None:
+                break
+        return compute()
+
+    try:
+        value = compute()
+        if value is not None:
+            cache.set(key, value, default_timeout() if timeout is None else timeout)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+class CachedResponseMixin:
+    """
+    Met en cache les réponses 200 de `list` et `retrieve` pour les
+    utilisateurs anonymes. Les vues déclarent les groupes dont dépend leur
+    contenu dans `cache_groups`.
+
+    Les validateurs HTTP (ETag, Last-Modified) sont conservés avec la
+    réponse : une revalidation servie depuis le cache ne coûte aucune
+    requête SQL.
+    """
+    cache_groups = ()
+    cache_timeout = None
+    cached_headers = ('ETag', 'Last-Modified')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def is_cacheable(self, request):
+        return bool(self.cache_groups) and request.method == 'GET' and not request.user.is_authenticated
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        uncached = []
+
+        def compute():
+            # La nouvelle entrée est lue sur le primaire tant que les réplicas peuvent être en retard
+            if recently_invalidated(self.cache_groups):
+                replicas.use_primary()
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                uncached.append(response)
+                return None
+            headers = {name: response[name] for name in self.cached_headers if response.has_header(name)}
+            return {'data': response.data, 'headers': headers}
+
+        key = make_key(self.cache_groups, request, extra=(self.action, sorted(kwargs.items())))
+        entry = get_or_compute(key, compute, self.cache_timeout)
+        if uncached:
+            return uncached[0]
+
+        headers = entry['headers']
+        last_modified = headers.get('Last-Modified')
+        response = get_conditional_response(
+            request, etag=headers.get('ETag'),
+            last_modified=parse_http_date_safe(last_modified) if last_modified else None,
+        )
+        if response is None:
+            response = Response(entry['data'])
+        for name, value in headers.items():
+            response[name] = value
+        return response
@@ -0,0 +1,73 @@
+"""
+Arborescence du catalogue (catégories, sous-catégories et nombre de services
+disponibles) servie en une seule réponse depuis le cache.
+
+L'entrée est invalidée par les signaux de Category, SubCategory et
+ProviderService (voir signals.py). Son ETag est l'empreinte du contenu, ce
+qui permet aux clients de revalider leur copie (réponse 304).
+"""
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import caching
+from .models import Category, SubCategory
+
+CACHE_KEY = 'catalog:tree'
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def build_tree():
+    """Construit l'arborescence en deux requêtes."""
+    subcategories = {}
+    for subcategory in SubCategory.objects.annotate(
+        service_count=Count('providerservice', filter=Q(providerservice__is_available=True))
+    ).order_by('name', 'id'):
+        subcategories.setdefault(subcategory.category_id, []).append({
+            'id': subcategory.id,
+            'name': subcategory.name,
+            'description': subcategory.description,
+            'icon': subcategory.icon,
+            'service_count': subcategory.service_count,
+        })
+
+    categories = []
+    for category in Category.objects.order_by('name', 'id'):
+        children = subcategories.get(category.id, [])
+        categories.append({
+            'id': category.id,
+            'name': category.name,
+            'description': category.description,
+            'icon': category.icon,
+            'image_url': category.image_url,
+            'service_count': sum(child['service_count'] for child in children),
+            'subcategories': children,
+        })
+    return categories
+
+
+def build_entry():
+    categories = build_tree()
+    body = json.dumps(categories, cls=DjangoJSONEncoder, sort_keys=True).encode('utf-8')
+    return {
+        'version': hashlib.sha1(body).hexdigest(),
+        'last_modified': timezone.now().replace(microsecond=0),
+        'categories': categories,
+    }
+
+
+def get_tree():
+    """
+    Retourne l'entrée en cache {'version', 'last_modified', 'categories'},
+    reconstruite par un seul worker lorsqu'elle est absente.
+    """
+    return caching.get_or_compute(CACHE_KEY, build_entry, CACHE_TIMEOUT)
+
+
+def invalidate():
+    """Supprime l'arborescence en cache après la validation de la transaction."""
+    transaction.on_commit(lambda: caching.get_cache().delete(CACHE_KEY))
@@ -0,0 +1,155 @@
+"""
+Requêtes conditionnelles (ETag / Last-Modified) sur les viewsets.
+
+Les validateurs sont calculés à partir des seules lignes de la page (ou de
+l'objet d'un détail), chargées comme pour la réponse, avant toute
+sérialisation : identifiants et updated_at des lignes, et métadonnées de
+pagination (nombre total, liens, curseurs). Un client qui renvoie l'ETag
+reçu (If-None-Match) obtient un 304 sans que la réponse soit sérialisée.
+
+Les vues déclarent les relations dont les données sont sérialisées :
+`conditional_related_fields` pour les clés étrangères (leur updated_at est
+pris en compte, ex. 'user'), `conditional_related_sets` pour les relations
+inverses (identifiants et updated_at des lignes liées, ce qui détecte aussi
+les suppressions, ex. 'provider_services', ou l'attribut `to_attr` d'un
+Prefetch). Une relation inverse déjà préchargée par la vue ne coûte aucune
+requête, les autres une requête d'agrégat limitée aux lignes de la page.
+
+Last-Modified n'est envoyé que pour un détail sans relation inverse : l'ajout
+d'une ligne liée peut ne pas changer la plus grande date, sa suppression ne la
+change jamais, et seul l'ETag les valide.
+"""
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def _has_updated_at(model):
+    try:
+        model._meta.get_field('updated_at')
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+def _stamp(obj):
+    return obj.pk, getattr(obj, 'updated_at', None)
+
+
+def _related_objects(row, path):
+    """Objet lié par `path` ('provider__user'), chargé comme le ferait le sérialiseur."""
+    for name in path.split('__'):
+        row = getattr(row, name, None)
+        if row is None:
+            return None
+    return row
+
+
+def _prefetched(row, name):
+    """Lignes liées déjà chargées par prefetch_related (ou Prefetch(to_attr=`name`)), sinon None."""
+    cache = getattr(row, '_prefetched_objects_cache', {})
+    if name in cache:
+        return cache[name]
+    value = row.__dict__.get(name)
+    return value if isinstance(value, list) else None
+
+
+def _related_set_stamps(rows, name):
+    """Empreinte de la relation inverse `name` des lignes `rows`."""
+    prefetched = [_prefetched(row, name) for row in rows]
+    if all(objects is not None for objects in prefetched):
+        return tuple(tuple(_stamp(obj) for obj in objects) for objects in prefetched)
+
+    relation = type(rows[0])._meta.get_field(name)
+    aggregates = {'count': Count('pk')}
+    if _has_updated_at(relation.related_model):
+        aggregates['last'] = Max('updated_at')
+    values = relation.related_model._default_manager.filter(
+        **{f'{relation.field.name}__in': [row.pk for row in rows]}
+    ).order_by().aggregate(**aggregates)
+    return values['count'], values.get('last')
+
+
+def validators(rows, related_fields=(), related_sets=()):
+    """
+    Retourne (plus grand updated_at, empreinte) des lignes `rows` déjà
+    chargées et de leurs relations.
+    """
+    stamps = [_stamp(row) for row in rows]
+    for name in related_fields:
+        stamps += [_stamp(obj) for obj in (_related_objects(row, name) for row in rows) if obj is not None]
+    fingerprint = [tuple(stamps)]
+    if rows:
+        fingerprint += [_related_set_stamps(rows, name) for name in related_sets]
+
+    dates = [stamp for _, stamp in stamps if stamp is not None]
+    return (max(dates) if dates else None), fingerprint
+
+
+class ConditionalGetMixin:
+    """
+    Ajoute ETag (et Last-Modified pour un détail sans relation inverse) aux
+    réponses de `list` et `retrieve`, et répond 304 quand le client a déjà la version courante.
+    À placer après CachedResponseMixin, qui conserve ces en-têtes avec la
+    réponse mise en cache.
+    """
+    conditional_related_fields = ()
+    conditional_related_sets = ()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset if page is None else page)
+        # Nombre total, liens et curseurs : tout ce que la réponse contient hors résultats
+        pagination = None if page is None else self.get_paginated_response([]).data
+
+        def respond():
+            serializer = self.get_serializer(rows, many=True)
+            if page is None:
+                return Response(serializer.data)
+            return self.get_paginated_response(serializer.data)
+
+        return self.conditional_response(queryset.model, rows, pagination, False, respond)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return self.conditional_response(
+            type(instance), [instance], None, True, lambda: Response(self.get_serializer(instance).data)
+        )
+
+    def get_conditional_relations(self):
+        return self.conditional_related_fields, self.conditional_related_sets
+
+    def conditional_response(self, model, rows, pagination, detail, respond):
+        request = self.request
+        if request.method not in ('GET', 'HEAD') or not _has_updated_at(model):
+            return respond()
+
+        related_fields, related_sets = self.get_conditional_relations()
+        last_modified, fingerprint = validators(rows, related_fields, related_sets)
+        renderer = getattr(request, 'accepted_renderer', None)
+        raw = repr((
+            request.get_full_path(), request.user.pk, getattr(renderer, 'format', None),
+            pagination, fingerprint,
+        ))
+        etag = f'W/"{hashlib.sha1(raw.encode("utf-8")).hexdigest()}"'
+        # Une suppression ne change pas le plus grand updated_at d'une liste ni
+        # d'une relation inverse : seul l'ETag (qui liste les lignes) la valide
+        timestamp = None
+        if detail and last_modified and not related_sets:
+            # À la seconde, comme l'en-tête : sinon If-Modified-Since ne correspond jamais
+            timestamp = int(last_modified.timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = respond()
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
@@ -0,0 +1,142 @@
+"""
+Outils géographiques : encodage geohash des coordonnées des prestataires et
+distance haversine calculée par la base de données.
+
+Le geohash est stocké dans une colonne indexée (B-tree) : une recherche par
+rayon se ramène à quelques préfixes (la cellule centrale et ses 8 voisines),
+puis la distance exacte est calculée et triée en SQL.
+"""
+import math
+
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 12
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_BASE32_INDEX = {c: i for i, c in enumerate(_BASE32)}
+
+# Dimensions approximatives (hauteur, largeur à l'équateur) d'une cellule en km
+_CELL_SIZES_KM = {
+    1: (4992.6, 5009.4),
+    2: (624.1, 1252.3),
+    3: (156.0, 156.5),
+    4: (19.5, 39.1),
+    5: (4.89, 4.89),
+    6: (0.61, 1.22),
+    7: (0.153, 0.153),
+    8: (0.019, 0.038),
+}
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Encode une position en geohash."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    latitude = float(latitude)
+    longitude = float(longitude)
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        rng, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(geohash)
+
+
+def decode(geohash):
+    """Retourne (latitude, longitude, demi-hauteur, demi-largeur) de la cellule."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (
+        (lat_range[0] + lat_range[1]) / 2,
+        (lng_range[0] + lng_range[1]) / 2,
+        (lat_range[1] - lat_range[0]) / 2,
+        (lng_range[1] - lng_range[0]) / 2,
+    )
+
+
+def neighbors(geohash):
+    """Retourne la cellule et ses 8 voisines (sans doublons)."""
+    latitude, longitude, half_lat, half_lng = decode(geohash)
+    cells = []
+    for dlat in (-1, 0, 1):
+        for dlng in (-1, 0, 1):
+            lat = latitude + dlat * 2 * half_lat
+            if lat > 90 or lat < -90:
+                continue
+            lng = (longitude + dlng * 2 * half_lng + 180) % 360 - 180
+            cell = encode(lat, lng, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def precision_for_radius(radius_km, latitude):
+    """
+    Plus grande précision dont les cellules couvrent le rayon : le cercle de
+    recherche est alors entièrement contenu dans la cellule centrale et ses
+    voisines. Retourne 0 si le rayon est trop grand pour un filtrage utile.
+    """
+    lng_factor = max(math.cos(math.radians(float(latitude))), 0.01)
+    for precision in sorted(_CELL_SIZES_KM, reverse=True):
+        height, width = _CELL_SIZES_KM[precision]
+        if min(height, width * lng_factor) >= radius_km:
+            return precision
+    return 0
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """Préfixes geohash couvrant le cercle de rayon `radius_km`."""
+    precision = precision_for_radius(radius_km, latitude)
+    if not precision:
+        return []
+    return neighbors(encode(latitude, longitude, precision))
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distance haversine en km entre deux points (calcul Python)."""
+    lat1, lng1, lat2, lng2 = map(lambda v: math.radians(float(v)), (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def haversine_expression(latitude, longitude, lat_field='latitude', lng_field='longitude'):
+    """Expression SQL de la distance haversine (km) vers le point donné."""
+    origin_lat = math.radians(float(latitude))
+    origin_lng = math.radians(float(longitude))
+    lat = Radians(Cast(F(lat_field), FloatField()))
+    lng = Radians(Cast(F(lng_field), FloatField()))
+    half_dlat = (lat - Value(origin_lat)) / Value(2.0)
+    half_dlng = (lng - Value(origin_lng)) / Value(2.0)
+    a = (
+        Power(Sin(half_dlat), 2)
+        + Value(math.cos(origin_lat)) * Cos(lat) * Power(Sin(half_dlng), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
@@ -0,0 +1,146 @@
+"""
+Déclinaisons des images envoyées par les utilisateurs.
+
+Chaque image (service, galerie, portfolio, avis, photo de profil) est
+déclinée en trois tailles (thumb, medium, large), en WebP et en JPEG, à côté
+de l'original : `service_images/photo.jpg` donne par exemple
+`service_images/photo_jpg_thumb.webp`. L'extension de l'original fait partie
+du nom, pour que `photo.jpg` et `photo.png` d'un même dossier ne partagent
+pas leurs déclinaisons. L'orientation EXIF est appliquée puis les
+métadonnées sont retirées. L'original n'est pas modifié. Une fois les
+déclinaisons générées, le nom de l'image est enregistré dans le champ
+`variants_source` du modèle : les URLs sont construites sans interroger le
+stockage.
+"""
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Plus grande dimension (px) de chaque taille ; une image plus petite n'est pas agrandie
+SIZES = {
+    'thumb': 200,
+    'medium': 600,
+    'large': 1200,
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Champ de chaque modèle ci-dessous : nom de l'image dont les déclinaisons existent
+VARIANTS_FIELD = 'variants_source'
+# (modèle, champ image) déclinés automatiquement, voir signals.py
+IMAGE_FIELDS = (
+    ('operation.ProviderService', 'image'),
+    ('operation.ServiceGalleryImage', 'image'),
+    ('operation.Portfolio', 'image'),
+    ('operation.ReviewImage', 'image'),
+    ('operation.User', 'profile_picture'),
+)
+
+
+def variant_name(name, size, fmt):
+    root, extension = os.path.splitext(name)
+    if extension:
+        root = f'{root}_{extension[1:]}'
+    return f'{root}_{size}.{fmt}'
+
+
+def has_variants(field_file):
+    """
+    Les déclinaisons de l'image courante ont été générées : lu sur le modèle
+    (`variants_source`, voir record_variants), sans appel au stockage.
+    """
+    return getattr(field_file.instance, VARIANTS_FIELD, None) == field_file.name
+
+
+def stored_variants(field_file):
+    """Les fichiers des déclinaisons sont présents sur le stockage (dernière générée : thumb JPEG)."""
+    smallest = min(SIZES, key=SIZES.get)
+    return field_file.storage.exists(variant_name(field_file.name, smallest, list(FORMATS)[-1]))
+
+
+def generate_variants(field_file, overwrite=False):
+    """
+    Génère les déclinaisons de `field_file` et retourne leurs noms
+    {taille: {format: nom}}, ou None si le fichier n'est pas une image lisible.
+    """
+    if not field_file or (not overwrite and has_variants(field_file)):
+        return None
+    storage = field_file.storage
+    try:
+        with storage.open(field_file.name, 'rb') as source:
+            image = Image.open(source)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, UnidentifiedImageError) as exc:
+        logger.warning("Déclinaisons impossibles pour %s : %s", field_file.name, exc)
+        return None
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    names = {}
+    # Du plus grand au plus petit : chaque réduction part de la précédente
+    resized = image
+    for size, max_side in sorted(SIZES.items(), key=lambda item: -item[1]):
+        resized = resized.copy()
+        resized.thumbnail((max_side, max_side), Image.LANCZOS)
+        names[size] = {}
+        for fmt, (pil_format, options) in FORMATS.items():
+            frame = resized
+            if pil_format == 'JPEG' and frame.mode != 'RGB':
+                background = Image.new('RGB', frame.size, (255, 255, 255))
+                background.paste(frame, mask=frame.getchannel('A'))
+                frame = background
+            buffer = io.BytesIO()
+            # Aucune métadonnée n'est transmise : les EXIF (GPS, appareil) disparaissent
+            frame.save(buffer, pil_format, **options)
+            name = variant_name(field_file.name, size, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            names[size][fmt] = storage.save(name, ContentFile(buffer.getvalue()))
+    return {size: names[size] for size in SIZES}
+
+
+def record_variants(instance, field_file):
+    """
+    Enregistre sur `instance` que les déclinaisons de `field_file` existent.
+    Les URLs servies changent : `updated_at` (celui du service pour une image
+    de galerie) est mis à jour pour que les ETag et la synchronisation mobile
+    le voient ; le save() invalide aussi les réponses en cache.
+    """
+    setattr(instance, VARIANTS_FIELD, field_file.name)
+    update_fields = [VARIANTS_FIELD]
+    if hasattr(instance, 'updated_at'):
+        update_fields.append('updated_at')
+    instance.save(update_fields=update_fields)
+    service = getattr(instance, 'service', None)
+    if service is not None and not hasattr(instance, 'updated_at'):
+        type(service).objects.filter(pk=service.pk).update(updated_at=timezone.now())
+
+
+def variant_urls(field_file, request=None):
+    """
+    URLs des déclinaisons {taille: {format: url}}. Tant qu'elles n'ont pas été
+    générées, chaque taille pointe vers l'original.
+    """
+    if not field_file:
+        return None
+
+    def absolute(url):
+        return request.build_absolute_uri(url) if request else url
+
+    if not has_variants(field_file):
+        original = absolute(field_file.url)
+        return {size: {fmt: original for fmt in FORMATS} for size in SIZES}
+    return {
+        size: {fmt: absolute(field_file.storage.url(variant_name(field_file.name, size, fmt))) for fmt in FORMATS}
+        for size in SIZES
+    }
@@ -0,0 +1,146 @@
+"""
+Mesures par vue, exportées avec les autres métriques (voir metrics.py,
+`GET /metrics`).
+
+RequestMetricsMiddleware rattache chaque requête à sa vue :
+`ClasseDeVue.action` pour un viewset (`ConversationViewSet.messages`), le
+nom de la classe ou de la fonction sinon, `unmatched` quand aucune URL ne
+correspond. Il observe, avec les étiquettes `view` et `method` :
+
+- http_request_duration_seconds : durée de la requête (et `status`, classe
+  du code de réponse : 2xx, 4xx...) ;
+- http_request_db_queries et http_request_db_seconds : nombre et durée des
+  requêtes SQL, toutes connexions confondues ;
+- http_request_serializer_seconds : temps passé à construire
+  `serializer.data` (requêtes SQL déclenchées par la sérialisation
+  comprises) ;
+- http_response_size_bytes : taille du corps envoyé, après compression (pas
+  pour les réponses en flux).
+
+Placé en tête de MIDDLEWARE, il mesure aussi le travail des autres
+middlewares.
+"""
+import contextvars
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+from . import metrics
+
+# Méthodes gardées telles quelles dans l'étiquette `method`, les autres deviennent OTHER
+METHODS = {'GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'}
+UNMATCHED = 'unmatched'
+
+request_seconds = metrics.Histogram(
+    'http_request_duration_seconds',
+    "Durée des requêtes HTTP par vue",
+    labelnames=('view', 'method', 'status'),
+)
+db_queries = metrics.Histogram(
+    'http_request_db_queries',
+    "Nombre de requêtes SQL par requête HTTP",
+    labelnames=('view', 'method'),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+db_seconds = metrics.Histogram(
+    'http_request_db_seconds',
+    "Durée cumulée des requêtes SQL par requête HTTP",
+    labelnames=('view', 'method'),
+)
+serializer_seconds = metrics.Histogram(
+    'http_request_serializer_seconds',
+    "Temps de sérialisation (serializer.data) par requête HTTP",
+    labelnames=('view', 'method'),
+)
+response_bytes = metrics.Histogram(
+    'http_response_size_bytes',
+    "Taille du corps des réponses HTTP",
+    labelnames=('view', 'method'),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+
+_current = contextvars.ContextVar('request_measure', default=None)
+
+
+class RequestMeasure:
+    """Compteurs de la requête en cours ; sert aussi d'execute_wrapper."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - start
+
+
+def install():
+    """Mesure la construction de `serializer.data` (appelée par OperationConfig.ready)."""
+    measured = BaseSerializer.data.fget
+    if getattr(measured, 'instrumented', False):
+        return
+
+    def data(self):
+        measure = _current.get()
+        # Un serializer construit pendant la sérialisation d'un autre est déjà compté
+        if measure is None or measure.serializing:
+            return measured(self)
+        measure.serializing = True
+        start = time.perf_counter()
+        try:
+            return measured(self)
+        finally:
+            measure.serializing = False
+            measure.serializer_seconds += time.perf_counter() - start
+
+    data.instrumented = True
+    BaseSerializer.data = property(data)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED
+    func = match.func
+    view_class = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    name = view_class.__name__ if view_class is not None else getattr(func, '__name__', match._func_path)
+    action = (getattr(func, 'actions', None) or {}).get(request.method.lower())
+    return f'{name}.{action}' if action else name
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        measure = RequestMeasure()
+        token = _current.set(measure)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(measure))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - start
+
+        labels = {
+            'view': view_label(request),
+            'method': request.method if request.method in METHODS else 'OTHER',
+        }
+        request_seconds.observe(elapsed, status=f'{response.status_code // 100}xx', **labels)
+        db_queries.observe(measure.queries, **labels)
+        db_seconds.observe(measure.db_seconds, **labels)
+        serializer_seconds.observe(measure.serializer_seconds, **labels)
+        if not response.streaming:
+            response_bytes.observe(len(response.content), **labels)
+        return response
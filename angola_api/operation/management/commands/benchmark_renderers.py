@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from operation import middleware, renderers
+from operation.models import Provider
+from operation.serializers import ProviderListSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le temps de sérialisation et de rendu d'une page de ProviderListSerializer "
+        "(JSON de DRF contre orjson) et la taille transmise selon la compression"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        providers = list(Provider.objects.with_listing_data().order_by('user__username')[:options['page_size']])
+        if not providers:
+            raise CommandError("Aucun prestataire en base (voir la commande seed_data)")
+        repeat = options['repeat']
+
+        candidates = [('DRF JSONRenderer', JSONRenderer())]
+        if renderers.orjson is not None:
+            candidates.append(('FastJSONRenderer (orjson)', renderers.FastJSONRenderer()))
+        else:
+            self.stdout.write(self.style.WARNING("orjson n'est pas installé : seul le rendu DRF est mesuré"))
+
+        self.stdout.write(f"{len(providers)} prestataires par page, {repeat} itérations")
+        body = None
+        for label, renderer in candidates:
+            serialize_time = render_time = 0.0
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = ProviderListSerializer(providers, many=True).data
+                middle = time.perf_counter()
+                body = renderer.render(data, 'application/json', {})
+                serialize_time += middle - start
+                render_time += time.perf_counter() - middle
+            self.stdout.write(
+                f"{label:<28} sérialisation {serialize_time / repeat * 1000:7.3f} ms  "
+                f"rendu {render_time / repeat * 1000:7.3f} ms  ({len(body)} octets)"
+            )
+
+        encodings = ['gzip'] + (['br'] if middleware.brotli is not None else [])
+        for encoding in encodings:
+            start = time.perf_counter()
+            compressed = middleware.compress(body, encoding)
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stdout.write(
+                f"{encoding:<28} {len(compressed)} octets ({len(compressed) / len(body):.0%}) en {elapsed:.3f} ms"
+            )
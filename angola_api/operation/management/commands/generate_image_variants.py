@@ -0,0 +1,33 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from operation import images
+
+
+class Command(BaseCommand):
+    help = "Génère les déclinaisons (thumb, medium, large en WebP et JPEG) des images existantes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true',
+                            help="Régénère aussi les déclinaisons déjà présentes")
+
+    def handle(self, *args, **options):
+        generated = recorded = 0
+        for label, field_name in images.IMAGE_FIELDS:
+            model = apps.get_model(label)
+            queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            if not options['overwrite']:
+                queryset = queryset.exclude(**{images.VARIANTS_FIELD: F(field_name)})
+            for instance in queryset.iterator():
+                field_file = getattr(instance, field_name)
+                # Déclinaisons déjà sur le stockage mais pas encore enregistrées sur le modèle
+                if not options['overwrite'] and images.stored_variants(field_file):
+                    images.record_variants(instance, field_file)
+                    recorded += 1
+                elif images.generate_variants(field_file, overwrite=options['overwrite']):
+                    images.record_variants(instance, field_file)
+                    generated += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Déclinaisons générées pour {generated} images, {recorded} déjà présentes enregistrées"
+        ))
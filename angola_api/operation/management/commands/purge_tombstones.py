@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from operation import sync
+
+
+class Command(BaseCommand):
+    help = "Supprime les traces de suppression plus anciennes que SYNC_TOMBSTONE_RETENTION_DAYS"
+
+    def handle(self, *args, **options):
+        count = sync.purge_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"{count} traces de suppression supprimées"))
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from operation import stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les agrégats quotidiens du tableau de bord depuis les tables sources "
+        "(les N derniers jours par défaut, tout l'historique avec --all)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help="Nombre de jours recalculés (aujourd'hui compris)")
+        parser.add_argument('--all', action='store_true', help="Recalcule tout l'historique")
+
+    def handle(self, *args, **options):
+        since = None if options['all'] else timezone.localdate() - timedelta(days=max(options['days'], 1) - 1)
+        count = stats.rebuild(since)
+        period = "tout l'historique" if since is None else f"depuis le {since.isoformat()}"
+        self.stdout.write(self.style.SUCCESS(f"{count} agrégats recalculés ({period})"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from operation.models import Provider, ProviderService, Review
+from operation.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats des avis (nombre, sommes, moyenne) des prestataires et des services"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            providers = rebuild_rating_aggregates(Review, Provider, 'provider')
+            services = rebuild_rating_aggregates(Review, ProviderService, 'service')
+        self.stdout.write(self.style.SUCCESS(
+            f"Agrégats recalculés pour {providers} prestataires et {services} services"
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from operation import search
+
+
+class Command(BaseCommand):
+    help = "Recalcule les vecteurs de recherche plein texte des services et des prestataires"
+
+    def handle(self, *args, **options):
+        if not search.is_enabled():
+            raise CommandError("La recherche plein texte nécessite PostgreSQL")
+        services, providers = search.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(
+            f"Index de recherche recalculé pour {services} services et {providers} prestataires"
+        ))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from operation import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure les points d'accès les plus sollicités (durée p50/p95/p99, requêtes SQL, "
+        "taille des réponses) et compare le rapport JSON à une référence"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Appels mesurés par scénario")
+        parser.add_argument('--warmup', type=int, default=20, help="Appels préalables non mesurés")
+        parser.add_argument('--scenario', action='append', dest='scenarios', help="Scénario à mesurer (répétable)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--accept-encoding', default='gzip', help="En-tête Accept-Encoding envoyé ('' : aucun)")
+        parser.add_argument('--output', help="Fichier où écrire le rapport JSON")
+        parser.add_argument('--baseline', help="Rapport JSON de référence")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help="Dégradation relative tolérée des durées et des tailles (0.2 : 20 %%)",
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['warmup'] < 0:
+            raise CommandError("--requests doit être strictement positif et --warmup positif")
+        baseline = benchmarks.load(options['baseline']) if options['baseline'] else None
+
+        report, missing = benchmarks.run(
+            names=options['scenarios'], requests=options['requests'], warmup=options['warmup'],
+            seed=options['seed'], accept_encoding=options['accept_encoding'],
+        )
+        for name in missing:
+            self.stdout.write(self.style.WARNING(f"{name} ignoré : aucune donnée (voir la commande seed_data)"))
+        if not report['scenarios']:
+            raise CommandError("Aucun scénario mesurable")
+
+        self.stdout.write(
+            f"{'scénario':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'SQL':>8}{'octets':>10}{'erreurs':>9}"
+        )
+        for name, result in report['scenarios'].items():
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{name:<24}{latency['p50']:>10.2f}{latency['p95']:>10.2f}{latency['p99']:>10.2f}"
+                f"{result['queries']['mean']:>8.1f}{result['bytes']['mean']:>10}{result['errors']:>9}"
+            )
+        if options['output']:
+            benchmarks.dump(report, options['output'])
+            self.stdout.write(f"Rapport écrit dans {options['output']}")
+
+        if baseline is not None:
+            regressions = benchmarks.compare(report, baseline, options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f"{len(regressions)} régression(s) par rapport à {options['baseline']}")
+            self.stdout.write(self.style.SUCCESS(f"Aucune régression par rapport à {options['baseline']}"))
@@ -0,0 +1,52 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections
+
+from operation import tasks
+
+logger = logging.getLogger(__name__)
+# Pause maximale (secondes) entre deux tentatives quand la base est indisponible
+MAX_BACKOFF = 60
+
+
+class Command(BaseCommand):
+    help = "Exécute les tâches d'arrière-plan en file (emails, images, notifications)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Traite les tâches dues puis s'arrête")
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help="Pause (secondes) lorsque la file est vide")
+
+    def handle(self, *args, **options):
+        worker_id = tasks.default_worker_id()
+        processed = 0
+        backoff = options['sleep']
+        try:
+            while True:
+                # Connexion fermée par le serveur ou trop ancienne (CONN_MAX_AGE) : on la renouvelle
+                close_old_connections()
+                try:
+                    count = tasks.run_pending(worker_id, options['batch_size'])
+                except DatabaseError as exc:
+                    if options['once']:
+                        raise CommandError(f"Base de données indisponible : {exc}") from exc
+                    logger.exception("Base de données indisponible, nouvel essai dans %s s", backoff)
+                    time.sleep(backoff)
+                    backoff = min(max(backoff, 0.1) * 2, MAX_BACKOFF)
+                    continue
+                backoff = options['sleep']
+                processed += count
+                if count:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            close_old_connections()
+        self.stdout.write(self.style.SUCCESS(f"{processed} tâches traitées"))
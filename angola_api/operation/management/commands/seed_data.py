@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from operation import seeding
+from operation.models import SubCategory
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données synthétique (clients, prestataires, services, avis, "
+        "conversations et messages) pour les mesures de performance"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=500)
+        parser.add_argument('--services', type=int, default=5000)
+        parser.add_argument('--clients', type=int, default=2000)
+        parser.add_argument('--reviews', type=int, default=50000)
+        parser.add_argument('--conversations', type=int, default=5000)
+        parser.add_argument('--messages', type=int, default=50000)
+        parser.add_argument('--days', type=int, default=365, help="Période couverte par les dates de création")
+        parser.add_argument('--seed', type=int, default=0, help="Graine du générateur aléatoire")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--flush', action='store_true',
+            help="Supprime d'abord les données générées par une exécution précédente",
+        )
+
+    def handle(self, *args, **options):
+        if min(options[name] for name in ('providers', 'services', 'clients', 'reviews', 'conversations', 'messages')) < 0:
+            raise CommandError("Les volumes doivent être positifs")
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--days et --batch-size doivent être strictement positifs")
+        if not SubCategory.objects.exists():
+            raise CommandError("Aucune sous-catégorie en base : appliquez d'abord les migrations")
+
+        if options['flush']:
+            deleted = seeding.flush()
+            self.stdout.write(f"{deleted} lignes générées précédemment supprimées")
+        elif seeding.seed_users().exists():
+            raise CommandError("Des données générées existent déjà (voir --flush)")
+
+        log = (lambda message: self.stdout.write(message)) if options['verbosity'] > 1 else None
+        counts = seeding.generate(
+            providers=options['providers'], services=options['services'], clients=options['clients'],
+            reviews=options['reviews'], conversations=options['conversations'], messages=options['messages'],
+            seed=options['seed'], days=options['days'], batch_size=options['batch_size'], log=log,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Créés : " + ', '.join(f"{count} {name}" for name, count in counts.items())
+        ))
+        self.stdout.write(f"Mot de passe des comptes {seeding.USERNAME_PREFIX}* : {seeding.PASSWORD}")
@@ -0,0 +1,157 @@
+"""
+Métriques applicatives exposées au format texte de Prometheus (`GET /metrics`).
+
+Les valeurs sont cumulées dans le cache de settings.METRICS_CACHE_ALIAS
+(Redis en production) : tous les workers, WSGI ou ASGI, incrémentent les
+mêmes clés et n'importe lequel d'entre eux sert l'agrégat. Chaque worker
+additionne ses observations en mémoire et les reporte dans le cache au plus
+toutes les METRICS_FLUSH_INTERVAL secondes (à chaque observation si 0),
+ainsi qu'avant chaque export : trois incréments (compartiment, somme,
+nombre) par série et par report, quel que soit le nombre d'observations.
+Un worker arrêté perd au plus les observations de cet intervalle. Les
+compartiments sont cumulés au moment de l'export.
+
+Les séries (combinaisons d'étiquettes) vues par un worker sont ajoutées à un
+index partagé, relu à chaque export.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_PREFIX = 'metrics'
+# Les sommes sont stockées en entiers (incréments atomiques) avec cette précision
+SUM_SCALE = 1_000_000
+# Un worker réenregistre ses séries à cet intervalle, au cas où l'index seul aurait été évincé
+REGISTER_INTERVAL = 60
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = {}
+# (histogramme, étiquettes) -> [nombre par compartiment, somme, nombre], pas encore reportés
+_pending = {}
+_pending_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def get_cache():
+    return caches[getattr(settings, 'METRICS_CACHE_ALIAS', 'default')]
+
+
+def _incr(cache, key, amount):
+    """Incrémente `key` ; retourne True si la clé vient d'être créée."""
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if cache.add(key, amount, None):
+            return True
+        cache.incr(key, amount)
+    return False
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Histogramme Prometheus partagé entre les workers."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._registered = {}
+        _registry[name] = self
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} attend les étiquettes {self.labelnames}")
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def _series_key(self, labels):
+        return f"{KEY_PREFIX}:{self.name}:{'|'.join(value for _, value in labels)}"
+
+    def _register(self, cache, labels, force=False):
+        now = time.monotonic()
+        if not force and now - self._registered.get(labels, -REGISTER_INTERVAL) < REGISTER_INTERVAL:
+            return
+        index_key = f'{KEY_PREFIX}:{self.name}:series'
+        series = cache.get(index_key) or []
+        if list(labels) not in series:
+            cache.set(index_key, series + [list(labels)], None)
+        self._registered[labels] = now
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        bucket = next((bound for bound in self.buckets if value <= bound), '+Inf')
+        with _pending_lock:
+            pending = _pending.setdefault((self, labels), [{}, 0, 0])
+            pending[0][bucket] = pending[0].get(bucket, 0) + 1
+            pending[1] += int(round(value * SUM_SCALE))
+            pending[2] += 1
+        if time.monotonic() - _last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 0):
+            flush()
+
+    def _report(self, cache, labels, buckets, total, count):
+        key = self._series_key(labels)
+        for bucket, amount in buckets.items():
+            _incr(cache, f'{key}:bucket:{bucket}', amount)
+        _incr(cache, f'{key}:sum', total)
+        # Série nouvelle (ou évincée du cache) : l'index est mis à jour tout de suite
+        created = _incr(cache, f'{key}:count', count)
+        self._register(cache, labels, force=created)
+
+    def collect(self):
+        """Lignes au format texte de Prometheus pour toutes les séries connues."""
+        cache = get_cache()
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for labels in cache.get(f'{KEY_PREFIX}:{self.name}:series') or []:
+            labels = tuple(tuple(label) for label in labels)
+            key = self._series_key(labels)
+            bounds = list(self.buckets) + ['+Inf']
+            values = cache.get_many(
+                [f'{key}:bucket:{bound}' for bound in bounds] + [f'{key}:sum', f'{key}:count']
+            )
+            cumulative = 0
+            for bound in bounds:
+                cumulative += values.get(f'{key}:bucket:{bound}', 0)
+                le = bound if bound == '+Inf' else _format_value(float(bound))
+                lines.append(f'{self.name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {values.get(f"{key}:sum", 0) / SUM_SCALE!r}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {values.get(f"{key}:count", 0)}')
+        return lines
+
+
+def flush():
+    """Reporte dans le cache les observations en attente du worker."""
+    global _last_flush
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    if pending:
+        cache = get_cache()
+        for (metric, labels), (buckets, total, count) in pending.items():
+            metric._report(cache, labels, buckets, total, count)
+
+
+def render():
+    """Export de toutes les métriques déclarées."""
+    flush()
+    lines = []
+    for metric in _registry.values():
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
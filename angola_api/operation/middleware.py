@@ -0,0 +1,103 @@
+"""
+Compression des réponses (brotli ou gzip) négociée avec Accept-Encoding.
+
+Contrairement à GZipMiddleware, les petites réponses (moins de
+COMPRESSION_MIN_SIZE octets) et les types déjà compressés (images, PDF) sont
+envoyés tels quels, et les réponses en flux ne sont jamais compressées. Brotli
+n'est proposé que si le paquet `brotli` est installé.
+
+Contre BREACH (déduire un secret de la taille des réponses compressées), un
+nom de fichier aléatoire de 0 à COMPRESSION_MAX_RANDOM_BYTES octets est
+ajouté à l'en-tête gzip, comme le fait GZipMiddleware. Brotli n'a pas
+d'équivalent : les réponses qui portent des jetons (COMPRESSION_EXCLUDED_PATHS,
+`/api/auth/` par défaut) ne sont jamais compressées.
+"""
+import gzip
+import re
+import secrets
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # dépendance optionnelle
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml', 'text/',
+)
+_ACCEPT_ENCODING_RE = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*$')
+
+
+def accepted_encodings(header):
+    """Encodages acceptés par le client (q > 0), du plus au moins préféré."""
+    weights = {}
+    for part in header.split(','):
+        match = _ACCEPT_ENCODING_RE.match(part)
+        if not match:
+            continue
+        try:
+            weights[match.group(1).lower()] = float(match.group(2) or 1)
+        except ValueError:
+            continue
+    return [name for name, q in sorted(weights.items(), key=lambda item: -item[1]) if q > 0]
+
+
+def choose_encoding(header):
+    available = ('br', 'gzip') if brotli is not None else ('gzip',)
+    for name in accepted_encodings(header):
+        if name in available:
+            return name
+        if name == '*':
+            return available[0]
+    return None
+
+
+def compress(content, encoding, max_random_bytes=0):
+    if encoding == 'br':
+        return brotli.compress(content, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+    # mtime fixe : même contenu, même corps compressé (au nom de fichier aléatoire près)
+    compressed = gzip.compress(content, compresslevel=getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6), mtime=0)
+    if not max_random_bytes:
+        return compressed
+    # Drapeau FNAME et nom de fichier terminé par un octet nul, après les 10 octets d'en-tête
+    header = bytearray(compressed[:10])
+    header[3] = gzip.FNAME
+    filename = b'a' * secrets.randbelow(max_random_bytes) + b'\x00'
+    return bytes(header) + filename + compressed[10:]
+
+
+def is_excluded(path):
+    return path.startswith(tuple(getattr(settings, 'COMPRESSION_EXCLUDED_PATHS', ('/api/auth/',))))
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding') or is_excluded(request.path):
+            return response
+        content_type = response.get('Content-Type', '').lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        compressed = compress(
+            response.content, encoding, getattr(settings, 'COMPRESSION_MAX_RANDOM_BYTES', 100)
+        )
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # Le corps transmis change : un ETag fort devient faible (comme GZipMiddleware)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
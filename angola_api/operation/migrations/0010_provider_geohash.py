@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+from operation import geo
+
+
+def compute_geohashes(apps, schema_editor):
+    Provider = apps.get_model('operation', 'Provider')
+    providers = Provider.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for provider in providers.iterator():
+        provider.geohash = geo.encode(provider.latitude, provider.longitude)
+        provider.save(update_fields=['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0009_servicegalleryimage_serviceoption'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='provider',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='provider',
+            index=models.Index(fields=['geohash'], name='provider_geohash_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(compute_geohashes, migrations.RunPython.noop),
+    ]
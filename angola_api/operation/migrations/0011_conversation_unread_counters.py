@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-18 17:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_conversations(apps, schema_editor):
+    Conversation = apps.get_model('operation', 'Conversation')
+    Message = apps.get_model('operation', 'Message')
+    for conversation in Conversation.objects.select_related('provider').iterator():
+        messages = Message.objects.filter(conversation=conversation)
+        Conversation.objects.filter(pk=conversation.pk).update(
+            client_unread_count=messages.filter(
+                sender_id=conversation.provider.user_id, is_read=False
+            ).count(),
+            provider_unread_count=messages.filter(
+                sender_id=conversation.client_id, is_read=False
+            ).count(),
+            last_message=messages.order_by('-created_at', '-pk').first(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0010_provider_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='client_unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='operation.message'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='provider_unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['client', '-updated_at'], name='conv_client_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['provider', '-updated_at'], name='conv_provider_inbox_idx'),
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+from operation.ratings import rebuild_rating_aggregates
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Review = apps.get_model('operation', 'Review')
+    rebuild_rating_aggregates(Review, apps.get_model('operation', 'Provider'), 'provider')
+    rebuild_rating_aggregates(Review, apps.get_model('operation', 'ProviderService'), 'service')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0013_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='provider',
+            name='punctuality_rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='provider',
+            name='quality_rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='provider',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='provider',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='provider',
+            name='value_rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='providerservice',
+            name='avg_rating',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='providerservice',
+            name='punctuality_rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='providerservice',
+            name='quality_rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='providerservice',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='providerservice',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='providerservice',
+            name='value_rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,128 @@
+# Generated by Django 5.2 on 2026-10-18 17:17
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations
+
+# Figé ici plutôt qu'importé de operation.search, qui peut évoluer
+SEARCH_CONFIGS = ('angola_pt', 'angola_fr')
+
+# Configurations portugaise et française ignorant les accents
+SEARCH_CONFIG_SQL = [
+    (
+        f"CREATE TEXT SEARCH CONFIGURATION {name} (COPY = {base});"
+        f"ALTER TEXT SEARCH CONFIGURATION {name} "
+        f"ALTER MAPPING FOR hword, hword_part, word WITH unaccent, {base}_stem;",
+        f"DROP TEXT SEARCH CONFIGURATION IF EXISTS {name};",
+    )
+    for name, base in (('angola_pt', 'portuguese'), ('angola_fr', 'french'))
+]
+
+
+def weighted(*expressions):
+    """tsvector pondéré de couples (expression SQL, poids), comme search.build_vector."""
+    return ' || '.join(
+        f"setweight(to_tsvector('{config}'::regconfig, COALESCE({expression}, '')), '{weight}')"
+        for expression, weight in expressions
+        for config in SEARCH_CONFIGS
+    )
+
+
+# Vecteurs initiaux (voir search.service_vector et search.provider_vector)
+BUILD_VECTORS_SQL = [
+    "UPDATE operation_providerservice AS service SET search_vector = " + weighted(
+        ('service.title', 'A'),
+        ("(SELECT COALESCE(subcategory.name, '') || ' ' || COALESCE(category.name, '') "
+         "FROM operation_subcategory AS subcategory "
+         "JOIN operation_category AS category ON category.id = subcategory.category_id "
+         "WHERE subcategory.id = service.subcategory_id)", 'B'),
+        ('service.description', 'C'),
+    ),
+    "UPDATE operation_provider AS provider SET search_vector = " + weighted(
+        ('provider.company_name', 'A'),
+        ("(SELECT COALESCE(account.first_name, '') || ' ' || COALESCE(account.last_name, '') "
+         "|| ' ' || COALESCE(account.username, '') "
+         "FROM operation_user AS account WHERE account.id = provider.user_id)", 'A'),
+        ('provider.address', 'C'),
+    ),
+]
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """AddIndex appliqué uniquement sous PostgreSQL (index GIN, opclass gin_trgm_ops)."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def create_search_configs(apps, schema_editor):
+    # Objets spécifiques à PostgreSQL : ignorés sur les autres moteurs (tests SQLite)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for forward, _ in SEARCH_CONFIG_SQL:
+        schema_editor.execute(forward)
+
+
+def drop_search_configs(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, backward in reversed(SEARCH_CONFIG_SQL):
+        schema_editor.execute(backward)
+
+
+def build_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in BUILD_VECTORS_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0014_rating_aggregates'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        migrations.AddField(
+            model_name='provider',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='providerservice',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_configs, drop_search_configs),
+        AddPostgresIndex(
+            model_name='providerservice',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='service_search_vector_idx'),
+        ),
+        AddPostgresIndex(
+            model_name='provider',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='provider_search_vector_idx'),
+        ),
+        AddPostgresIndex(
+            model_name='providerservice',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass('title', name='gin_trgm_ops'), name='service_title_trgm_idx'
+            ),
+        ),
+        AddPostgresIndex(
+            model_name='provider',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass('company_name', name='gin_trgm_ops'),
+                name='provider_company_trgm_idx',
+            ),
+        ),
+        migrations.RunPython(build_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 17:29
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_counts(apps, schema_editor):
+    User = apps.get_model('operation', 'User')
+    Notification = apps.get_model('operation', 'Notification')
+    unread = Notification.objects.filter(user=OuterRef('pk'), is_read=False).order_by().values('user')
+    User.objects.update(unread_notification_count=Coalesce(
+        Subquery(unread.annotate(c=Count('pk')).values('c')[:1]), 0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0016_task_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unread_notification_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='type',
+            field=models.CharField(choices=[('message', 'Nouveau message'), ('review', 'Nouvel avis'), ('favorite', 'Nouveau favoris'), ('dispute', 'Litige'), ('quote', 'Demande de devis'), ('system', 'Notification système')], max_length=20),
+        ),
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
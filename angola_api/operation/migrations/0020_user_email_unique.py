@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 17:48
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_emails(apps, schema_editor):
+    # Les doublons doivent être fusionnés à la main avant la contrainte
+    User = apps.get_model('operation', 'User')
+    duplicates = list(
+        User.objects.exclude(email='').values('email').annotate(n=Count('pk')).filter(n__gt=1)
+        .values_list('email', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Plusieurs comptes partagent ces emails, à corriger avant la migration : " + ', '.join(duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('operation', '0019_sync_tombstones'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_email_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(condition=models.Q(('email', ''), _negated=True), fields=('email',), name='user_email_unique'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0020_user_email_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('metric', models.CharField(max_length=32)),
+                ('dimension', models.CharField(blank=True, default='', max_length=32)),
+                ('value', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'metric', 'dimension'), name='dailystat_unique')],
+            },
+        ),
+    ]
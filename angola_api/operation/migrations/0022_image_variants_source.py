@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0021_dailystat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='portfolio',
+            name='variants_source',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='providerservice',
+            name='variants_source',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='reviewimage',
+            name='variants_source',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='servicegalleryimage',
+            name='variants_source',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='variants_source',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+    ]
@@ -1,12 +1,36 @@
 from django.db import models
 
 # Create your models here.
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (
+    BooleanField, Case, Count, Exists, ExpressionWrapper, F, OuterRef, Prefetch, Q, Subquery, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Greatest
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import uuid
 from datetime import datetime
+from decimal import Decimal
+
+from . import geo, realtime
+
+class LoadDeferredTogetherMixin:
+    """
+    Lire un champ différé charge tous les champs différés de l'instance en une
+    requête, au lieu d'une requête par champ (instances partielles construites
+    par operation.authentication).
+    """
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
 
 class TimeStampMixin(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -15,7 +39,7 @@ class TimeStampMixin(models.Model):
     class Meta:
         abstract = True
 
-class User(AbstractUser, TimeStampMixin):
+class User(LoadDeferredTogetherMixin, AbstractUser, TimeStampMixin):
     ROLE_CHOICES = (
         ('client', 'Client'),
         ('provider', 'Prestataire'),
@@ -25,9 +49,20 @@ class User(AbstractUser, TimeStampMixin):
     phone_number = models.CharField(max_length=20, blank=True)
     bio = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    # Nom de l'image dont les déclinaisons ont été générées, voir images.py
+    variants_source = models.CharField(max_length=100, null=True, editable=False)
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='client')
     is_verified = models.BooleanField(default=False)
     location = models.CharField(max_length=255, blank=True)
+    # Notifications non lues, maintenu par notifications.py (pastille de l'application)
+    unread_notification_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Connexion et réinitialisation du mot de passe par email : un
+            # compte par adresse (l'index unique sert aussi à la recherche)
+            models.UniqueConstraint(fields=['email'], condition=~Q(email=''), name='user_email_unique'),
+        ]
     
     def __str__(self):
         return self.username
@@ -41,6 +76,11 @@ class ResetPasswordCode(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'code'], name='reset_code_user_code_idx'),
+        ]
+    
     def __str__(self):
         return f"Code de réinitialisation pour {self.user.email}"
     
@@ -67,7 +107,88 @@ class SubCategory(TimeStampMixin):
     def __str__(self):
         return f"{self.name} ({self.category.name})"
 
-class Provider(TimeStampMixin):
+class RatingAggregateMixin(models.Model):
+    """
+    Agrégats des avis maintenus de façon incrémentale par Review
+    (voir Review.apply_rating_deltas) et reconstruits par la commande
+    rebuild_rating_aggregates.
+    """
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    quality_rating_sum = models.PositiveIntegerField(default=0)
+    punctuality_rating_sum = models.PositiveIntegerField(default=0)
+    value_rating_sum = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+class ProviderQuerySet(models.QuerySet):
+    def with_listing_data(self):
+        """
+        Annote les champs utilisés par ProviderListSerializer (nombre de services,
+        catégorie principale) pour éviter une requête par ligne. Le nombre d'avis
+        est stocké dans rating_count.
+        """
+        services = ProviderService.objects.filter(provider=OuterRef('pk')).order_by()
+        # Le premier service (par id) détermine la catégorie principale
+        first_service = ProviderService.objects.filter(provider=OuterRef('pk')).order_by('pk')
+
+        return self.select_related('user').annotate(
+            services_count=Coalesce(Subquery(
+                services.values('provider').annotate(c=Count('pk')).values('c')[:1]
+            ), 0),
+            main_category_id=Subquery(first_service.values('subcategory__category_id')[:1]),
+            main_category_name=Subquery(first_service.values('subcategory__category__name')[:1]),
+        )
+
+    def with_profile_data(self, user=None):
+        """
+        Charge tout ce qu'affiche ProviderDetailSerializer en un nombre fixe de
+        requêtes : services (sous-catégorie, catégorie, galerie, options),
+        portfolio, certificats, les 5 derniers avis (`recent_reviews`, avec
+        client et images) et `is_favorited` pour `user`.
+        """
+        if user is not None and user.is_authenticated:
+            is_favorited = Exists(Favorite.objects.filter(provider=OuterRef('pk'), user=user))
+        else:
+            is_favorited = Value(False, output_field=BooleanField())
+        return self.select_related('user').prefetch_related(
+            Prefetch(
+                'provider_services',
+                queryset=ProviderService.objects.select_related('subcategory__category')
+                .prefetch_related('gallery_images', 'options').order_by('pk'),
+            ),
+            'portfolio',
+            'certificates',
+            Prefetch(
+                'reviews_received',
+                queryset=Review.objects.select_related('client').prefetch_related('images')
+                .order_by('-created_at', '-id')[:5],
+                to_attr='recent_reviews',
+            ),
+        ).annotate(is_favorited=is_favorited)
+
+    def nearby(self, latitude, longitude, radius_km):
+        """
+        Prestataires situés à moins de `radius_km` du point, annotés avec
+        `distance_km` et triés du plus proche au plus éloigné.
+        """
+        queryset = self.filter(latitude__isnull=False, longitude__isnull=False)
+
+        # Pré-filtrage par préfixes geohash (index B-tree)
+        cells = geo.covering_cells(latitude, longitude, radius_km)
+        if cells:
+            prefix_filter = Q()
+            for cell in cells:
+                prefix_filter |= Q(geohash__startswith=cell)
+            queryset = queryset.filter(prefix_filter)
+
+        return queryset.annotate(
+            distance_km=geo.haversine_expression(latitude, longitude)
+        ).filter(distance_km__lte=radius_km).order_by('distance_km', 'pk')
+
+
+class Provider(LoadDeferredTogetherMixin, RatingAggregateMixin, TimeStampMixin):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='provider_profile')
     company_name = models.CharField(max_length=100, blank=True)
     services = models.ManyToManyField(SubCategory, through='ProviderService')
@@ -80,11 +201,35 @@ class Provider(TimeStampMixin):
     address = models.CharField(max_length=255, blank=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Geohash des coordonnées, maintenu par save() pour les recherches de proximité
+    geohash = models.CharField(max_length=geo.GEOHASH_PRECISION, blank=True, editable=False)
+    # Vecteur plein texte (nom de société, noms de l'utilisateur), voir search.py
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProviderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['geohash'], name='provider_geohash_idx', opclasses=['varchar_pattern_ops']),
+            # Recherche plein texte et tolérance aux fautes de frappe (PostgreSQL), voir search.py
+            GinIndex(fields=['search_vector'], name='provider_search_vector_idx'),
+            GinIndex(OpClass('company_name', name='gin_trgm_ops'), name='provider_company_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.company_name or self.user.username
 
-class ProviderService(TimeStampMixin):
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+class ProviderService(RatingAggregateMixin, TimeStampMixin):
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='provider_services')
     subcategory = models.ForeignKey(SubCategory, on_delete=models.CASCADE)
     title = models.CharField(max_length=100)
@@ -98,9 +243,23 @@ class ProviderService(TimeStampMixin):
         ('quote', 'Sur devis')
     ], default='quote')
     is_available = models.BooleanField(default=True)
+    avg_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0)
     
     # Ajout du champ pour stocker l'image principale du service
     image = models.ImageField(upload_to='service_images/', blank=True, null=True)
+    # Nom de l'image dont les déclinaisons ont été générées, voir images.py
+    variants_source = models.CharField(max_length=100, null=True, editable=False)
+    # Vecteur plein texte (titre, sous-catégorie, catégorie, description), voir search.py
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['subcategory', 'is_available'], name='service_subcat_available_idx'),
+            models.Index(fields=['updated_at', 'id'], name='service_sync_idx'),
+            # Recherche plein texte et tolérance aux fautes de frappe (PostgreSQL), voir search.py
+            GinIndex(fields=['search_vector'], name='service_search_vector_idx'),
+            GinIndex(OpClass('title', name='gin_trgm_ops'), name='service_title_trgm_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.provider.user.username}"
@@ -109,6 +268,8 @@ class ProviderService(TimeStampMixin):
 class ServiceGalleryImage(models.Model):
     service = models.ForeignKey(ProviderService, related_name='gallery_images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='services/gallery/')
+    # Nom de l'image dont les déclinaisons ont été générées, voir images.py
+    variants_source = models.CharField(max_length=100, null=True, editable=False)
     caption = models.CharField(max_length=255, blank=True)
     order = models.PositiveIntegerField(default=0)
     
@@ -130,6 +291,8 @@ class Portfolio(TimeStampMixin):
     title = models.CharField(max_length=100)
     description = models.TextField()
     image = models.ImageField(upload_to='portfolio/', blank=True, null=True)
+    # Nom de l'image dont les déclinaisons ont été générées, voir images.py
+    variants_source = models.CharField(max_length=100, null=True, editable=False)
     
     def __str__(self):
         return f"{self.title} - {self.provider.user.username}"
@@ -150,6 +313,14 @@ class QuoteRequest(TimeStampMixin):
     description = models.TextField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['provider', 'status'], name='quote_provider_status_idx'),
+            models.Index(fields=['client', 'status'], name='quote_client_status_idx'),
+            models.Index(fields=['client', 'updated_at', 'id'], name='quote_client_sync_idx'),
+            models.Index(fields=['provider', 'updated_at', 'id'], name='quote_provider_sync_idx'),
+        ]
+    
     def __str__(self):
         return f"Demande de devis {self.id}: {self.subject} - {self.client.username} à {self.provider.user.username}"
     
@@ -176,16 +347,77 @@ class Review(TimeStampMixin):
     comment = models.TextField()
     is_verified = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['provider', 'created_at', 'id'], name='review_provider_created_idx'),
+        ]
+    
+    RATING_FIELDS = (
+        'provider_id', 'service_id', 'overall_rating',
+        'quality_rating', 'punctuality_rating', 'value_rating',
+    )
+    
     def save(self, *args, **kwargs):
         # Calculate overall rating
-        self.overall_rating = (self.quality_rating + self.punctuality_rating + self.value_rating) / 3.0
-        super().save(*args, **kwargs)
+        total = self.quality_rating + self.punctuality_rating + self.value_rating
+        self.overall_rating = (Decimal(total) / 3).quantize(Decimal('0.01'))
+        
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = Review.objects.filter(pk=self.pk).values(*self.RATING_FIELDS).first()
+            super().save(*args, **kwargs)
+            
+            # Update provider's and service's rating aggregates
+            Review.apply_rating_deltas(previous, self.rating_values())
+    
+    def rating_values(self):
+        return {field: getattr(self, field) for field in self.RATING_FIELDS}
+    
+    @staticmethod
+    def apply_rating_deltas(removed=None, added=None):
+        """
+        Retire les notes `removed` et ajoute les notes `added` (dicts de
+        RATING_FIELDS) aux agrégats du prestataire et du service avec des
+        mises à jour F() atomiques, sans relire les autres avis.
+        """
+        deltas = {}
+        for values, sign in ((removed, -1), (added, 1)):
+            if not values:
+                continue
+            for model, pk in ((Provider, values['provider_id']), (ProviderService, values['service_id'])):
+                if pk is None:
+                    continue
+                delta = deltas.setdefault((model, pk), {
+                    'rating_count': 0, 'rating_sum': Decimal(0), 'quality_rating_sum': 0,
+                    'punctuality_rating_sum': 0, 'value_rating_sum': 0,
+                })
+                delta['rating_count'] += sign
+                delta['rating_sum'] += sign * Decimal(values['overall_rating'])
+                delta['quality_rating_sum'] += sign * values['quality_rating']
+                delta['punctuality_rating_sum'] += sign * values['punctuality_rating']
+                delta['value_rating_sum'] += sign * values['value_rating']
         
-        # Update provider's average rating
-        provider = self.provider
-        avg = Review.objects.filter(provider=provider).aggregate(models.Avg('overall_rating'))['overall_rating__avg']
-        provider.avg_rating = avg or 0.0
-        provider.save()
+        for (model, pk), delta in deltas.items():
+            if not any(delta.values()):
+                continue
+            count = F('rating_count') + delta['rating_count']
+            rating_sum = F('rating_sum') + delta['rating_sum']
+            model.objects.filter(pk=pk).update(
+                rating_count=count,
+                rating_sum=rating_sum,
+                quality_rating_sum=F('quality_rating_sum') + delta['quality_rating_sum'],
+                punctuality_rating_sum=F('punctuality_rating_sum') + delta['punctuality_rating_sum'],
+                value_rating_sum=F('value_rating_sum') + delta['value_rating_sum'],
+                # Les expressions utilisent les valeurs avant mise à jour
+                avg_rating=Case(
+                    When(rating_count__gt=-delta['rating_count'], then=ExpressionWrapper(
+                        Cast(rating_sum, models.FloatField()) / count, output_field=models.FloatField()
+                    )),
+                    default=Value(0.0),
+                ),
+                updated_at=timezone.now(),
+            )
     
     def __str__(self):
         return f"Review by {self.client.username} for {self.provider.user.username}"
@@ -193,6 +425,8 @@ class Review(TimeStampMixin):
 class ReviewImage(TimeStampMixin):
     review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='review_images/')
+    # Nom de l'image dont les déclinaisons ont été générées, voir images.py
+    variants_source = models.CharField(max_length=100, null=True, editable=False)
     
     def __str__(self):
         return f"Image for review {self.review.id}"
@@ -203,6 +437,9 @@ class Favorite(TimeStampMixin):
     
     class Meta:
         unique_together = ('user', 'provider')
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id'], name='favorite_user_sync_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} favorited {self.provider.user.username}"
@@ -211,38 +448,183 @@ class Conversation(TimeStampMixin):
     client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='client_conversations')
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='provider_conversations')
     updated_at = models.DateTimeField(auto_now=True)  # Pour trier par date du dernier message
+    # Compteurs dénormalisés : messages non lus par chacun des participants
+    client_unread_count = models.PositiveIntegerField(default=0)
+    provider_unread_count = models.PositiveIntegerField(default=0)
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['client', '-updated_at'], name='conv_client_inbox_idx'),
+            models.Index(fields=['provider', '-updated_at'], name='conv_provider_inbox_idx'),
+        ]
     
     def __str__(self):
         return f"Conversation entre {self.client.username} et {self.provider.user.username}"
     
+    def is_provider_user(self, user_id):
+        """Indique si l'utilisateur donné est le prestataire de la conversation"""
+        return self.provider.user_id == int(user_id)
+    
     def unread_count_for_user(self, user):
         """Retourne le nombre de messages non lus pour un utilisateur donné"""
-        if hasattr(user, 'provider_profile') and self.provider.id == user.provider_profile.id:
-            # L'utilisateur est le prestataire
-            return self.messages.filter(sender=self.client, is_read=False).count()
+        if self.is_provider_user(user.id):
+            return self.provider_unread_count
+        return self.client_unread_count
+    
+    def record_messages(self, messages):
+        """
+        Met à jour les compteurs de non lus et le dernier message après
+        l'insertion de `messages`, en une seule requête atomique.
+        """
+        if not messages:
+            return
+        from_client = sum(1 for message in messages if message.sender_id == self.client_id)
+        from_provider = len(messages) - from_client
+        last_message = max(messages, key=lambda message: (message.created_at, message.pk))
+        now = timezone.now()
+        Conversation.objects.filter(pk=self.pk).update(
+            client_unread_count=F('client_unread_count') + from_provider,
+            provider_unread_count=F('provider_unread_count') + from_client,
+            last_message=last_message,
+            updated_at=now,
+        )
+        self.last_message = last_message
+        self.updated_at = now
+        
+        participants = [self.client_id, self.provider.user_id]
+        for message in messages:
+            realtime.publish(participants, 'message.created', {
+                'id': message.pk,
+                'conversation_id': self.pk,
+                'sender_id': message.sender_id,
+                'content': message.content,
+                'created_at': message.created_at,
+                'is_read': message.is_read,
+            })
+    
+    def forget_message(self, message):
+        """
+        Après la suppression de `message` : décrémente le compteur de non lus
+        de son destinataire et, s'il était le dernier message (SET_NULL a vidé
+        `last_message`), pointe sur le message précédent.
+        """
+        updates = {}
+        if not message.is_read:
+            counter = 'provider_unread_count' if message.sender_id == self.client_id else 'client_unread_count'
+            updates[counter] = Greatest(F(counter) - 1, 0)
+        previous = self.messages.order_by('-created_at', '-id').values('pk')[:1]
+        updates['last_message'] = Coalesce(F('last_message'), Subquery(previous))
+        Conversation.objects.filter(pk=self.pk).update(**updates)
+
+    def is_participant(self, user):
+        return self.client_id == user.pk or self.is_provider_user(user.pk)
+
+    def add_messages(self, sender, items):
+        """
+        Insère en une requête les messages `items` ({'content', 'client_message_id'})
+        de `sender`, puis met à jour la conversation une seule fois.
+
+        Un `client_message_id` déjà reçu de cet expéditeur (renvoi après une
+        coupure réseau) n'est pas réinséré : le message existant est retourné.
+        Retourne (messages dans l'ordre de `items`, messages créés).
+        """
+        client_ids = [item['client_message_id'] for item in items if item.get('client_message_id')]
+        with transaction.atomic():
+            existing = {}
+            if client_ids:
+                existing = {
+                    message.client_message_id: message
+                    for message in Message.objects.filter(sender=sender, client_message_id__in=client_ids)
+                }
+            pending = {}
+            new_messages = []
+            for item in items:
+                client_id = item.get('client_message_id') or None
+                if client_id is not None and (client_id in existing or client_id in pending):
+                    continue
+                message = Message(
+                    conversation=self, sender=sender, content=item['content'],
+                    client_message_id=client_id,
+                )
+                new_messages.append(message)
+                if client_id is not None:
+                    pending[client_id] = message
+            created = Message.objects.bulk_create(new_messages)
+            self.record_messages(created)
+
+        ordered = []
+        unidentified = iter(message for message in created if message.client_message_id is None)
+        for item in items:
+            client_id = item.get('client_message_id') or None
+            if client_id is None:
+                ordered.append(next(unidentified))
+            else:
+                ordered.append(existing.get(client_id) or pending[client_id])
+        return ordered, created
+
+    def mark_read_by(self, user_id, up_to=None):
+        """
+        Marque comme lus les messages envoyés par l'autre participant (jusqu'au
+        message d'id `up_to` inclus, si précisé) et décrémente le compteur du
+        lecteur. Retourne le nombre de messages marqués.
+        """
+        if self.is_provider_user(user_id):
+            other_sender_id, counter = self.client_id, 'provider_unread_count'
         else:
-            # L'utilisateur est le client
-            return self.messages.filter(sender=self.provider.user, is_read=False).count()
+            other_sender_id, counter = self.provider.user_id, 'client_unread_count'
+        
+        unread = self.messages.filter(sender_id=other_sender_id, is_read=False)
+        if up_to is not None:
+            unread = unread.filter(pk__lte=up_to)
+        with transaction.atomic():
+            count = unread.update(is_read=True)
+            if count:
+                Conversation.objects.filter(pk=self.pk).update(**{
+                    counter: Greatest(F(counter) - count, 0),
+                    'updated_at': timezone.now(),
+                })
+                # Accusé de lecture pour l'expéditeur des messages
+                realtime.publish([other_sender_id, int(user_id)], 'message.read', {
+                    'conversation_id': self.pk,
+                    'reader_id': int(user_id),
+                    'count': count,
+                })
+        return count
 
 class Message(TimeStampMixin):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='messages_sent')
     content = models.TextField()
     is_read = models.BooleanField(default=False)
+    # Identifiant généré par l'application, pour ignorer les renvois d'un même message
+    client_message_id = models.CharField(max_length=64, null=True, blank=True)
     
     class Meta:
         ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sender', 'client_message_id'], condition=Q(client_message_id__isnull=False),
+                name='message_sender_client_id_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['conversation', 'created_at', 'id'], name='message_conv_created_idx'),
+            # Messages non lus d'un expéditeur dans une conversation
+            models.Index(fields=['conversation', 'sender'], condition=Q(is_read=False), name='message_unread_idx'),
+        ]
     
     def __str__(self):
         return f"Message de {self.sender.username} dans conversation {self.conversation.id}"
     
     def save(self, *args, **kwargs):
-        # Mettre à jour la date de la conversation
-        self.conversation.save()
-        super().save(*args, **kwargs)
+        is_new = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Mettre à jour la date, les compteurs et le dernier message de la conversation
+            if is_new:
+                self.conversation.record_messages([self])
 
 class Attachment(TimeStampMixin):
     message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='attachments')
@@ -268,6 +650,12 @@ class Dispute(TimeStampMixin):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
     resolution_note = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['provider', 'status'], name='dispute_provider_status_idx'),
+            models.Index(fields=['client', 'status'], name='dispute_client_status_idx'),
+        ]
+    
     def __str__(self):
         return f"Dispute #{self.id}: {self.title}"
 
@@ -286,6 +674,7 @@ class Notification(TimeStampMixin):
         ('review', 'Nouvel avis'),
         ('favorite', 'Nouveau favoris'),
         ('dispute', 'Litige'),
+        ('quote', 'Demande de devis'),
         ('system', 'Notification système'),
     )
     
@@ -296,6 +685,13 @@ class Notification(TimeStampMixin):
     related_object_id = models.IntegerField(null=True, blank=True)
     is_read = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='notification_user_created_idx'),
+            models.Index(fields=['user'], condition=Q(is_read=False), name='notification_unread_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='notification_user_sync_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.title} - {self.user.username}"
 
@@ -323,4 +719,78 @@ class Report(TimeStampMixin):
     admin_notes = models.TextField(blank=True)
     
     def __str__(self):
-        return f"Report #{self.id} - {self.type}"
\ No newline at end of file
+        return f"Report #{self.id} - {self.type}"
+
+class Task(TimeStampMixin):
+    """
+    Tâche d'arrière-plan en file d'attente, exécutée par la commande
+    run_tasks (voir tasks.py).
+    """
+    STATUS_CHOICES = (
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminée'),
+        ('failed', 'Échouée'),
+    )
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Une même clé ne peut être mise en file qu'une fois
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_at'], name='task_pending_run_at_idx', condition=Q(status='pending')),
+            models.Index(fields=['locked_at'], name='task_running_locked_idx', condition=Q(status='running')),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class Tombstone(models.Model):
+    """
+    Trace d'une ligne supprimée, servie par la synchronisation incrémentale
+    (voir sync.py). `owner_id` est None pour une ressource publique.
+    """
+    resource = models.CharField(max_length=32)
+    object_id = models.PositiveBigIntegerField()
+    # Pas de clé étrangère : la trace doit survivre à la suppression en cascade de l'utilisateur
+    owner_id = models.PositiveIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'owner_id', 'deleted_at', 'id'], name='tombstone_sync_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource} #{self.object_id} supprimé le {self.deleted_at}"
+
+
+class DailyStat(models.Model):
+    """
+    Agrégat quotidien du tableau de bord (voir stats.py) : nombre de lignes
+    existantes de `metric` créées le jour `date` et dont la dimension (rôle,
+    statut ou catégorie selon la métrique) vaut `dimension`.
+    """
+    date = models.DateField()
+    metric = models.CharField(max_length=32)
+    dimension = models.CharField(max_length=32, blank=True, default='')
+    value = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'metric', 'dimension'], name='dailystat_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.metric}[{self.dimension}] {self.date} : {self.value}"
@@ -0,0 +1,183 @@
+"""
+Création des notifications et compteur de non lues par utilisateur.
+
+Les notifications sont insérées par `bulk_create` et le compteur
+User.unread_notification_count est mis à jour dans la même transaction avec
+une expression F(), ce qui fait de la pastille de l'application une simple
+lecture par clé primaire. Au-delà de INLINE_LIMIT destinataires, l'envoi est
+confié à la file de tâches (tâche `create_notifications`).
+
+Les fonctions `*_created` / `*_changed` sont appelées par les signaux
+(signals.py) et par les vues pour chaque événement notifié.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import realtime
+from .models import Notification, User
+
+# Nombre maximal de destinataires notifiés pendant la requête
+INLINE_LIMIT = 50
+BATCH_SIZE = 500
+
+
+def publish(notification):
+    realtime.publish([notification.user_id], 'notification.created', {
+        'id': notification.pk,
+        'title': notification.title,
+        'content': notification.content,
+        'type': notification.type,
+        'related_object_id': notification.related_object_id,
+        'created_at': notification.created_at,
+    })
+
+
+def record_created(notifications):
+    """Incrémente les compteurs et publie des notifications déjà insérées."""
+    per_count = {}
+    for user_id, count in Counter(n.user_id for n in notifications if not n.is_read).items():
+        per_count.setdefault(count, []).append(user_id)
+    # Une requête UPDATE par valeur d'incrément (en pratique une seule)
+    for count, user_ids in per_count.items():
+        User.objects.filter(pk__in=user_ids).update(
+            unread_notification_count=F('unread_notification_count') + count
+        )
+    for notification in notifications:
+        publish(notification)
+
+
+def create(user_ids, type, title, content, related_object_id=None):
+    """Insère une notification par destinataire (requêtes en nombre constant)."""
+    with transaction.atomic():
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id, type=type, title=title, content=content,
+                related_object_id=related_object_id,
+            )
+            for user_id in user_ids
+        ], batch_size=BATCH_SIZE)
+        record_created(notifications)
+    return notifications
+
+
+def notify(user_ids, type, title, content, related_object_id=None, exclude=None):
+    """
+    Notifie les utilisateurs donnés (sauf `exclude`, en général l'auteur de
+    l'action). Les envois volumineux passent par la file de tâches.
+    """
+    from . import tasks
+
+    user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id is not None and user_id != exclude]
+    if not user_ids:
+        return
+    if len(user_ids) <= INLINE_LIMIT:
+        create(user_ids, type, title, content, related_object_id)
+        return
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        tasks.enqueue('create_notifications', {
+            'user_ids': user_ids[start:start + BATCH_SIZE], 'type': type, 'title': title,
+            'content': content, 'related_object_id': related_object_id,
+        })
+
+
+def mark_read(user_id, ids=None):
+    """
+    Marque comme lues les notifications non lues de l'utilisateur (toutes, ou
+    celles dont l'id est dans `ids`) et décrémente son compteur du nombre de
+    lignes réellement modifiées. Retourne ce nombre.
+    """
+    with transaction.atomic():
+        unread = Notification.objects.filter(user_id=user_id, is_read=False)
+        if ids is not None:
+            unread = unread.filter(pk__in=ids)
+        count = unread.update(is_read=True, updated_at=timezone.now())
+        if count:
+            User.objects.filter(pk=user_id).update(
+                unread_notification_count=Greatest(F('unread_notification_count') - count, 0)
+            )
+    return count
+
+
+def adjust_unread(user_id, delta):
+    if delta:
+        User.objects.filter(pk=user_id).update(
+            unread_notification_count=Greatest(F('unread_notification_count') + delta, 0)
+        )
+
+
+def unread_count(user_id):
+    return User.objects.filter(pk=user_id).values_list('unread_notification_count', flat=True).first() or 0
+
+
+# Événements notifiés
+
+def message_created(message):
+    messages_created(message.conversation, [message])
+
+
+def messages_created(conversation, messages):
+    """Une seule notification par lot de messages d'un même expéditeur."""
+    if not messages:
+        return
+    sender = messages[-1].sender
+    provider_user_id = conversation.provider.user_id
+    recipient = conversation.client_id if sender.pk == provider_user_id else provider_user_id
+    if len(messages) == 1:
+        content = f"{sender.username} : {messages[0].content[:100]}"
+    else:
+        content = f"{sender.username} vous a envoyé {len(messages)} messages"
+    notify(
+        [recipient], 'message', 'Nouveau message', content,
+        related_object_id=conversation.pk, exclude=sender.pk,
+    )
+
+
+def review_created(review):
+    notify(
+        [review.provider.user_id], 'review', 'Nouvel avis',
+        f"{review.client.username} a laissé un avis ({review.overall_rating}/5)",
+        related_object_id=review.pk, exclude=review.client_id,
+    )
+
+
+def favorite_created(favorite):
+    notify(
+        [favorite.provider.user_id], 'favorite', 'Nouveau favori',
+        f"{favorite.user.username} a ajouté votre profil à ses favoris",
+        related_object_id=favorite.provider_id, exclude=favorite.user_id,
+    )
+
+
+def quote_created(quote):
+    notify(
+        [quote.provider.user_id], 'quote', 'Nouvelle demande de devis',
+        f"{quote.client.username} : {quote.subject}",
+        related_object_id=quote.pk, exclude=quote.client_id,
+    )
+
+
+def quote_status_changed(quote, actor_id=None):
+    notify(
+        [quote.client_id, quote.provider.user_id], 'quote', 'Demande de devis mise à jour',
+        f"« {quote.subject} » : {quote.get_status_display()}",
+        related_object_id=quote.pk, exclude=actor_id,
+    )
+
+
+def dispute_created(dispute):
+    notify(
+        [dispute.provider.user_id], 'dispute', 'Nouveau litige',
+        f"{dispute.client.username} a ouvert un litige : {dispute.title}",
+        related_object_id=dispute.pk, exclude=dispute.client_id,
+    )
+
+
+def dispute_updated(dispute, content, actor_id=None):
+    notify(
+        [dispute.client_id, dispute.provider.user_id], 'dispute', 'Litige mis à jour',
+        content, related_object_id=dispute.pk, exclude=actor_id,
+    )
@@ -0,0 +1,149 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par curseur sur (created_at, id), sans OFFSET ni COUNT(*).
+
+    Paramètres de requête:
+    - `before`: lignes plus anciennes que le curseur (défilement infini)
+    - `after` / `since`: lignes plus récentes que le curseur (mode delta)
+
+    Sans curseur, la page contient les lignes les plus récentes. `before` ne
+    se combine pas avec `after` / `since` (réponse 400).
+
+    Avec `include_count`, la réponse contient aussi `count`, le nombre total
+    de lignes (une requête COUNT), pour les clients qui le lisent encore.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    # True : résultats du plus ancien au plus récent (fil de discussion)
+    chronological = False
+    invalid_cursor_message = 'Curseur invalide'
+    conflicting_cursors_message = "`before` ne peut pas être combiné avec `after` ou `since`"
+    include_count = False
+    cursor_params = ('before', 'after', 'since')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+
+        before = self.decode_cursor(request.query_params.get('before'))
+        after = self.decode_cursor(request.query_params.get('after') or request.query_params.get('since'))
+        if before is not None and after is not None:
+            raise ValidationError(self.conflicting_cursors_message)
+        self.count = queryset.count() if self.include_count else None
+        self.forward = after is not None
+
+        if self.forward:
+            created_at, pk = after
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            ).order_by('created_at', 'id')
+        else:
+            if before is not None:
+                created_at, pk = before
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                )
+            queryset = queryset.order_by('-created_at', '-id')
+
+        rows = list(queryset[:page_size + 1])
+        self.has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        # Lignes triées du plus ancien au plus récent
+        ordered = rows if self.forward else rows[::-1]
+        self.oldest_cursor = self.encode_cursor(ordered[0]) if ordered else None
+        self.newest_cursor = self.encode_cursor(ordered[-1]) if ordered else None
+        if self.newest_cursor is None and self.forward:
+            # Rien de nouveau : le client garde le même curseur
+            self.newest_cursor = request.query_params.get('after') or request.query_params.get('since')
+
+        return ordered if self.chronological else ordered[::-1]
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_paginated_response(self, data):
+        count = {} if self.count is None else {'count': self.count}
+        return Response({
+            **count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'next_cursor': self.get_next_cursor(),
+            'previous_cursor': self.newest_cursor,
+            'has_more': self.has_more,
+            'results': data,
+        })
+
+    def get_next_cursor(self):
+        # Lignes plus anciennes disponibles uniquement en parcours vers le passé
+        if not self.forward and self.has_more:
+            return self.oldest_cursor
+        return None
+
+    def get_next_link(self):
+        cursor = self.get_next_cursor()
+        if cursor is None:
+            return None
+        return replace_query_param(self._clean_url(), 'before', cursor)
+
+    def get_previous_link(self):
+        if self.newest_cursor is None:
+            return None
+        return replace_query_param(self._clean_url(), 'after', self.newest_cursor)
+
+    def _clean_url(self):
+        url = self.base_url
+        for param in self.cursor_params:
+            url = remove_query_param(url, param)
+        return url
+
+    @staticmethod
+    def encode_cursor(obj):
+        raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii')
+            created_at, pk = raw.rsplit('|', 1)
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+
+class MessageCursorPagination(KeysetPagination):
+    page_size = 30
+    chronological = True
+    include_count = True
+
+
+class NotificationCursorPagination(KeysetPagination):
+    page_size = 20
+
+
+class ReviewCursorPagination(KeysetPagination):
+    page_size = 10
+    include_count = True
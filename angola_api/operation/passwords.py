@@ -0,0 +1,48 @@
+"""
+Politique de hachage des mots de passe et mesure de son coût.
+
+Le nombre d'itérations PBKDF2 est fixé par settings.PASSWORD_PBKDF2_ITERATIONS.
+Quand il change, le hash d'un utilisateur est recalculé à sa connexion
+suivante (`must_update`), dans un sens comme dans l'autre.
+
+Chaque vérification est mesurée dans l'histogramme `password_hash_seconds`,
+qui sert à dimensionner les workers.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from . import metrics
+
+hash_seconds = metrics.Histogram(
+    'password_hash_seconds',
+    "Durée de vérification d'un mot de passe (rehachage éventuel compris)",
+    labelnames=('algorithm', 'outcome'),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.4, 0.8, 1.6),
+)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 dont le facteur de travail vient des settings."""
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
+
+
+def check_password(user, raw_password):
+    """
+    Vérifie le mot de passe de `user` (et le rehache si la politique a
+    changé) en mesurant la durée de l'opération.
+    """
+    try:
+        algorithm = hashers.identify_hasher(user.password).algorithm
+    except ValueError:
+        algorithm = 'unknown'
+    start = time.perf_counter()
+    valid = user.check_password(raw_password)
+    hash_seconds.observe(
+        time.perf_counter() - start, algorithm=algorithm, outcome='success' if valid else 'failure'
+    )
+    return valid
@@ -0,0 +1,28 @@
+from decimal import Decimal
+
+from django.db.models import Avg, Count, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def rebuild_rating_aggregates(review_model, target_model, lookup):
+    """
+    Recalcule en une requête les agrégats des avis de `target_model`
+    (Provider ou ProviderService) ; `lookup` est le champ de Review qui
+    pointe vers ce modèle. Les modèles sont passés en paramètre pour pouvoir
+    être utilisés depuis une migration.
+    """
+    reviews = review_model.objects.filter(**{lookup: OuterRef('pk')}).order_by().values(lookup)
+
+    def aggregate(expression, default):
+        subquery = Subquery(reviews.annotate(value=expression).values('value')[:1])
+        return Coalesce(subquery, default)
+
+    decimal = DecimalField(max_digits=12, decimal_places=2)
+    return target_model.objects.update(
+        rating_count=aggregate(Count('pk'), 0),
+        rating_sum=aggregate(Sum('overall_rating'), Value(Decimal(0), output_field=decimal)),
+        quality_rating_sum=aggregate(Sum('quality_rating'), 0),
+        punctuality_rating_sum=aggregate(Sum('punctuality_rating'), 0),
+        value_rating_sum=aggregate(Sum('value_rating'), 0),
+        avg_rating=aggregate(Avg('overall_rating'), Value(Decimal(0), output_field=decimal)),
+    )
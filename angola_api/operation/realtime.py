@@ -0,0 +1,247 @@
+"""
+Canal temps réel (Server-Sent Events) pour les messages, les accusés de
+lecture et les notifications.
+
+Les événements sont publiés via un broker configurable
+(`settings.REALTIME_BROKER`). Le broker en mémoire (`InProcessBroker`) suffit
+pour les tests et un déploiement mono-nœud ; un broker multi-nœuds doit
+implémenter la même interface que `BaseBroker`.
+
+Le flux s'ouvre avec le jeton d'accès dans l'en-tête Authorization ou, pour
+EventSource qui ne peut pas envoyer d'en-tête, avec un ticket à usage unique
+(`?ticket=`, voir issue_ticket) valable REALTIME_TICKET_TIMEOUT secondes :
+le jeton d'accès n'apparaît jamais dans l'URL ni dans les journaux. Dans les
+deux cas, l'utilisateur doit exister et être actif.
+
+Les tickets sont rangés dans le cache de l'authentification
+(settings.AUTH_CACHE_ALIAS), partagé entre les workers. L'usage unique repose
+sur `delete()` qui indique si la clé existait (cas des backends de Django :
+mémoire locale, Redis, memcached, base, fichiers) : seul le premier appelant
+obtient True. Un backend dont `delete()` ne renvoie pas ce résultat laisserait
+rejouer un ticket pendant sa validité.
+"""
+import asyncio
+import json
+import logging
+import secrets
+import threading
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class BaseBroker:
+    """Interface d'un broker d'événements temps réel."""
+
+    def publish(self, user_ids, event):
+        """Diffuse `event` (dict) à toutes les connexions des utilisateurs donnés."""
+        raise NotImplementedError
+
+    def subscribe(self, user_id):
+        """Context manager asynchrone retournant une asyncio.Queue d'événements."""
+        raise NotImplementedError
+
+    def is_online(self, user_id):
+        """Indique si l'utilisateur a au moins une connexion ouverte."""
+        raise NotImplementedError
+
+
+class InProcessBroker(BaseBroker):
+    """Broker en mémoire, limité aux connexions du processus courant."""
+    queue_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, user_ids, event):
+        with self._lock:
+            targets = [
+                subscriber
+                for user_id in set(user_ids)
+                for subscriber in self._subscribers.get(user_id, ())
+            ]
+        for loop, queue in targets:
+            # publish() est appelé depuis les threads des vues synchrones
+            loop.call_soon_threadsafe(self._deliver, queue, event)
+
+    @staticmethod
+    def _deliver(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("File temps réel pleine, événement %s ignoré", event.get('type'))
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.queue_size))
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(user_id)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._subscribers[user_id]
+
+    def is_online(self, user_id):
+        with self._lock:
+            return bool(self._subscribers.get(user_id))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'REALTIME_BROKER', 'operation.realtime.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish(user_ids, event_type, data):
+    """
+    Publie un événement après la validation de la transaction courante, pour
+    ne jamais annoncer une ligne qui serait finalement annulée.
+    """
+    event = {'type': event_type, 'data': data}
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if user_ids:
+        transaction.on_commit(lambda: get_broker().publish(user_ids, event))
+
+
+def is_online(user_id):
+    return get_broker().is_online(user_id)
+
+
+TICKET_KEY_PREFIX = 'realtime:ticket'
+
+
+def get_ticket_cache():
+    return caches[getattr(settings, 'AUTH_CACHE_ALIAS', 'default')]
+
+
+def issue_ticket(user_id):
+    """Ticket à usage unique ouvrant le flux de `user_id` ; retourne (ticket, durée de validité)."""
+    ticket = secrets.token_urlsafe(32)
+    timeout = getattr(settings, 'REALTIME_TICKET_TIMEOUT', 30)
+    get_ticket_cache().set(f'{TICKET_KEY_PREFIX}:{ticket}', user_id, timeout)
+    return ticket, timeout
+
+
+def _redeem_ticket(ticket):
+    key = f'{TICKET_KEY_PREFIX}:{ticket}'
+    cache = get_ticket_cache()
+    user_id = cache.get(key)
+    # delete() ne renvoie True qu'au premier appel (voir l'en-tête du module) : un ticket rejoué est refusé
+    if user_id is None or not cache.delete(key):
+        return None
+    return user_id
+
+
+def _authenticate(scope):
+    """Id de l'utilisateur actif du jeton (en-tête Authorization) ou du ticket (?ticket=), sinon None."""
+    from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+    from .authentication import CachedJWTAuthentication, load_identity
+
+    authentication = CachedJWTAuthentication()
+    header = dict(scope.get('headers', [])).get(b'authorization')
+    if header is not None:
+        raw_token = authentication.get_raw_token(header)
+        if raw_token is None:
+            return None
+        try:
+            return authentication.get_user(authentication.get_validated_token(raw_token)).pk
+        except (InvalidToken, AuthenticationFailed):
+            return None
+
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    ticket = (query.get('ticket') or [None])[0]
+    user_id = _redeem_ticket(ticket) if ticket else None
+    if user_id is None:
+        return None
+    identity = load_identity(user_id)
+    return user_id if identity is not None and identity['is_active'] else None
+
+
+class EventStreamApp:
+    """
+    Application ASGI servant le flux SSE d'un utilisateur authentifié.
+    Un commentaire est envoyé régulièrement pour garder la connexion ouverte.
+    """
+
+    def __init__(self, broker=None, heartbeat=None):
+        self.broker = broker
+        self.heartbeat = heartbeat
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        user_id = await sync_to_async(_authenticate)(scope)
+        if user_id is None:
+            await send({
+                'type': 'http.response.start', 'status': 401,
+                'headers': [(b'content-type', b'application/json')],
+            })
+            await send({'type': 'http.response.body', 'body': b'{"detail": "Authentification requise"}'})
+            return
+
+        broker = self.broker or get_broker()
+        heartbeat = self.heartbeat or getattr(settings, 'REALTIME_HEARTBEAT', 15)
+        async with broker.subscribe(int(user_id)) as queue:
+            disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+            try:
+                await send({
+                    'type': 'http.response.start', 'status': 200,
+                    'headers': [
+                        (b'content-type', b'text/event-stream'),
+                        (b'cache-control', b'no-cache'),
+                        (b'x-accel-buffering', b'no'),
+                    ],
+                })
+                await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+                while True:
+                    next_event = asyncio.ensure_future(queue.get())
+                    done, _ = await asyncio.wait(
+                        {next_event, disconnected}, timeout=heartbeat,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    if disconnected in done:
+                        next_event.cancel()
+                        break
+                    if next_event in done:
+                        body = self.format_event(next_event.result())
+                    else:
+                        next_event.cancel()
+                        body = b': ping\n\n'
+                    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+            finally:
+                disconnected.cancel()
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+    @staticmethod
+    def format_event(event):
+        data = json.dumps(event['data'], cls=DjangoJSONEncoder, ensure_ascii=False)
+        return f"event: {event['type']}\ndata: {data}\n\n".encode('utf-8')
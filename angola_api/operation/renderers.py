@@ -0,0 +1,30 @@
+"""
+Rendu JSON rapide des réponses de l'API.
+
+FastJSONRenderer s'appuie sur orjson lorsqu'il est installé : Decimal,
+datetime, date et UUID sont encodés nativement, sans passer par l'encodeur
+Python de DRF. Sans orjson, ou pour une sortie indentée (API navigable), le
+rendu retombe sur le JSONRenderer de DRF, avec le même résultat.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # dépendance optionnelle
+    orjson = None
+
+if orjson is not None:
+    # Z pour UTC comme l'encodeur de DRF, clés entières acceptées comme json.dumps
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+    # Decimal, chaînes traduites, timedelta... : même conversion que DRF
+    _default = encoders.JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
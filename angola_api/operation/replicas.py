@@ -0,0 +1,187 @@
+"""
+Lectures sur les réplicas PostgreSQL (settings.DATABASE_REPLICAS).
+
+ReplicaRoutingMiddleware choisit, pour chaque requête GET/HEAD/OPTIONS, un
+réplica dont le retard de réplication ne dépasse pas REPLICA_MAX_LAG
+secondes (mesuré au plus toutes les REPLICA_LAG_CHECK_INTERVAL secondes par
+worker). ReplicaRouter y envoie les lectures de la requête. Tout le reste lit
+et écrit sur `default` :
+
+- les méthodes qui modifient, les commandes et les tâches d'arrière-plan ;
+- les lectures faites dans une transaction (bloc atomic) ;
+- la suite d'une requête dès sa première écriture ;
+- les vues qui déclarent `replica_reads = False` ;
+- pendant REPLICA_PIN_SECONDS après une écriture, les requêtes du même client
+  (utilisateur du token JWT, sinon adresse IP du client derrière les
+  NUM_PROXIES proxys de confiance), qui relisent ainsi leurs propres
+  modifications.
+
+Les tests du routage (ReplicaRoutingTests) tournent dès qu'un réplica est
+déclaré, par exemple `"REPLICAS": [{"HOST": "127.0.0.1"}]` à côté d'une base
+locale : en test, le réplica est un miroir de `default` ouvert sur une
+seconde connexion.
+"""
+import contextvars
+import hashlib
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+PIN_KEY_PREFIX = 'replicas:pin'
+# Retard de réplication en secondes ; 0 sur un primaire
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+_routing = contextvars.ContextVar('replica_routing', default=None)
+# alias -> (instant de la mesure, réplica utilisable), propre à chaque worker
+_health = {}
+
+
+class RoutingState:
+    """Base de lecture de la requête en cours (None : `default`)."""
+
+    def __init__(self):
+        self.alias = None
+        self.wrote = False
+
+
+def replica_lag(alias):
+    """Retard de réplication de `alias` en secondes (0 pour un moteur qui ne l'expose pas)."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        lag = cursor.fetchone()[0]
+    return float(lag or 0)
+
+
+def is_healthy(alias):
+    now = time.monotonic()
+    checked = _health.get(alias)
+    if checked is not None and now - checked[0] < getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5):
+        return checked[1]
+    try:
+        lag = replica_lag(alias)
+    except DatabaseError as exc:
+        logger.warning("Réplica %s injoignable : %s", alias, exc)
+        healthy = False
+    else:
+        healthy = lag <= getattr(settings, 'REPLICA_MAX_LAG', 2)
+        if not healthy:
+            logger.warning("Réplica %s ignoré : %.1f s de retard", alias, lag)
+    _health[alias] = (now, healthy)
+    return healthy
+
+
+def choose_replica():
+    """Un réplica utilisable au hasard, ou None."""
+    candidates = [alias for alias in getattr(settings, 'DATABASE_REPLICAS', ()) if is_healthy(alias)]
+    return random.choice(candidates) if candidates else None
+
+
+def use_primary():
+    """Envoie les lectures restantes de la requête en cours sur `default`."""
+    state = _routing.get()
+    if state is not None:
+        state.alias = None
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def client_key(request):
+    """
+    Identifiant du client pour l'épinglage : utilisateur du token JWT, sinon
+    adresse IP, lue comme par les limitations de connexion (NUM_PROXIES).
+    """
+    if not hasattr(request, '_replica_client_key'):
+        ident = f"ip:{BaseThrottle().get_ident(request)}"
+        authentication = JWTAuthentication()
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else None
+        if raw_token is not None:
+            try:
+                token = authentication.get_validated_token(raw_token)
+                ident = f"user:{token[api_settings.USER_ID_CLAIM]}"
+            except (InvalidToken, TokenError, KeyError):
+                pass
+        request._replica_client_key = hashlib.sha256(ident.encode('utf-8')).hexdigest()
+    return request._replica_client_key
+
+
+def _pin_key(key):
+    return f'{PIN_KEY_PREFIX}:{key}'
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or state.alias is None or state.wrote:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        # Une instance lue sur un réplica s'enregistre sur le primaire
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Les réplicas contiennent les mêmes données que le primaire
+        databases = {DEFAULT_DB_ALIAS, *getattr(settings, 'DATABASE_REPLICAS', ())}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState()
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if state.wrote and getattr(settings, 'DATABASE_REPLICAS', ()):
+            cache.set(_pin_key(client_key(request)), 1, pin_seconds())
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _routing.get()
+        if state is None or request.method not in SAFE_METHODS:
+            return None
+        if not getattr(settings, 'DATABASE_REPLICAS', ()):
+            return None
+        view_class = getattr(view_func, 'cls', view_func)
+        if not getattr(view_class, 'replica_reads', True):
+            return None
+        if cache.get(_pin_key(client_key(request))) is None:
+            state.alias = choose_replica()
+        return None
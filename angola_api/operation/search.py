@@ -0,0 +1,177 @@
+"""
+Recherche plein texte des services, des prestataires et du catalogue.
+
+Sous PostgreSQL, chaque ProviderService et Provider porte un `search_vector`
+(tsvector pondéré, indexé GIN) construit avec deux configurations sans
+accents, portugaise et française (voir la migration 0015), recalculé par un
+seul UPDATE par ensemble de lignes. Un index trigramme sur le titre / le nom
+de société tolère les fautes de frappe. Les catégories et sous-catégories,
+peu nombreuses, sont cherchées avec les mêmes configurations sans vecteur
+stocké. Sur un autre moteur de base de données, la recherche retombe sur des
+filtres `icontains`.
+"""
+from django.apps import apps as global_apps
+from django.contrib.postgres.lookups import Unaccent
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Coalesce, Concat
+from rest_framework import filters
+
+SEARCH_CONFIGS = ('angola_pt', 'angola_fr')
+# Poids de la similarité trigramme (fautes de frappe) dans le score final
+TRIGRAM_WEIGHT = 0.5
+# Seuil par défaut de pg_trgm.word_similarity_threshold (opérateur <%)
+TRIGRAM_WORD_THRESHOLD = 0.6
+
+
+def is_enabled():
+    return connection.vendor == 'postgresql'
+
+
+def build_vector(*weighted_expressions):
+    """tsvector pondéré à partir de couples (expression, poids) pour chaque configuration."""
+    vector = None
+    for expression, weight in weighted_expressions:
+        for config in SEARCH_CONFIGS:
+            part = SearchVector(expression, config=config, weight=weight)
+            vector = part if vector is None else vector + part
+    return vector
+
+
+def build_query(term):
+    query = None
+    for config in SEARCH_CONFIGS:
+        part = SearchQuery(term, config=config, search_type='websearch')
+        query = part if query is None else query | part
+    return query
+
+
+def _related_text(queryset, *parts):
+    """Sous-requête concaténant `parts` (champs séparés par des espaces) de la ligne liée."""
+    words = []
+    for part in parts:
+        words += [Value(' '), part] if words else [part]
+    return Subquery(
+        queryset.annotate(text=Concat(*words, output_field=TextField())).values('text')[:1],
+        output_field=TextField(),
+    )
+
+
+def service_vector(apps=global_apps):
+    SubCategory = apps.get_model('operation', 'SubCategory')
+    catalog_names = _related_text(
+        SubCategory.objects.filter(pk=OuterRef('subcategory_id')), 'name', 'category__name'
+    )
+    return build_vector(('title', 'A'), (catalog_names, 'B'), ('description', 'C'))
+
+
+def provider_vector(apps=global_apps):
+    User = apps.get_model('operation', 'User')
+    user_names = _related_text(
+        User.objects.filter(pk=OuterRef('user_id')), 'first_name', 'last_name', 'username'
+    )
+    return build_vector(('company_name', 'A'), (user_names, 'A'), ('address', 'C'))
+
+
+def update_service_vectors(service_ids, apps=global_apps):
+    """Recalcule les vecteurs des services `service_ids` en un seul UPDATE."""
+    if not is_enabled():
+        return 0
+    ProviderService = apps.get_model('operation', 'ProviderService')
+    return ProviderService.objects.filter(pk__in=service_ids).update(search_vector=service_vector(apps))
+
+
+def update_provider_vectors(provider_ids, apps=global_apps):
+    """Recalcule les vecteurs des prestataires `provider_ids` en un seul UPDATE."""
+    if not is_enabled():
+        return 0
+    Provider = apps.get_model('operation', 'Provider')
+    return Provider.objects.filter(pk__in=provider_ids).update(search_vector=provider_vector(apps))
+
+
+def rebuild_all(apps=global_apps):
+    """Reconstruit tous les vecteurs (un UPDATE par table) ; retourne (services, prestataires)."""
+    ProviderService = apps.get_model('operation', 'ProviderService')
+    Provider = apps.get_model('operation', 'Provider')
+    return (
+        ProviderService.objects.update(search_vector=service_vector(apps)),
+        Provider.objects.update(search_vector=provider_vector(apps)),
+    )
+
+
+def search_services(queryset, term):
+    """Services correspondant à `term`, annotés d'un `score` et triés par pertinence."""
+    if not is_enabled():
+        return queryset.filter(
+            Q(title__icontains=term) | Q(description__icontains=term)
+            | Q(subcategory__name__icontains=term) | Q(subcategory__category__name__icontains=term)
+        ).annotate(score=Value(0.0, output_field=FloatField())).order_by('-created_at')
+
+    query = build_query(term)
+    return queryset.annotate(
+        rank=SearchRank(F('search_vector'), query),
+        similarity=TrigramWordSimilarity(term, 'title'),
+    ).filter(
+        Q(search_vector=query) | Q(title__trigram_word_similar=term)
+    ).annotate(
+        score=F('rank') + Coalesce(F('similarity'), 0.0) * TRIGRAM_WEIGHT
+    ).order_by('-score', 'pk')
+
+
+def search_providers(queryset, term):
+    """Prestataires correspondant à `term`, annotés d'un `score` et triés par pertinence."""
+    if not is_enabled():
+        return queryset.filter(
+            Q(company_name__icontains=term) | Q(user__username__icontains=term)
+            | Q(user__first_name__icontains=term) | Q(user__last_name__icontains=term)
+        ).annotate(score=Value(0.0, output_field=FloatField())).order_by('-created_at')
+
+    query = build_query(term)
+    return queryset.annotate(
+        rank=SearchRank(F('search_vector'), query),
+        similarity=TrigramWordSimilarity(term, 'company_name'),
+    ).filter(
+        Q(search_vector=query) | Q(company_name__trigram_word_similar=term)
+    ).annotate(
+        score=F('rank') + Coalesce(F('similarity'), 0.0) * TRIGRAM_WEIGHT
+    ).order_by('-score', 'pk')
+
+
+def search_catalog(queryset, term):
+    """
+    Catégories ou sous-catégories correspondant à `term` (nom et description),
+    annotées d'un `score` et triées par pertinence.
+    """
+    if not is_enabled():
+        return queryset.filter(
+            Q(name__icontains=term) | Q(description__icontains=term)
+        ).annotate(score=Value(0.0, output_field=FloatField())).order_by('name', 'pk')
+
+    query = build_query(term)
+    return queryset.annotate(
+        document=build_vector(('name', 'A'), ('description', 'B')),
+        similarity=TrigramWordSimilarity(Unaccent(Value(term)), Unaccent(F('name'))),
+    ).filter(
+        Q(document=query) | Q(similarity__gte=TRIGRAM_WORD_THRESHOLD)
+    ).annotate(
+        score=SearchRank(F('document'), query) + Coalesce(F('similarity'), 0.0) * TRIGRAM_WEIGHT
+    ).order_by('-score', 'pk')
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter utilisant l'index plein texte pour les vues dont la vue
+    déclare `full_text_search` (search_services, search_providers ou
+    search_catalog).
+    Sans PostgreSQL, le comportement de SearchFilter (search_fields) s'applique.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search = getattr(view, 'full_text_search', None)
+        term = request.query_params.get(self.search_param, '').strip()
+        if search is None or not term or not is_enabled():
+            return super().filter_queryset(request, queryset, view)
+        return search(queryset, term)
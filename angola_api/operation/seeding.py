@@ -0,0 +1,272 @@
+"""
+Jeu de données synthétique pour les mesures de performance (commande
+seed_data, voir aussi run_benchmarks).
+
+Les lignes sont insérées par lots avec bulk_create, sans passer par save()
+ni par les signaux : les valeurs que ceux-ci maintiennent (geohash, note
+globale des avis) sont calculées ici, puis les données dénormalisées sont
+recalculées en fin de génération (agrégats des avis, vecteurs de recherche,
+dernier message et compteurs des conversations, statistiques du tableau de
+bord, réponses en cache).
+
+Les comptes générés ont un nom d'utilisateur préfixé par USERNAME_PREFIX et
+partagent le mot de passe PASSWORD. Les dates de création sont réparties sur
+les `days` derniers jours. Une même graine donne le même jeu de données.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import caching, catalog, geo, search, stats
+from .models import Conversation, Message, Provider, ProviderService, Review, SubCategory, User
+from .ratings import rebuild_rating_aggregates
+
+USERNAME_PREFIX = 'seed_'
+PASSWORD = 'seed-password'
+
+# Villes (nom, latitude, longitude, poids) autour desquelles sont placés les prestataires
+CITIES = (
+    ('Luanda', -8.8383, 13.2344, 6),
+    ('Huambo', -12.7761, 15.7392, 1),
+    ('Benguela', -12.5763, 13.4055, 1),
+    ('Lubango', -14.9177, 13.4925, 1),
+    ('Cabinda', -5.5500, 12.2000, 1),
+)
+# Écart maximal en degrés autour du centre de la ville (environ 20 km)
+CITY_SPREAD = 0.2
+
+FIRST_NAMES = (
+    'Ana', 'António', 'Beatriz', 'Carlos', 'Domingos', 'Esperança', 'Filomena', 'Francisco',
+    'Helena', 'Isabel', 'João', 'Joaquim', 'Luísa', 'Manuel', 'Maria', 'Mateus', 'Nzinga',
+    'Paulo', 'Rosa', 'Teresa',
+)
+LAST_NAMES = (
+    'Almeida', 'Baptista', 'Cardoso', 'Costa', 'Domingos', 'Fernandes', 'Gomes', 'Kiala',
+    'Lopes', 'Mendes', 'Neto', 'Pereira', 'Santos', 'Silva', 'Sousa', 'Tavares',
+)
+WORDS = (
+    'rapide', 'professionnel', 'soigné', 'disponible', 'urgence', 'domicile', 'qualité',
+    'devis', 'gratuit', 'installation', 'réparation', 'entretien', 'garantie', 'expérience',
+    'matériel', 'fourni', 'week-end', 'quartier', 'centre', 'moderne', 'conseil', 'sur mesure',
+)
+PRICE_TYPES = ('fixed', 'hourly', 'daily', 'negotiable', 'quote')
+# Répartition des notes de 1 à 5
+RATING_WEIGHTS = (1, 1, 2, 4, 5)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Laisse bulk_create écrire les created_at / updated_at fournis (auto_now désactivé)."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def seed_users():
+    return User.objects.filter(username__startswith=USERNAME_PREFIX)
+
+
+def flush():
+    """Supprime les comptes générés et tout ce qui en dépend, puis recalcule les données dénormalisées."""
+    deleted, _ = seed_users().delete()
+    refresh_denormalized()
+    return deleted
+
+
+def refresh_denormalized():
+    rebuild_rating_aggregates(Review, Provider, 'provider')
+    rebuild_rating_aggregates(Review, ProviderService, 'service')
+    if search.is_enabled():
+        search.rebuild_all()
+    stats.rebuild()
+    caching.bump('providers', 'services', 'reviews')
+    catalog.invalidate()
+
+
+class Generator:
+    def __init__(self, seed=0, days=365, batch_size=2000, log=None):
+        self.random = random.Random(seed)
+        self.now = timezone.now()
+        self.days = days
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.subcategories = list(SubCategory.objects.values_list('id', 'name'))
+
+    def timestamp(self):
+        return self.now - timedelta(seconds=self.random.uniform(0, self.days * 86400))
+
+    def sentence(self, words=8):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+    def insert(self, model, objects):
+        """Insère `objects` (itérable) par lots ; retourne les ids dans l'ordre."""
+        ids, batch = [], []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                ids.extend(obj.pk for obj in model.objects.bulk_create(batch))
+                batch = []
+                self.log(f"{model.__name__} : {len(ids)}")
+        if batch:
+            ids.extend(obj.pk for obj in model.objects.bulk_create(batch))
+        return ids
+
+    def users(self, role, count, password):
+        for index in range(count):
+            created_at = self.timestamp()
+            username = f'{USERNAME_PREFIX}{role}_{index}'
+            yield User(
+                username=username, email=f'{username}@example.com', password=password, role=role,
+                first_name=self.random.choice(FIRST_NAMES), last_name=self.random.choice(LAST_NAMES),
+                date_joined=created_at, created_at=created_at, updated_at=created_at,
+            )
+
+    def providers(self, user_ids):
+        weights = [city[3] for city in CITIES]
+        for user_id in user_ids:
+            name, latitude, longitude, _ = self.random.choices(CITIES, weights)[0]
+            latitude = round(latitude + self.random.uniform(-CITY_SPREAD, CITY_SPREAD), 6)
+            longitude = round(longitude + self.random.uniform(-CITY_SPREAD, CITY_SPREAD), 6)
+            created_at = self.timestamp()
+            yield Provider(
+                user_id=user_id, company_name=f'{self.random.choice(LAST_NAMES)} & Filhos',
+                address=name, latitude=Decimal(str(latitude)), longitude=Decimal(str(longitude)),
+                geohash=geo.encode(latitude, longitude), is_verified=self.random.random() < 0.3,
+                created_at=created_at, updated_at=created_at,
+            )
+
+    def services(self, provider_ids, count, owners):
+        for _ in range(count):
+            provider_id = self.random.choice(provider_ids)
+            subcategory_id, subcategory_name = self.random.choice(self.subcategories)
+            owners.append(provider_id)
+            created_at = self.timestamp()
+            yield ProviderService(
+                provider_id=provider_id, subcategory_id=subcategory_id,
+                title=f'{subcategory_name} {self.random.choice(WORDS)}'[:100],
+                description=self.sentence(30), price=Decimal(self.random.randrange(1000, 100000, 500)),
+                price_type=self.random.choice(PRICE_TYPES), is_available=self.random.random() < 0.9,
+                created_at=created_at, updated_at=created_at,
+            )
+
+    def reviews(self, client_ids, service_ids, owners, count):
+        for _ in range(count):
+            index = self.random.randrange(len(service_ids))
+            ratings = self.random.choices(range(1, 6), RATING_WEIGHTS, k=3)
+            created_at = self.timestamp()
+            yield Review(
+                client_id=self.random.choice(client_ids), provider_id=owners[index],
+                service_id=service_ids[index],
+                quality_rating=ratings[0], punctuality_rating=ratings[1], value_rating=ratings[2],
+                # Calcul de Review.save()
+                overall_rating=(Decimal(sum(ratings)) / 3).quantize(Decimal('0.01')),
+                comment=self.sentence(), is_verified=self.random.random() < 0.5,
+                created_at=created_at, updated_at=created_at,
+            )
+
+    def conversations(self, client_ids, provider_ids, count, participants):
+        for _ in range(count):
+            created_at = self.timestamp()
+            client_id, index = self.random.choice(client_ids), self.random.randrange(len(provider_ids))
+            participants.append((created_at, client_id, index))
+            yield Conversation(
+                client_id=client_id, provider_id=provider_ids[index],
+                created_at=created_at, updated_at=created_at,
+            )
+
+    def messages(self, conversations, count):
+        """
+        Répartit `count` messages entre les conversations, données comme
+        (id, début, id du client, id de l'utilisateur prestataire) ; seuls
+        les derniers messages peuvent être non lus.
+        """
+        per_conversation, remainder = divmod(count, len(conversations))
+        for index, (conversation_id, started, client_id, provider_user_id) in enumerate(conversations):
+            total = per_conversation + (index < remainder)
+            unread = self.random.randrange(1, 4) if self.random.random() < 0.3 else 0
+            span = (self.now - started).total_seconds()
+            offsets = sorted(self.random.uniform(0, span) for _ in range(total))
+            for position, offset in enumerate(offsets):
+                sent_at = started + timedelta(seconds=offset)
+                yield Message(
+                    conversation_id=conversation_id,
+                    sender_id=self.random.choice((client_id, provider_user_id)),
+                    content=self.sentence(self.random.randrange(3, 20)),
+                    is_read=position < total - unread,
+                    created_at=sent_at, updated_at=sent_at,
+                )
+
+    def run(self, providers, services, clients, reviews, conversations, messages):
+        counts = dict.fromkeys(
+            ('clients', 'providers', 'services', 'reviews', 'conversations', 'messages'), 0
+        )
+        # Un seul hachage pour tous les comptes (voir PASSWORD)
+        password = make_password(PASSWORD)
+        with explicit_timestamps(User, Provider, ProviderService, Review, Conversation, Message):
+            client_ids = self.insert(User, self.users('client', clients, password))
+            provider_user_ids = self.insert(User, self.users('provider', providers, password))
+            provider_ids = self.insert(Provider, self.providers(provider_user_ids))
+            counts.update(clients=len(client_ids), providers=len(provider_ids))
+            if not client_ids or not provider_ids:
+                return counts
+
+            owners = []
+            service_ids = self.insert(ProviderService, self.services(provider_ids, services, owners))
+            counts['services'] = len(service_ids)
+            if service_ids:
+                counts['reviews'] = len(self.insert(Review, self.reviews(client_ids, service_ids, owners, reviews)))
+
+            participants = []
+            conversation_ids = self.insert(
+                Conversation, self.conversations(client_ids, provider_ids, conversations, participants)
+            )
+            counts['conversations'] = len(conversation_ids)
+            if conversation_ids and messages:
+                rows = [
+                    (pk, started, client_id, provider_user_ids[index])
+                    for pk, (started, client_id, index) in zip(conversation_ids, participants)
+                ]
+                counts['messages'] = len(self.insert(Message, self.messages(rows, messages)))
+
+        self.log("Recalcul des conversations")
+        refresh_conversations()
+        self.log("Recalcul des agrégats, de l'index de recherche et des statistiques")
+        refresh_denormalized()
+        return counts
+
+
+def refresh_conversations():
+    """Dernier message, date et compteurs de non-lus des conversations générées (une requête)."""
+    messages = Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at', '-id')
+    unread = Message.objects.filter(conversation=OuterRef('pk'), is_read=False).order_by().values('conversation')
+    from_client = Q(sender=OuterRef('client'))
+    return Conversation.objects.filter(client__username__startswith=USERNAME_PREFIX).update(
+        last_message=Subquery(messages.values('pk')[:1]),
+        updated_at=Coalesce(Subquery(messages.values('created_at')[:1]), F('created_at')),
+        client_unread_count=Coalesce(
+            Subquery(unread.exclude(from_client).annotate(n=Count('pk')).values('n')), Value(0)
+        ),
+        provider_unread_count=Coalesce(
+            Subquery(unread.filter(from_client).annotate(n=Count('pk')).values('n')), Value(0)
+        ),
+    )
+
+
+def generate(providers, services, clients, reviews, conversations, messages, **options):
+    """Génère le jeu de données ; retourne le nombre de lignes créées par type."""
+    return Generator(**options).run(providers, services, clients, reviews, conversations, messages)
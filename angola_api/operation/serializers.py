@@ -1,7 +1,7 @@
-import random
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 from django.contrib.auth import get_user_model
-from django.db.models import Avg
+from . import images, realtime
 from .models import (
     Category, QuoteRequest, ServiceGalleryImage, ServiceOption, SubCategory, Provider, ProviderService, Portfolio, 
     Certificate, Review, ReviewImage, Favorite, Conversation, 
@@ -10,11 +10,24 @@ from .models import (
 
 User = get_user_model()
 
+class ImageVariantsField(serializers.Field):
+    """URLs des déclinaisons d'une image : {taille: {format: url}} (voir images.py)."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return images.variant_urls(value, self.context.get('request'))
+
 class UserSerializer(serializers.ModelSerializer):
+    profile_picture_variants = ImageVariantsField(source='profile_picture')
+
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 'phone_number', 
-                 'bio', 'profile_picture', 'role', 'is_verified', 'location', 'date_joined')
+                 'bio', 'profile_picture', 'profile_picture_variants', 'role', 'is_verified',
+                 'location', 'date_joined')
         read_only_fields = ('date_joined', 'is_verified')
         extra_kwargs = {'password': {'write_only': True}}
     
@@ -50,10 +63,11 @@ class ServiceOptionSerializer(serializers.ModelSerializer):
 
 class ServiceGalleryImageSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField(source='image')
     
     class Meta:
         model = ServiceGalleryImage
-        fields = ('id', 'image', 'image_url', 'caption', 'order')
+        fields = ('id', 'image', 'image_url', 'image_variants', 'caption', 'order')
     
     def get_image_url(self, obj):
         if obj.image:
@@ -67,6 +81,7 @@ class ProviderServiceSerializer(serializers.ModelSerializer):
     category_id = serializers.SerializerMethodField()
     avg_rating = serializers.SerializerMethodField()
     image_url = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField(source='image')
     gallery_images = ServiceGalleryImageSerializer(many=True, read_only=True)
     options = ServiceOptionSerializer(many=True, read_only=True)
     is_available = serializers.BooleanField(default=True)
@@ -75,11 +90,12 @@ class ProviderServiceSerializer(serializers.ModelSerializer):
         model = ProviderService
         fields = ('id', 'title', 'description', 'price', 'price_type', 'is_available',
                  'subcategory', 'subcategory_name', 'category_name', 'category_id',
-                 'avg_rating', 'image', 'image_url', 'gallery_images', 'options')
+                 'avg_rating', 'image', 'image_url', 'image_variants', 'gallery_images', 'options')
         # read_only_fields = ('provider',)
     
     def get_avg_rating(self, obj):
-        return obj.reviews.aggregate(avg=Avg('overall_rating')).get('avg') or 0
+        # Moyenne maintenue de façon incrémentale par Review
+        return obj.avg_rating
 
     def get_category_id(self, obj):
         if obj.subcategory and obj.subcategory.category:
@@ -139,9 +155,11 @@ class ProviderServiceSerializer(serializers.ModelSerializer):
 
     
 class PortfolioSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField(source='image')
+
     class Meta:
         model = Portfolio
-        fields = ('id', 'title', 'description', 'image', 'created_at')
+        fields = ('id', 'title', 'description', 'image', 'image_variants', 'created_at')
         read_only_fields = ('provider',)
 
 class CertificateSerializer(serializers.ModelSerializer):
@@ -152,13 +170,16 @@ class CertificateSerializer(serializers.ModelSerializer):
         read_only_fields = ('provider', 'is_verified')
 
 class ReviewImageSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField(source='image')
+
     class Meta:
         model = ReviewImage
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'image_variants')
 
 class ReviewSerializer(serializers.ModelSerializer):
     client_name = serializers.StringRelatedField(source='client.username', read_only=True)
     client_picture = serializers.ImageField(source='client.profile_picture', read_only=True)
+    client_picture_variants = ImageVariantsField(source='client.profile_picture')
     images = ReviewImageSerializer(many=True, read_only=True)
     uploaded_images = serializers.ListField(
         child=serializers.ImageField(max_length=1000000, allow_empty_file=False, use_url=False),
@@ -167,8 +188,8 @@ class ReviewSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Review
-        fields = ('id', 'client', 'client_name', 'client_picture', 'provider', 'service',
-                 'quality_rating', 'punctuality_rating', 'value_rating', 'overall_rating',
+        fields = ('id', 'client', 'client_name', 'client_picture', 'client_picture_variants',
+                 'provider', 'service', 'quality_rating', 'punctuality_rating', 'value_rating', 'overall_rating',
                  'comment', 'is_verified', 'created_at', 'images', 'uploaded_images')
         read_only_fields = ('client', 'is_verified', 'overall_rating')
     
@@ -197,15 +218,27 @@ class ProviderListSerializer(serializers.ModelSerializer):
     def get_full_name(self, obj):
         return f"{obj.user.first_name} {obj.user.last_name}".strip() or obj.user.username
     
+    # Les valeurs sont normalement annotées par Provider.objects.with_listing_data();
+    # on ne retombe sur des requêtes individuelles que pour un objet non annoté.
+    # Le nombre d'avis est stocké sur Provider.rating_count.
     def get_services_count(self, obj):
+        if hasattr(obj, 'services_count'):
+            return obj.services_count
         return obj.provider_services.count()
     
     def get_reviews_count(self, obj):
-        return obj.reviews_received.count()
+        return obj.rating_count
     
     def get_main_category(self, obj):
         # Returns the most used category by this provider
-        service = obj.provider_services.first()
+        if hasattr(obj, 'main_category_id'):
+            if obj.main_category_id is None:
+                return None
+            return {
+                'category_id': obj.main_category_id,
+                'category_name': obj.main_category_name
+            }
+        service = obj.provider_services.select_related('subcategory__category').first()
         if service:
             return {
                 'category_id': service.subcategory.category.id,
@@ -213,6 +246,16 @@ class ProviderListSerializer(serializers.ModelSerializer):
             }
         return None
 
+class NearbyProviderSerializer(ProviderListSerializer):
+    distance_km = serializers.SerializerMethodField()
+
+    class Meta(ProviderListSerializer.Meta):
+        fields = ProviderListSerializer.Meta.fields + ('distance_km',)
+
+    def get_distance_km(self, obj):
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 3) if distance is not None else None
+
 class ProviderDetailSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     services = ProviderServiceSerializer(source='provider_services', many=True, read_only=True)
@@ -227,11 +270,18 @@ class ProviderDetailSerializer(serializers.ModelSerializer):
                  'avg_rating', 'trust_score', 'address', 'latitude', 'longitude',
                  'services', 'portfolio', 'certificates', 'reviews', 'is_favorited')
     
+    # `recent_reviews` et `is_favorited` sont chargés par
+    # Provider.objects.with_profile_data() ; sinon requêtes individuelles.
     def get_reviews(self, obj):
-        reviews = obj.reviews_received.all().order_by('-created_at')[:5]
+        if hasattr(obj, 'recent_reviews'):
+            reviews = obj.recent_reviews
+        else:
+            reviews = obj.reviews_received.all().order_by('-created_at')[:5]
         return ReviewSerializer(reviews, many=True).data
     
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.favorited_by.filter(user=request.user).exists()
@@ -253,7 +303,7 @@ class MessageSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Message
-        fields = ('id', 'sender_id', 'sender_name', 'sender_picture', 'content', 
+        fields = ('id', 'client_message_id', 'sender_id', 'sender_name', 'sender_picture', 'content', 
                  'is_read', 'created_at', 'is_mine')
     
     def get_sender_name(self, obj):
@@ -270,6 +320,11 @@ class MessageSerializer(serializers.ModelSerializer):
             return obj.sender.id == int(user_id)
         return False
 
+class OutgoingMessageSerializer(serializers.Serializer):
+    """Message d'un lot envoyé à send_messages."""
+    client_message_id = serializers.CharField(max_length=64, required=False, allow_null=True, allow_blank=True)
+    content = serializers.CharField()
+
 class ConversationSerializer(serializers.ModelSerializer):
     client = UserSerializer()
     provider = serializers.SerializerMethodField()
@@ -294,11 +349,11 @@ class ConversationSerializer(serializers.ModelSerializer):
         return provider_data
     
     def get_last_message(self, obj):
-        message = obj.messages.order_by('-created_at').first()
+        message = obj.last_message
         if message:
             return {
                 'content': message.content,
-                'sender_id': message.sender.id,
+                'sender_id': message.sender_id,
                 'created_at': message.created_at,
                 'is_read': message.is_read
             }
@@ -308,29 +363,24 @@ class ConversationSerializer(serializers.ModelSerializer):
         user_id = self.context.get('user_id')
         if user_id:
             try:
-                user = User.objects.get(id=int(user_id))
-                if hasattr(user, 'provider_profile') and obj.provider.id == user.provider_profile.id:
+                if obj.is_provider_user(user_id):
                     # L'utilisateur est le prestataire
-                    return Message.objects.filter(
-                        conversation=obj,
-                        sender=obj.client,
-                        is_read=False
-                    ).count()
-                else:
-                    # L'utilisateur est le client
-                    return Message.objects.filter(
-                        conversation=obj,
-                        sender=obj.provider.user,
-                        is_read=False
-                    ).count()
-            except (ValueError, User.DoesNotExist):
+                    return obj.provider_unread_count
+                # L'utilisateur est le client
+                return obj.client_unread_count
+            except ValueError:
                 pass
         return 0
     
     def get_is_online(self, obj):
-        # Simuler un statut en ligne
-        # À remplacer par une vraie logique de statut en ligne dans une application de production
-        return random.choice([True, False])
+        # Présence de l'autre participant d'après les connexions au canal temps réel
+        user_id = self.context.get('user_id')
+        try:
+            if user_id and obj.is_provider_user(user_id):
+                return realtime.is_online(obj.client_id)
+        except ValueError:
+            pass
+        return realtime.is_online(obj.provider.user_id)
 
 class QuoteRequestSerializer(serializers.ModelSerializer):
     client_name = serializers.StringRelatedField(source='client.username', read_only=True)
@@ -405,7 +455,9 @@ class RegisterSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'first_name': {'required': True},
             'last_name': {'required': True},
-            'email': {'required': True}
+            'email': {'required': True, 'validators': [
+                UniqueValidator(queryset=User.objects.all(), message="Un compte existe déjà avec cet email")
+            ]}
         }
     def create(self, validated_data):
         # Extraire les catégories (si présentes)
@@ -0,0 +1,210 @@
+from django.apps import apps
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import authentication, caching, catalog, images, notifications, search, stats, sync, tasks
+from .models import (
+    Category, Certificate, Dispute, Favorite, Message, Notification, Portfolio, Provider,
+    ProviderService, QuoteRequest, Review, ReviewImage, ServiceGalleryImage, ServiceOption,
+    SubCategory, User,
+)
+
+
+@receiver(post_save, sender=Notification)
+def record_notification(sender, instance, created, raw=False, **kwargs):
+    # Les insertions groupées (notifications.create) mettent à jour le compteur elles-mêmes
+    if created and not raw:
+        notifications.record_created([instance])
+
+
+@receiver(post_delete, sender=Notification)
+def forget_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        notifications.adjust_unread(instance.user_id, -1)
+
+
+@receiver(post_save, sender=Message)
+def notify_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        notifications.message_created(instance)
+
+
+@receiver(post_delete, sender=Message)
+def forget_message(sender, instance, origin=None, **kwargs):
+    # Dans une suppression en cascade (conversation, participant), la conversation disparaît aussi
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is Message:
+        instance.conversation.forget_message(instance)
+
+
+@receiver(post_save, sender=Review)
+def notify_review(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        notifications.review_created(instance)
+
+
+@receiver(post_save, sender=Favorite)
+def notify_favorite(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        notifications.favorite_created(instance)
+
+
+@receiver(post_save, sender=QuoteRequest)
+def notify_quote(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        notifications.quote_created(instance)
+
+
+@receiver(post_save, sender=Dispute)
+def notify_dispute(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        notifications.dispute_created(instance)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    Review.apply_rating_deltas(removed=instance.rating_values())
+
+
+@receiver(post_save, sender=ProviderService)
+def refresh_service_search_vector(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.update_service_vectors([instance.pk])
+
+
+@receiver(post_save, sender=Provider)
+def refresh_provider_search_vector(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.update_provider_vectors([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def refresh_user_provider_search_vector(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created and search.is_enabled():
+        search.update_provider_vectors(Provider.objects.filter(user=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=SubCategory)
+@receiver(post_save, sender=Category)
+def refresh_catalog_search_vectors(sender, instance, created, raw=False, **kwargs):
+    if raw or created or not search.is_enabled():
+        return
+    lookup = 'subcategory' if sender is SubCategory else 'subcategory__category'
+    search.update_service_vectors(
+        ProviderService.objects.filter(**{lookup: instance}).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=ProviderService)
+@receiver(post_delete, sender=ProviderService)
+def invalidate_catalog_tree(sender, **kwargs):
+    catalog.invalidate()
+
+
+# Groupes de réponses en cache (voir caching.py) dépendant de chaque modèle
+CACHE_GROUPS = {
+    User: ('providers', 'reviews'),
+    Provider: ('providers',),
+    ProviderService: ('providers', 'services'),
+    ServiceGalleryImage: ('providers', 'services'),
+    ServiceOption: ('providers', 'services'),
+    Portfolio: ('providers',),
+    Certificate: ('providers',),
+    Category: ('providers', 'services'),
+    SubCategory: ('providers', 'services'),
+    Review: ('providers', 'services', 'reviews'),
+    ReviewImage: ('providers', 'reviews'),
+}
+# Champs mis à jour sans effet sur les réponses en cache
+CACHE_NEUTRAL_FIELDS = {'last_login', 'search_vector'}
+
+
+def invalidate_cached_responses(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= CACHE_NEUTRAL_FIELDS:
+        return
+    caching.invalidate(*CACHE_GROUPS[sender])
+
+
+for model in CACHE_GROUPS:
+    post_save.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'cache-{model.__name__}-save')
+    post_delete.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'cache-{model.__name__}-delete')
+
+
+def generate_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    field_name = IMAGE_FIELD_NAMES[sender]
+    if raw or (update_fields is not None and field_name not in update_fields):
+        return
+    field_file = getattr(instance, field_name)
+    if field_file and not images.has_variants(field_file):
+        tasks.enqueue(
+            'generate_image_variants',
+            {'model': sender._meta.label, 'pk': instance.pk, 'field': field_name, 'name': field_file.name},
+            idempotency_key=f'images:{sender._meta.label}:{instance.pk}:{field_file.name}',
+        )
+
+
+IMAGE_FIELD_NAMES = {apps.get_model(label): field_name for label, field_name in images.IMAGE_FIELDS}
+for model in IMAGE_FIELD_NAMES:
+    post_save.connect(generate_image_variants, sender=model, dispatch_uid=f'images-{model.__name__}')
+
+
+def record_tombstone(sender, instance, **kwargs):
+    sync.record_deletion(instance)
+
+
+for model in sync.MODEL_RESOURCES:
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'sync-{model.__name__}')
+
+
+def invalidate_user_identity(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not set(update_fields) & set(authentication.IDENTITY_FIELDS):
+        return
+    authentication.invalidate(instance.pk)
+
+
+def invalidate_provider_identity(sender, instance, created=True, **kwargs):
+    # Seules la création et la suppression du profil changent provider_profile.id
+    if created:
+        authentication.invalidate(instance.user_id)
+
+
+post_save.connect(invalidate_user_identity, sender=User, dispatch_uid='auth-User-save')
+post_delete.connect(invalidate_user_identity, sender=User, dispatch_uid='auth-User-delete')
+post_save.connect(invalidate_provider_identity, sender=Provider, dispatch_uid='auth-Provider-save')
+post_delete.connect(invalidate_provider_identity, sender=Provider, dispatch_uid='auth-Provider-delete')
+
+
+def snapshot_daily_stats_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    rollup = stats.MODEL_ROLLUPS[sender]
+    if raw or instance._state.adding or not rollup.fields:
+        return
+    if update_fields is not None and not rollup.fields & set(update_fields):
+        return
+    instance._stats_previous = rollup.state_from_db(instance.pk)
+
+
+def update_daily_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    rollup = stats.MODEL_ROLLUPS[sender]
+    if created:
+        stats.add(rollup.name, rollup.state(instance), 1)
+    elif '_stats_previous' in instance.__dict__:
+        stats.moved(rollup.name, instance.__dict__.pop('_stats_previous'), rollup.state(instance))
+
+
+def remove_daily_stats(sender, instance, **kwargs):
+    # Avant la suppression : la catégorie se lit encore à travers les relations
+    rollup = stats.MODEL_ROLLUPS[sender]
+    stats.add(rollup.name, rollup.state(instance), -1)
+
+
+for model in stats.MODEL_ROLLUPS:
+    pre_save.connect(snapshot_daily_stats_state, sender=model, dispatch_uid=f'stats-{model.__name__}-pre-save')
+    post_save.connect(update_daily_stats, sender=model, dispatch_uid=f'stats-{model.__name__}-save')
+    pre_delete.connect(remove_daily_stats, sender=model, dispatch_uid=f'stats-{model.__name__}-delete')
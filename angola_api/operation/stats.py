@@ -0,0 +1,209 @@
+"""
+Statistiques du tableau de bord d'administration (`GET /api/dashboard/stats/`).
+
+Rien n'est compté dans les tables sources à l'affichage : DailyStat garde,
+par jour de création, métrique et dimension, le nombre de lignes existantes.
+Les signaux (voir signals.py) l'ajustent dans la transaction de chaque
+création, suppression ou changement de dimension (statut d'un litige, rôle
+d'un utilisateur...). Le coût d'une lecture dépend donc du nombre de jours et
+de dimensions, pas de la taille des tables.
+
+La commande rebuild_daily_stats recalcule une période depuis les tables
+sources. Elle rattrape les écritures qui ne passent pas par les signaux
+(`QuerySet.update()`, `bulk_create()`) et les catégories qui changent sans
+que la ligne comptée soit enregistrée (service déplacé dans une autre
+sous-catégorie).
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    Category, DailyStat, Dispute, Provider, ProviderService, QuoteRequest, Report, Review, User,
+)
+
+# Nombre de mois de la courbe des inscriptions (mois en cours compris)
+REGISTRATION_MONTHS = 6
+DEFAULT_DAYS = 30
+MAX_DAYS = 365
+
+
+class Rollup:
+    """
+    Métrique agrégée : une ligne de `model` compte pour le jour de son
+    `created_at` et pour la valeur de `dimension` (champ ou chemin ORM, None
+    pour une métrique sans dimension).
+    """
+
+    def __init__(self, name, model, dimension=None):
+        self.name = name
+        self.model = model
+        self.dimension = dimension
+
+    @property
+    def local(self):
+        """Dimension lisible sur l'instance, sans requête."""
+        return self.dimension is None or '__' not in self.dimension
+
+    @property
+    def fields(self):
+        """Champs de l'instance (nom et attname) dont dépend la dimension."""
+        if self.dimension is None:
+            return set()
+        field = self.model._meta.get_field(self.dimension.split('__')[0])
+        return {field.name, field.attname}
+
+    def state(self, instance):
+        """(jour, dimension) de l'instance, lus en base si la dimension passe par une relation."""
+        if not self.local:
+            return self.state_from_db(instance.pk)
+        value = getattr(instance, self.dimension) if self.dimension else None
+        return timezone.localdate(instance.created_at), _dimension(value)
+
+    def state_from_db(self, pk):
+        fields = ['created_at'] + ([self.dimension] if self.dimension else [])
+        row = self.model._base_manager.filter(pk=pk).values_list(*fields).first()
+        if row is None:
+            return None
+        return timezone.localdate(row[0]), _dimension(row[1] if self.dimension else None)
+
+
+ROLLUPS = {
+    rollup.name: rollup for rollup in (
+        Rollup('users', User, 'role'),
+        Rollup('providers', Provider),
+        Rollup('services', ProviderService, 'subcategory__category_id'),
+        Rollup('reviews', Review, 'service__subcategory__category_id'),
+        Rollup('quote_requests', QuoteRequest, 'status'),
+        Rollup('disputes', Dispute, 'status'),
+        Rollup('reports', Report, 'status'),
+    )
+}
+MODEL_ROLLUPS = {rollup.model: rollup for rollup in ROLLUPS.values()}
+# Métriques ventilées par catégorie dans `by_category`
+CATEGORY_METRICS = ('services', 'reviews')
+
+
+def _dimension(value):
+    return '' if value is None else str(value)
+
+
+def add(metric, state, delta):
+    """Ajoute `delta` au compteur de `metric` pour `state` = (jour, dimension)."""
+    if state is None or not delta:
+        return
+    day, dimension = state
+    rows = DailyStat.objects.filter(date=day, metric=metric, dimension=dimension)
+    if rows.update(value=F('value') + delta):
+        return
+    try:
+        with transaction.atomic():
+            DailyStat.objects.create(date=day, metric=metric, dimension=dimension, value=delta)
+    except IntegrityError:
+        # Ligne créée entre-temps par une transaction concurrente
+        rows.update(value=F('value') + delta)
+
+
+def moved(metric, previous, current):
+    """Déplace une ligne comptée de l'état `previous` vers `current`."""
+    if previous != current:
+        add(metric, previous, -1)
+        add(metric, current, 1)
+
+
+def rebuild(since=None):
+    """
+    Recalcule depuis les tables sources les agrégats des jours à partir de
+    `since` (tous si None), en une requête par métrique. Retourne le nombre
+    de lignes écrites.
+    """
+    rows = []
+    with transaction.atomic():
+        stale = DailyStat.objects.all()
+        if since is not None:
+            stale = stale.filter(date__gte=since)
+        stale.delete()
+        for rollup in ROLLUPS.values():
+            queryset = rollup.model._base_manager.all()
+            if since is not None:
+                queryset = queryset.filter(created_at__date__gte=since)
+            group_by = ['day'] + ([rollup.dimension] if rollup.dimension else [])
+            counts = (
+                queryset.annotate(day=TruncDate('created_at'))
+                .values(*group_by)
+                .annotate(value=Count('pk'))
+                .order_by()
+            )
+            rows.extend(
+                DailyStat(
+                    date=row['day'], metric=rollup.name,
+                    dimension=_dimension(row.get(rollup.dimension)), value=row['value'],
+                )
+                for row in counts
+            )
+        DailyStat.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _month_start(day, months_back=0):
+    month = day.year * 12 + day.month - 1 - months_back
+    return day.replace(year=month // 12, month=month % 12 + 1, day=1)
+
+
+def dashboard(days=DEFAULT_DAYS, today=None):
+    """
+    Données du tableau de bord en trois requêtes : totaux par dimension,
+    série quotidienne des `days` derniers jours (et des mois de la courbe
+    des inscriptions), noms des catégories.
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    months = [_month_start(today, back) for back in range(REGISTRATION_MONTHS - 1, -1, -1)]
+
+    totals = {name: 0 for name in ROLLUPS}
+    breakdowns = {name: {} for name in ROLLUPS}
+    for row in DailyStat.objects.values('metric', 'dimension').annotate(value=Sum('value')).order_by():
+        if row['metric'] in ROLLUPS:
+            totals[row['metric']] += row['value']
+            breakdowns[row['metric']][row['dimension']] = row['value']
+
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    daily = {name: dict.fromkeys(dates, 0) for name in ROLLUPS}
+    registrations = dict.fromkeys(months, 0)
+    for row in (
+        DailyStat.objects.filter(date__gte=min(start, months[0]), date__lte=today)
+        .values('date', 'metric').annotate(value=Sum('value')).order_by()
+    ):
+        if row['metric'] not in ROLLUPS:
+            continue
+        if row['date'] >= start:
+            daily[row['metric']][row['date']] += row['value']
+        if row['metric'] == 'users' and row['date'] >= months[0]:
+            registrations[_month_start(row['date'])] += row['value']
+
+    data = {
+        'totals': totals,
+        'new_users_this_month': registrations[months[-1]],
+    }
+    # Répartitions sur les dimensions à choix fixes : users_by_role, disputes_by_status...
+    for rollup in ROLLUPS.values():
+        if rollup.dimension and rollup.local:
+            choices = rollup.model._meta.get_field(rollup.dimension).choices
+            data[f'{rollup.name}_by_{rollup.dimension}'] = {
+                value: breakdowns[rollup.name].get(value, 0) for value, _ in choices
+            }
+    data['by_category'] = [
+        {'id': category['id'], 'name': category['name'], **{
+            name: breakdowns[name].get(str(category['id']), 0) for name in CATEGORY_METRICS
+        }}
+        for category in Category.objects.order_by('name', 'id').values('id', 'name')
+    ]
+    data['daily'] = {'dates': dates, **{name: list(values.values()) for name, values in daily.items()}}
+    data['user_registrations_by_month'] = {
+        'labels': [month.strftime('%Y-%m') for month in months],
+        'data': list(registrations.values()),
+    }
+    return data
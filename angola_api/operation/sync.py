@@ -0,0 +1,197 @@
+"""
+Synchronisation incrémentale pour l'application mobile (`GET /api/sync/`).
+
+Pour chaque ressource, le client envoie le curseur reçu lors de la synchro
+précédente et ne récupère que les lignes créées ou modifiées depuis (d'après
+TimeStampMixin.updated_at) ainsi que les ids supprimés, relevés dans la table
+Tombstone par un signal post_delete.
+
+Le curseur est opaque pour le client. Il contient deux positions
+(updated_at, id) et (deleted_at, id), ce qui permet de paginer sans perte
+même quand une mise à jour groupée donne le même horodatage à des milliers
+de lignes. Les lignes modifiées depuis moins de SYNC_SETTLE_SECONDS ne sont
+pas encore servies : une transaction plus ancienne mais validée plus tard ne
+peut donc pas passer derrière le curseur.
+
+Les tombstones sont conservées SYNC_TOMBSTONE_RETENTION_DAYS jours ; un
+curseur plus ancien provoque une resynchronisation complète (`reset`).
+"""
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Conversation, Favorite, Notification, Provider, ProviderService, QuoteRequest, Tombstone
+from .serializers import (
+    ConversationSerializer, FavoriteSerializer, NotificationSerializer, ProviderServiceSerializer,
+    QuoteRequestSerializer,
+)
+
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 500
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _provider_user_id(instance):
+    # Lecture directe : en suppression en cascade, le prestataire peut ne plus être en cache
+    return Provider.objects.filter(pk=instance.provider_id).values_list('user_id', flat=True).first()
+
+
+class Resource:
+    """
+    Ressource synchronisable. `queryset(user)` retourne les lignes visibles
+    par l'utilisateur ; `owners(instance)` les utilisateurs à prévenir d'une
+    suppression. Les suppressions d'une ressource publique (`owners` None)
+    sont enregistrées une seule fois pour tous.
+    """
+
+    def __init__(self, name, model, serializer_class, queryset, owners=None):
+        self.name = name
+        self.model = model
+        self.serializer_class = serializer_class
+        self.queryset = queryset
+        self.owners = owners
+
+    @property
+    def public(self):
+        return self.owners is None
+
+
+RESOURCES = {resource.name: resource for resource in (
+    Resource(
+        'conversations', Conversation, ConversationSerializer,
+        lambda user: Conversation.objects.select_related('client', 'provider__user', 'last_message').filter(
+            Q(client=user) | Q(provider__user=user)
+        ),
+        lambda instance: [instance.client_id, _provider_user_id(instance)],
+    ),
+    Resource(
+        'favorites', Favorite, FavoriteSerializer,
+        lambda user: Favorite.objects.filter(user=user).prefetch_related(
+            Prefetch('provider', queryset=Provider.objects.with_listing_data())
+        ),
+        lambda instance: [instance.user_id],
+    ),
+    Resource(
+        'notifications', Notification, NotificationSerializer,
+        lambda user: Notification.objects.filter(user=user),
+        lambda instance: [instance.user_id],
+    ),
+    Resource(
+        'quote_requests', QuoteRequest, QuoteRequestSerializer,
+        lambda user: QuoteRequest.objects.select_related('client', 'provider__user', 'service').filter(
+            Q(client=user) | Q(provider__user=user)
+        ),
+        lambda instance: [instance.client_id, _provider_user_id(instance)],
+    ),
+    Resource(
+        'services', ProviderService, ProviderServiceSerializer,
+        lambda user: ProviderService.objects.select_related('subcategory__category').prefetch_related(
+            'gallery_images', 'options'
+        ),
+    ),
+)}
+
+MODEL_RESOURCES = {resource.model: resource for resource in RESOURCES.values()}
+
+
+def record_deletion(instance):
+    """Enregistre la suppression de `instance` pour les utilisateurs concernés."""
+    resource = MODEL_RESOURCES.get(type(instance))
+    if resource is None:
+        return
+    if resource.public:
+        owners = [None]
+    else:
+        owners = [owner for owner in dict.fromkeys(resource.owners(instance)) if owner is not None]
+    Tombstone.objects.bulk_create([
+        Tombstone(resource=resource.name, object_id=instance.pk, owner_id=owner)
+        for owner in owners
+    ])
+
+
+def purge_tombstones(now=None):
+    """Supprime les tombstones plus anciennes que la durée de conservation."""
+    now = now or timezone.now()
+    limit = now - timedelta(days=_setting('SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+    return Tombstone.objects.filter(deleted_at__lt=limit).delete()[0]
+
+
+def encode_cursor(changed, deleted):
+    positions = [changed[0].isoformat(), changed[1], deleted[0].isoformat(), deleted[1]]
+    return base64.urlsafe_b64encode(json.dumps(positions).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Retourne les positions ((updated_at, id), (deleted_at, id)) ; ValueError si invalide."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        changed_at, changed_id, deleted_at, deleted_id = json.loads(raw)
+        changed = (parse_datetime(changed_at), int(changed_id))
+        deleted = (parse_datetime(deleted_at), int(deleted_id))
+    except (binascii.Error, TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError("Curseur de synchronisation invalide")
+    if changed[0] is None or deleted[0] is None or timezone.is_naive(changed[0]) or timezone.is_naive(deleted[0]):
+        raise ValueError("Curseur de synchronisation invalide")
+    return changed, deleted
+
+
+def _after(queryset, field, position):
+    if position is None:
+        return queryset
+    moment, pk = position
+    return queryset.filter(Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'pk__gt': pk}))
+
+
+def changes(resource, user, token=None, limit=DEFAULT_LIMIT, context=None):
+    """
+    Lignes modifiées et ids supprimés depuis `token` (tout si None), au plus
+    `limit` de chaque. Si `has_more` est vrai, le client rappelle aussitôt
+    avec le nouveau curseur.
+    """
+    now = timezone.now()
+    upper = now - timedelta(seconds=_setting('SYNC_SETTLE_SECONDS', 2))
+    changed, deleted = decode_cursor(token) if token else (None, None)
+
+    reset = False
+    retention = timedelta(days=_setting('SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+    if deleted is not None and deleted[0] < now - retention:
+        # Des suppressions ont pu être purgées : on repart de zéro
+        changed, deleted, reset = None, None, True
+    if deleted is None:
+        deleted = (upper, 0)
+
+    rows = list(
+        _after(resource.queryset(user).filter(updated_at__lte=upper), 'updated_at', changed)
+        .order_by('updated_at', 'pk')[:limit + 1]
+    )
+    owner_id = None if resource.public else user.pk
+    tombstones = list(
+        _after(
+            Tombstone.objects.filter(resource=resource.name, owner_id=owner_id, deleted_at__lte=upper),
+            'deleted_at', deleted,
+        ).order_by('deleted_at', 'pk').values_list('deleted_at', 'pk', 'object_id')[:limit + 1]
+    )
+    more_rows, more_tombstones = len(rows) > limit, len(tombstones) > limit
+    rows, tombstones = rows[:limit], tombstones[:limit]
+    # Un flux épuisé avance jusqu'à la borne : les lignes datées exactement
+    # de `upper` seront renvoyées une fois de plus, ce qui est sans effet
+    changed = (rows[-1].updated_at, rows[-1].pk) if more_rows else (upper, 0)
+    deleted = tombstones[-1][:2] if more_tombstones else (upper, 0)
+
+    serializer = resource.serializer_class(rows, many=True, context=context or {})
+    return {
+        'changed': serializer.data,
+        'deleted': [object_id for _, _, object_id in tombstones],
+        'cursor': encode_cursor(changed, deleted),
+        'has_more': more_rows or more_tombstones,
+        'reset': reset,
+    }
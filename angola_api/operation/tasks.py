@@ -0,0 +1,173 @@
+"""
+File de tâches d'arrière-plan stockée en base (modèle Task).
+
+Les vues mettent une tâche en file avec `enqueue()` ; la ligne est écrite
+dans la transaction courante, donc jamais visible par un worker si la requête
+échoue. La commande `run_tasks` réserve les tâches dues (SELECT ... FOR
+UPDATE SKIP LOCKED sous PostgreSQL), les exécute et replanifie les échecs
+avec un délai exponentiel.
+
+Avec `settings.TASKS_EAGER`, `enqueue()` exécute la tâche immédiatement, ce
+qui simplifie les tests.
+"""
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import images, notifications
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def register(name):
+    """Décorateur enregistrant une fonction `handler(**payload)` sous `name`."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def get_handler(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f"Tâche inconnue : {name}")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(name, payload=None, idempotency_key=None, run_at=None, max_attempts=None):
+    """
+    Met une tâche en file et retourne la ligne Task (None en mode eager).
+    Si `idempotency_key` a déjà été utilisée, la tâche existante est retournée
+    sans en créer de nouvelle.
+    """
+    payload = payload or {}
+    handler = get_handler(name)
+    if _setting('TASKS_EAGER', False):
+        handler(**payload)
+        return None
+
+    values = {
+        'name': name,
+        'payload': payload,
+        'run_at': run_at or timezone.now(),
+        'max_attempts': max_attempts or _setting('TASKS_MAX_ATTEMPTS', 5),
+    }
+    if idempotency_key is None:
+        return Task.objects.create(**values)
+    try:
+        with transaction.atomic():
+            return Task.objects.create(idempotency_key=idempotency_key, **values)
+    except IntegrityError:
+        return Task.objects.get(idempotency_key=idempotency_key)
+
+
+def backoff(attempts):
+    """Délai avant la tentative suivante : base * 2^(tentatives - 1), plafonné."""
+    base = _setting('TASKS_BACKOFF_BASE', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), _setting('TASKS_BACKOFF_MAX', 3600)))
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker_id, batch_size=10):
+    """
+    Réserve jusqu'à `batch_size` tâches dues et compte la tentative dès la
+    réservation. Les tâches restées « en cours » au-delà de TASKS_LOCK_TIMEOUT
+    (worker arrêté) sont reprises, ou marquées en échec si elles ont épuisé
+    leurs tentatives : une tâche qui tue le worker n'est pas reprise sans fin.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('TASKS_LOCK_TIMEOUT', 600))
+    with transaction.atomic():
+        tasks = list(
+            Task.objects.select_for_update(skip_locked=True).filter(
+                Q(status='pending', run_at__lte=now) | Q(status='running', locked_at__lt=stale)
+            ).order_by('run_at', 'pk')[:batch_size]
+        )
+        exhausted = [task for task in tasks if task.attempts >= task.max_attempts]
+        if exhausted:
+            Task.objects.filter(pk__in=[task.pk for task in exhausted]).update(
+                status='failed', last_error="Worker arrêté pendant l'exécution", locked_at=None,
+                locked_by='', updated_at=now,
+            )
+            for task in exhausted:
+                logger.error("Tâche %s abandonnée après %s tentatives", task, task.attempts)
+        tasks = [task for task in tasks if task.attempts < task.max_attempts]
+        if tasks:
+            Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+                status='running', attempts=F('attempts') + 1, locked_at=now, locked_by=worker_id,
+                updated_at=now,
+            )
+            for task in tasks:
+                task.attempts += 1
+    return tasks
+
+
+def execute(task):
+    """Exécute une tâche réservée (tentative déjà comptée) et enregistre son résultat."""
+    try:
+        with transaction.atomic():
+            get_handler(task.name)(**task.payload)
+    except Exception:
+        task.last_error = traceback.format_exc()
+        if task.attempts >= task.max_attempts:
+            task.status = 'failed'
+            logger.error("Tâche %s abandonnée après %s tentatives", task, task.attempts)
+        else:
+            task.status = 'pending'
+            task.run_at = timezone.now() + backoff(task.attempts)
+            logger.warning("Tâche %s en échec, nouvelle tentative à %s", task, task.run_at)
+    else:
+        task.status = 'done'
+        task.last_error = ''
+    task.locked_at = None
+    task.locked_by = ''
+    task.save(update_fields=['status', 'run_at', 'last_error', 'locked_at', 'locked_by', 'updated_at'])
+    return task.status == 'done'
+
+
+def run_pending(worker_id=None, batch_size=10):
+    """Exécute un lot de tâches dues ; retourne le nombre de tâches traitées."""
+    tasks = claim(worker_id or default_worker_id(), batch_size)
+    for task in tasks:
+        execute(task)
+    return len(tasks)
+
+
+# Tâches de l'application
+
+@register('send_email')
+def send_email_task(subject, message, recipients):
+    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, recipients, fail_silently=False)
+
+
+@register('generate_image_variants')
+def generate_image_variants_task(model, pk, field, name):
+    instance = apps.get_model(model).objects.filter(pk=pk).first()
+    field_file = getattr(instance, field, None) if instance is not None else None
+    # L'image a pu être remplacée depuis la mise en file
+    if field_file and field_file.name == name and images.generate_variants(field_file):
+        images.record_variants(instance, field_file)
+
+
+@register('create_notifications')
+def create_notifications_task(user_ids, type, title, content, related_object_id=None):
+    notifications.create(user_ids, type, title, content, related_object_id)
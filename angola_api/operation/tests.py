@@ -1,3 +1,1767 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, connection, connections, reset_queries
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import authentication, benchmarks, caching, geo, images, instrumentation, metrics, middleware, notifications, realtime, renderers, replicas, search, stats, sync, tasks, timeouts, views
+from .models import (
+    Category, SubCategory, Provider, ProviderService, ServiceGalleryImage, ServiceOption, Portfolio,
+    Certificate, Review, ReviewImage, Favorite, Conversation, Message, Notification, QuoteRequest,
+    DailyStat, Dispute, ResetPasswordCode, Task, Tombstone, User
+)
+from .serializers import ProviderServiceSerializer
+
+
+def make_provider(index, subcategory=None, **extra):
+    user = User.objects.create_user(
+        username=f'provider{index}', email=f'provider{index}@example.com',
+        password='secret', first_name='Prestataire', last_name=str(index), role='provider'
+    )
+    provider = Provider.objects.create(user=user, company_name=f'Société {index}', **extra)
+    if subcategory is not None:
+        ProviderService.objects.create(
+            provider=provider, subcategory=subcategory,
+            title=f'Service {index}', description='Description'
+        )
+    return provider
+
+
+class ProviderListingQueryCountTests(TestCase):
+    """
+    Le nombre de requêtes des listes de prestataires ne doit pas dépendre
+    de la taille de la page.
+    """
+    # pagination (COUNT) + page
+    MAX_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Maison')
+        cls.subcategory = SubCategory.objects.create(category=cls.category, name='Plomberie')
+        cls.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='secret'
+        )
+        for i in range(25):
+            provider = make_provider(i, cls.subcategory, latitude=-8.83 + i * 0.001, longitude=13.23)
+            Review.objects.create(
+                client=cls.client_user, provider=provider, quality_rating=5,
+                punctuality_rating=4, value_rating=3, comment='Bien'
+            )
+            Favorite.objects.create(user=cls.client_user, provider=provider)
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+
+    def assertListBounded(self, url, params, max_queries=MAX_QUERIES):
+        with self.assertNumQueries(max_queries):
+            response = self.api.get(url, dict(params, page_size=5))
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(max_queries):
+            response = self.api.get(url, dict(params, page_size=25))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_provider_list(self):
+        # + validateurs ETag de la liste
+        response = self.assertListBounded('/api/providers/', {}, self.MAX_QUERIES + 1)
+        row = response.data['results'][0]
+        self.assertEqual(row['services_count'], 1)
+        self.assertEqual(row['reviews_count'], 1)
+        self.assertEqual(row['main_category'], {
+            'category_id': self.category.id, 'category_name': 'Maison'
+        })
+
+    def test_by_category_and_subcategory(self):
+        self.assertListBounded('/api/providers/by_category/', {'category_id': self.category.id})
+        self.assertListBounded('/api/providers/by_subcategory/', {'subcategory_id': self.subcategory.id})
+
+    def test_provider_by_category_view(self):
+        with self.assertNumQueries(self.MAX_QUERIES):
+            response = self.api.get(reverse('provider-by-category'), {'category_id': self.category.id})
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_favorites(self):
+        self.api.force_authenticate(self.client_user)
+        # favoris + prestataires annotés (+ COUNT de pagination)
+        with self.assertNumQueries(3):
+            response = self.api.get('/api/favorites/')
+        self.assertEqual(response.status_code, 200)
+
+
+class NearbyProvidersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Luanda centre, ~1.1 km au sud, ~5.5 km au sud, Benguela (~400 km)
+        cls.near = make_provider(1, latitude='-8.838333', longitude='13.234444')
+        cls.mid = make_provider(2, latitude='-8.848333', longitude='13.234444')
+        cls.far = make_provider(3, latitude='-8.888333', longitude='13.234444')
+        cls.other_city = make_provider(4, latitude='-12.578889', longitude='13.407222')
+        make_provider(5)
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def test_geohash_is_maintained(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertTrue(self.near.geohash.startswith('kq'))
+        self.near.latitude = None
+        self.near.save()
+        self.assertEqual(self.near.geohash, '')
+
+    def test_nearby_orders_by_distance(self):
+        response = self.api.get('/api/providers/nearby/', {
+            'latitude': -8.838333, 'longitude': 13.234444, 'radius': 10
+        })
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r['id'] for r in results], [self.near.id, self.mid.id, self.far.id])
+        self.assertAlmostEqual(results[0]['distance_km'], 0, places=2)
+        self.assertAlmostEqual(results[1]['distance_km'], 1.112, places=2)
+
+    def test_k_nearest(self):
+        response = self.api.get(reverse('nearby-providers'), {
+            'latitude': -8.838333, 'longitude': 13.234444, 'radius': 1000, 'limit': 2
+        })
+        self.assertEqual([r['id'] for r in response.data], [self.near.id, self.mid.id])
+        # Rayon ramené à NEARBY_MAX_RADIUS_KM : Benguela (~400 km) est hors de portée
+        response = self.api.get('/api/providers/nearby/', {
+            'latitude': -8.838333, 'longitude': 13.234444, 'radius': 1000, 'limit': 10
+        })
+        self.assertEqual([r['id'] for r in response.data], [self.near.id, self.mid.id, self.far.id])
+
+    def test_limit_and_radius_are_clamped(self):
+        for url in ('/api/providers/nearby/', reverse('nearby-providers')):
+            response = self.api.get(url, {'latitude': -8.838333, 'longitude': 13.234444, 'limit': -5})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([r['id'] for r in response.data], [self.near.id])
+        response = self.api.get('/api/providers/nearby/', {
+            'latitude': -8.838333, 'longitude': 13.234444, 'radius': 'nan'
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(views.parse_nearby_params({
+            'latitude': '0', 'longitude': '0', 'radius': 'inf', 'limit': '1000'
+        })[2:], (views.NEARBY_MAX_RADIUS_KM, views.NEARBY_MAX_LIMIT))
+
+
+class ConversationInboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider(1)
+        cls.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='secret'
+        )
+
+    def setUp(self):
+        self.api = APIClient()
+        self.conversation = Conversation.objects.create(client=self.client_user, provider=self.provider)
+
+    def test_counters_and_last_message(self):
+        for content in ('Bonjour', 'Êtes-vous disponible ?'):
+            Message.objects.create(conversation=self.conversation, sender=self.client_user, content=content)
+        reply = Message.objects.create(
+            conversation=self.conversation, sender=self.provider.user, content='Oui'
+        )
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.provider_unread_count, 2)
+        self.assertEqual(self.conversation.client_unread_count, 1)
+        self.assertEqual(self.conversation.last_message, reply)
+
+        self.assertEqual(self.conversation.mark_read_by(self.provider.user_id), 2)
+        self.assertEqual(self.conversation.mark_read_by(self.provider.user_id), 0)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.provider_unread_count, 0)
+        self.assertEqual(self.conversation.unread_count_for_user(self.client_user), 1)
+
+    def test_deleting_messages_updates_counters_and_last_message(self):
+        first = Message.objects.create(conversation=self.conversation, sender=self.client_user, content='Bonjour')
+        second = Message.objects.create(conversation=self.conversation, sender=self.client_user, content='Allô ?')
+        reply = Message.objects.create(conversation=self.conversation, sender=self.provider.user, content='Oui')
+
+        reply.delete()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.client_unread_count, 0)
+        self.assertEqual(self.conversation.last_message, second)
+
+        # Un message qui n'est pas le dernier : le dernier message ne change pas
+        first.delete()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.provider_unread_count, 1)
+        self.assertEqual(self.conversation.last_message, second)
+
+        Message.objects.filter(pk=second.pk).delete()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.provider_unread_count, 0)
+        self.assertIsNone(self.conversation.last_message)
+
+        # Suppression en cascade : la conversation disparaît avec ses messages
+        Message.objects.create(conversation=self.conversation, sender=self.client_user, content='Encore')
+        self.conversation.delete()
+        self.assertFalse(Message.objects.exists())
+
+    def test_inbox_is_a_single_query(self):
+        for i in range(5):
+            other = make_provider(10 + i)
+            conversation = Conversation.objects.create(client=self.client_user, provider=other)
+            Message.objects.create(conversation=conversation, sender=other.user, content='Bonjour')
+        # utilisateur + COUNT de pagination + conversations
+        with self.assertNumQueries(3):
+            response = self.api.get('/api/conversations/', {'user_id': self.client_user.id})
+        results = response.data['results']
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results[0]['unread_count'], 1)
+        self.assertEqual(results[0]['last_message']['content'], 'Bonjour')
+
+
+    def test_send_messages_batch_is_idempotent(self):
+        received = Message.objects.create(
+            conversation=self.conversation, sender=self.provider.user, content='Bonjour'
+        )
+        url = f'/api/conversations/{self.conversation.id}/send_messages/?user_id={self.client_user.id}'
+        payload = {
+            'user_id': self.client_user.id,
+            'messages': [
+                {'client_message_id': 'a1', 'content': 'Premier'},
+                {'client_message_id': 'a2', 'content': 'Second'},
+                {'client_message_id': 'a1', 'content': 'Premier'},
+            ],
+            'read_up_to': received.id,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['read_count'], 1)
+        ids = [m['id'] for m in response.data['messages']]
+        self.assertEqual(ids[0], ids[2])
+        self.assertEqual(Notification.objects.filter(user=self.provider.user, type='message').count(), 1)
+
+        # Renvoi après une coupure réseau : rien n'est réinséré
+        response = self.api.post(url, payload, format='json')
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual([m['id'] for m in response.data['messages']], ids)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.provider_unread_count, 2)
+        self.assertEqual(self.conversation.client_unread_count, 0)
+        self.assertEqual(self.conversation.last_message_id, ids[1])
+
+    def test_send_messages_query_count_does_not_grow(self):
+        url = f'/api/conversations/{self.conversation.id}/send_messages/?user_id={self.client_user.id}'
+
+        def send(prefix, count):
+            with CaptureQueriesContext(connection) as queries:
+                self.api.post(url, {
+                    'user_id': self.client_user.id,
+                    'messages': [{'client_message_id': f'{prefix}{i}', 'content': str(i)} for i in range(count)],
+                }, format='json')
+            return len(queries)
+
+        self.assertEqual(send('a', 2), send('b', 20))
+        self.assertEqual(Message.objects.filter(conversation=self.conversation).count(), 22)
+
+    def test_send_messages_rejects_non_participant(self):
+        stranger = User.objects.create_user(username='stranger', password='secret')
+        response = self.api.post(
+            f'/api/conversations/{self.conversation.id}/send_messages/?user_id={stranger.id}',
+            {'user_id': stranger.id, 'messages': [{'content': 'Bonjour'}]}, format='json',
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Message.objects.exists())
+
+
+class RealtimeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider(1)
+        cls.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='secret'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.broker = realtime.InProcessBroker()
+        patcher = mock.patch.object(realtime, '_broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stream(self, query_string, during, headers=()):
+        """
+        Ouvre le flux SSE dans une boucle asyncio séparée, exécute `during`
+        dans le thread du test puis simule la déconnexion du client.
+        """
+        sent = []
+        finished = threading.Event()
+
+        async def scenario():
+            app = realtime.EventStreamApp(heartbeat=5)
+
+            async def receive():
+                await asyncio.get_running_loop().run_in_executor(None, finished.wait)
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            await app(
+                {'type': 'http', 'path': '/api/stream/', 'headers': list(headers), 'query_string': query_string},
+                receive, send
+            )
+
+        thread = threading.Thread(target=asyncio.run, args=(scenario(),))
+        thread.start()
+        for _ in range(100):
+            if sent:
+                break
+            time.sleep(0.01)
+        during()
+        time.sleep(0.05)
+        finished.set()
+        thread.join(5)
+        return sent
+
+    def test_rejects_missing_token(self):
+        sent = self.stream(b'', lambda: None)
+        self.assertEqual(sent[0]['status'], 401)
+
+    def test_rejects_token_in_url_replayed_ticket_and_inactive_user(self):
+        # Identités lues dans le cache : le flux tourne dans un autre thread
+        authentication.load_identity(self.client_user.pk)
+        token = str(AccessToken.for_user(self.client_user))
+        self.assertEqual(self.stream(f'token={token}'.encode(), lambda: None)[0]['status'], 401)
+
+        ticket, _ = realtime.issue_ticket(self.client_user.pk)
+        self.assertEqual(self.stream(f'ticket={ticket}'.encode(), lambda: None)[0]['status'], 200)
+        self.assertEqual(self.stream(f'ticket={ticket}'.encode(), lambda: None)[0]['status'], 401)
+
+        self.client_user.is_active = False
+        self.client_user.save()
+        authentication.load_identity(self.client_user.pk)
+        headers = [(b'authorization', f'Bearer {token}'.encode())]
+        self.assertEqual(self.stream(b'', lambda: None, headers)[0]['status'], 401)
+        ticket, _ = realtime.issue_ticket(self.client_user.pk)
+        self.assertEqual(self.stream(f'ticket={ticket}'.encode(), lambda: None)[0]['status'], 401)
+
+    def test_ticket_endpoint_requires_authentication(self):
+        api = APIClient()
+        self.assertEqual(api.post(reverse('stream-ticket')).status_code, 401)
+        api.force_authenticate(self.client_user)
+        response = api.post(reverse('stream-ticket'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(realtime._redeem_ticket(response.data['ticket']), self.client_user.pk)
+
+    @override_settings(
+        CACHES={**settings.CACHES, 'auth': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                            'LOCATION': 'auth-tickets'}},
+        AUTH_CACHE_ALIAS='auth',
+    )
+    def test_tickets_use_the_auth_cache(self):
+        ticket, _ = realtime.issue_ticket(self.client_user.pk)
+        key = f'{realtime.TICKET_KEY_PREFIX}:{ticket}'
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(caches['auth'].get(key), self.client_user.pk)
+        self.assertEqual(realtime._redeem_ticket(ticket), self.client_user.pk)
+        self.assertIsNone(realtime._redeem_ticket(ticket))
+
+    def test_new_message_is_pushed(self):
+        authentication.load_identity(self.client_user.pk)
+        token = str(AccessToken.for_user(self.client_user))
+        conversation = Conversation.objects.create(client=self.client_user, provider=self.provider)
+
+        def reply():
+            self.assertTrue(realtime.is_online(self.client_user.id))
+            with self.captureOnCommitCallbacks(execute=True):
+                Message.objects.create(conversation=conversation, sender=self.provider.user, content='Bonjour')
+
+        sent = self.stream(b'', reply, [(b'authorization', f'Bearer {token}'.encode())])
+        self.assertEqual(sent[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in sent[1:]).decode()
+        self.assertIn('event: message.created', body)
+        self.assertIn('"content": "Bonjour"', body)
+        self.assertFalse(realtime.is_online(self.client_user.id))
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider(1)
+        cls.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='secret'
+        )
+        cls.conversation = Conversation.objects.create(client=cls.client_user, provider=cls.provider)
+        cls.messages = [
+            Message.objects.create(conversation=cls.conversation, sender=cls.client_user, content=str(i))
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.api = APIClient()
+        self.url = f'/api/conversations/{self.conversation.id}/messages/'
+
+    def contents(self, response):
+        return [message['content'] for message in response.data['results']]
+
+    def test_scroll_back_and_delta(self):
+        params = {'user_id': self.provider.user_id, 'page_size': 2}
+        response = self.api.get(self.url, params)
+        self.assertEqual(self.contents(response), ['3', '4'])
+        self.assertTrue(response.data['has_more'])
+        self.assertEqual(response.data['count'], 5)
+
+        older = self.api.get(self.url, dict(params, before=response.data['next_cursor']))
+        self.assertEqual(self.contents(older), ['1', '2'])
+        oldest = self.api.get(older.data['next'])
+        self.assertEqual(self.contents(oldest), ['0'])
+        self.assertIsNone(oldest.data['next'])
+
+        since = response.data['previous_cursor']
+        delta = self.api.get(self.url, dict(params, since=since))
+        self.assertEqual(self.contents(delta), [])
+        self.assertEqual(delta.data['previous_cursor'], since)
+
+        Message.objects.create(conversation=self.conversation, sender=self.client_user, content='5')
+        delta = self.api.get(self.url, dict(params, since=since))
+        self.assertEqual(self.contents(delta), ['5'])
+
+    def test_invalid_cursor(self):
+        response = self.api.get(self.url, {'user_id': self.provider.user_id, 'before': 'invalide'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_before_with_after_is_rejected(self):
+        cursor = self.api.get(self.url, {'user_id': self.provider.user_id}).data['previous_cursor']
+        for param in ('after', 'since'):
+            response = self.api.get(self.url, {'user_id': self.provider.user_id, 'before': cursor, param: cursor})
+            self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', "EXPLAIN des plans PostgreSQL")
+class QueryPlanTests(TestCase):
+    """
+    Les requêtes SQL réellement exécutées par les endpoints chauds utilisent
+    les index ajoutés pour elles : le plan (enable_seqscan désactivé) doit
+    citer l'index attendu, pas seulement un index de clé étrangère.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Maison')
+        cls.subcategory = SubCategory.objects.create(category=cls.category, name='Plomberie')
+        cls.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='secret'
+        )
+        for i in range(20):
+            provider = make_provider(i, cls.subcategory, latitude=-8.83, longitude=13.23)
+            conversation = Conversation.objects.create(client=cls.client_user, provider=provider)
+            Message.objects.create(conversation=conversation, sender=cls.client_user, content='Bonjour')
+            Review.objects.create(
+                client=cls.client_user, provider=provider, quality_rating=4,
+                punctuality_rating=4, value_rating=4, comment='Bien'
+            )
+            QuoteRequest.objects.create(
+                client=cls.client_user, provider=provider, subject='Devis', description='...'
+            )
+            Dispute.objects.create(
+                client=cls.client_user, provider=provider, title='Litige', description='...'
+            )
+            Notification.objects.create(user=cls.client_user, title='Info', content='...', type='system')
+        ResetPasswordCode.objects.create(
+            user=cls.client_user, code='123456', expires_at=timezone.now()
+        )
+        cls.provider = provider
+        cls.conversation = conversation
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+        self.addCleanup(self.reset_seqscan)
+
+    def reset_seqscan(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def endpoint_calls(self):
+        """(nom, appel de l'endpoint, début de la requête SQL visée, index attendu)"""
+        conversation, provider, subcategory = self.conversation, self.provider, self.subcategory
+        return [
+            ('login', lambda: self.api.post(reverse('login'), {'email': 'client@example.com', 'password': 'x'}),
+             'SELECT "operation_user"', 'user_email_unique'),
+            ('reset_code', lambda: self.api.post(
+                reverse('verify_reset_code'), {'email': 'client@example.com', 'code': '123456'}),
+             'SELECT "operation_resetpasswordcode"', 'reset_code_user_code_idx'),
+            ('unread_messages', lambda: self.api.get(
+                f'/api/conversations/{conversation.pk}/messages/', {'user_id': provider.user_id}),
+             'UPDATE "operation_message"', 'message_unread_idx'),
+            ('messages_page', lambda: self.api.get(
+                f'/api/conversations/{conversation.pk}/messages/', {'user_id': provider.user_id}),
+             'SELECT "operation_message"', 'message_conv_created_idx'),
+            ('inbox', lambda: self.api.get('/api/conversations/', {'user_id': self.client_user.pk}),
+             'SELECT "operation_conversation"', 'conv_client_inbox_idx'),
+            ('notifications_page', lambda: self.authenticated().get('/api/notifications/'),
+             'SELECT "operation_notification"', 'notification_user_created_idx'),
+            ('unread_notifications', lambda: self.authenticated().post('/api/notifications/mark_all_as_read/'),
+             'UPDATE "operation_notification"', 'notification_unread_idx'),
+            ('services_by_subcategory', lambda: self.api.get(
+                '/api/services/', {'subcategory': subcategory.pk, 'is_available': 'true'}),
+             'SELECT "operation_providerservice"', 'service_subcat_available_idx'),
+            ('provider_reviews', lambda: self.api.get('/api/reviews/', {'provider': provider.pk}),
+             'SELECT "operation_review"', 'review_provider_created_idx'),
+            ('client_quotes', lambda: self.authenticated().get('/api/quote-requests/', {'status': 'pending'}),
+             'SELECT "operation_quoterequest"', 'quote_client_status_idx'),
+            ('provider_quotes', lambda: self.authenticated(provider.user).get(
+                '/api/quote-requests/', {'status': 'pending'}),
+             'SELECT "operation_quoterequest"', 'quote_provider_status_idx'),
+            ('client_disputes', lambda: self.authenticated().get('/api/disputes/', {'status': 'open'}),
+             'SELECT "operation_dispute"', 'dispute_client_status_idx'),
+            ('provider_disputes', lambda: self.authenticated(provider.user).get(
+                '/api/disputes/', {'status': 'open'}),
+             'SELECT "operation_dispute"', 'dispute_provider_status_idx'),
+            ('nearby', lambda: self.api.get(
+                reverse('nearby-providers'), {'latitude': -8.83, 'longitude': 13.23, 'radius': 5}),
+             'SELECT "operation_provider"', 'provider_geohash_idx'),
+        ]
+
+    def authenticated(self, user=None):
+        api = APIClient()
+        api.force_authenticate(user or self.client_user)
+        return api
+
+    def test_endpoint_queries_use_new_indexes(self):
+        for name, call, statement, index in self.endpoint_calls():
+            with self.subTest(query=name):
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    response = call()
+                self.assertLess(response.status_code, 500)
+                sql = [query['sql'] for query in queries if query['sql'].startswith(statement)]
+                self.assertTrue(sql, f"{name} : aucune requête {statement}")
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN {sql[-1]}')
+                    plan = '\n'.join(row[0] for row in cursor.fetchall())
+                self.assertIn(index, plan, f"{name}:\n{sql[-1]}\n{plan}")
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Maison')
+        cls.subcategory = SubCategory.objects.create(category=cls.category, name='Plomberie')
+        cls.provider = make_provider(1, cls.subcategory)
+        cls.service = cls.provider.provider_services.get()
+        cls.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='secret'
+        )
+
+    def review(self, **ratings):
+        values = dict(quality_rating=5, punctuality_rating=5, value_rating=5)
+        values.update(ratings)
+        return Review.objects.create(
+            client=self.client_user, provider=self.provider, service=self.service,
+            comment='Bien', **values
+        )
+
+    def assertAggregates(self, obj, count, avg, quality):
+        obj.refresh_from_db()
+        self.assertEqual(obj.rating_count, count)
+        self.assertEqual(obj.avg_rating, Decimal(avg))
+        self.assertEqual(obj.quality_rating_sum, quality)
+
+    def test_create_update_delete(self):
+        first = self.review()
+        second = self.review(quality_rating=2, punctuality_rating=3, value_rating=4)
+        self.assertAggregates(self.provider, 2, '4.00', 7)
+        self.assertAggregates(self.service, 2, '4.00', 7)
+
+        second.quality_rating = 5
+        second.save()
+        self.assertAggregates(self.provider, 2, '4.50', 10)
+
+        first.delete()
+        self.assertAggregates(self.provider, 1, '4.00', 5)
+        second.delete()
+        self.assertAggregates(self.service, 0, '0.00', 0)
+
+    def test_rebuild_command(self):
+        self.review(quality_rating=1)
+        self.review(quality_rating=4)
+        Provider.objects.filter(pk=self.provider.pk).update(rating_count=0, avg_rating=0, quality_rating_sum=0)
+        call_command('rebuild_rating_aggregates', stdout=io.StringIO())
+        self.assertAggregates(self.provider, 2, '4.17', 5)
+        self.assertAggregates(self.service, 2, '4.17', 5)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Construção')
+        cls.subcategory = SubCategory.objects.create(category=cls.category, name='Canalização')
+        provider = make_provider(1)
+        ProviderService.objects.create(
+            provider=provider, subcategory=cls.subcategory,
+            title='Reparação de canalizações', description='Fugas de água e esgotos'
+        )
+        ProviderService.objects.create(
+            provider=make_provider(2), subcategory=cls.subcategory,
+            title='Pintura', description='Pintura de interiores, inclui reparação de paredes'
+        )
+        cls.provider = provider
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_query_is_required(self):
+        response = self.client.get(reverse('search'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_mixed_results(self):
+        response = self.client.get(reverse('search'), {'q': 'Société 1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(r['type'], r['data']['id']) for r in response.data['results']],
+            [('provider', self.provider.pk)]
+        )
+
+        response = self.client.get(reverse('search'), {'q': 'Pintura', 'type': 'services'})
+        self.assertEqual([r['type'] for r in response.data['results']], ['service'])
+
+    @skipUnless(connection.vendor == 'postgresql', "Recherche plein texte spécifique à PostgreSQL")
+    def test_ranking_stemming_and_accents(self):
+        # Sans accent, au singulier : le titre (poids A) passe devant la description (poids C)
+        response = self.client.get(reverse('search'), {'q': 'reparacao', 'type': 'services'})
+        self.assertEqual(
+            [r['data']['title'] for r in response.data['results']],
+            ['Reparação de canalizações', 'Pintura']
+        )
+        # Faute de frappe rattrapée par la similarité trigramme
+        response = self.client.get(reverse('providerservice-list'), {'search': 'Pintuta'})
+        self.assertEqual([s['title'] for s in response.data['results']], ['Pintura'])
+
+    def test_catalog_search(self):
+        response = self.client.get(reverse('subcategory-list'), {'search': 'Canaliza'})
+        self.assertEqual([s['id'] for s in response.data['results']], [self.subcategory.pk])
+
+    @skipUnless(connection.vendor == 'postgresql', "Recherche plein texte spécifique à PostgreSQL")
+    def test_catalog_search_ignores_accents_and_typos(self):
+        for term in ('construcao', 'Construcau'):
+            response = self.client.get(reverse('category-list'), {'search': term})
+            self.assertEqual([c['id'] for c in response.data['results']], [self.category.pk])
+        response = self.client.get(reverse('subcategory-list'), {'search': 'canalizacao'})
+        self.assertEqual([s['id'] for s in response.data['results']], [self.subcategory.pk])
+
+    @skipUnless(connection.vendor == 'postgresql', "Recherche plein texte spécifique à PostgreSQL")
+    def test_migration_vectors_match_search_module(self):
+        migration = importlib.import_module('operation.migrations.0015_full_text_search')
+        expected = {
+            model: dict(model.objects.values_list('pk', 'search_vector'))
+            for model in (ProviderService, Provider)
+        }
+        with connection.cursor() as cursor:
+            for sql in migration.BUILD_VECTORS_SQL:
+                cursor.execute(sql)
+        for model, vectors in expected.items():
+            self.assertEqual(dict(model.objects.values_list('pk', 'search_vector')), vectors)
+
+    @skipUnless(connection.vendor == 'postgresql', "Recherche plein texte spécifique à PostgreSQL")
+    def test_vectors_refreshed_with_one_update(self):
+        SubCategory.objects.filter(pk=self.subcategory.pk).update(name='Hidráulica')
+        with CaptureQueriesContext(connection) as queries:
+            updated = search.update_service_vectors(
+                ProviderService.objects.filter(subcategory=self.subcategory).values('pk')
+            )
+        self.assertEqual(updated, 2)
+        self.assertEqual(len(queries), 1)
+        response = self.client.get(reverse('search'), {'q': 'hidraulica', 'type': 'services'})
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class CatalogTreeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Maison')
+        cls.plumbing = SubCategory.objects.create(category=cls.category, name='Plomberie')
+        cls.painting = SubCategory.objects.create(category=cls.category, name='Peinture')
+        make_provider(1, cls.plumbing)
+        make_provider(2, cls.plumbing)
+        make_provider(3, cls.painting)
+        ProviderService.objects.filter(subcategory=cls.painting).update(is_available=False)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_tree_is_cached_and_revalidated(self):
+        url = reverse('catalog-tree')
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        category = next(c for c in response.data['categories'] if c['id'] == self.category.id)
+        self.assertEqual(category['service_count'], 2)
+        self.assertEqual(
+            [(s['name'], s['service_count']) for s in category['subcategories']],
+            [('Peinture', 0), ('Plomberie', 2)]
+        )
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_invalidated_by_service_changes(self):
+        url = reverse('catalog-tree')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            ProviderService.objects.filter(subcategory=self.plumbing).first().delete()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class CachedResponseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Maison')
+        cls.subcategory = SubCategory.objects.create(category=cls.category, name='Plomberie')
+        cls.provider = make_provider(1, cls.subcategory)
+        cls.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='secret'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+
+    def test_anonymous_reads_are_cached_and_invalidated(self):
+        url = f'/api/providers/{self.provider.id}/'
+        first = self.api.get(url)
+        with self.assertNumQueries(0):
+            second = self.api.get(url)
+        self.assertEqual(second.data, first.data)
+
+        # Une autre page est une autre entrée (COUNT, page, galerie, options)
+        with self.assertNumQueries(4):
+            self.api.get('/api/services/', {'page': 1})
+        with self.assertNumQueries(0):
+            self.api.get('/api/services/', {'page': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(
+                client=self.client_user, provider=self.provider, quality_rating=5,
+                punctuality_rating=5, value_rating=5, comment='Parfait'
+            )
+        response = self.api.get(url)
+        self.assertEqual(len(response.data['reviews']), 1)
+
+    def test_authenticated_reads_bypass_cache(self):
+        url = f'/api/providers/{self.provider.id}/'
+        self.api.get(url)
+        # update() n'émet pas de signal : seule une lecture hors cache voit le changement
+        Provider.objects.filter(pk=self.provider.pk).update(company_name='Nouveau nom')
+        self.assertEqual(self.api.get(url).data['company_name'], 'Société 1')
+
+        self.api.force_authenticate(self.client_user)
+        self.assertEqual(self.api.get(url).data['company_name'], 'Nouveau nom')
+
+    def test_renderer_is_part_of_the_key(self):
+        url = f'/api/providers/{self.provider.id}/'
+        etag = self.api.get(url)['ETag']
+        response = self.api.get(url, HTTP_ACCEPT='text/html')
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        self.assertNotEqual(response['ETag'], etag)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.api.get(url)['ETag'], etag)
+
+    def test_stampede_waits_for_the_lock_holder(self):
+        key = 'api:test:stampede'
+        cache.add(f'{key}:lock', 1)
+        threading.Timer(0.1, lambda: cache.set(key, 'calculé')).start()
+        compute = mock.Mock(return_value='recalculé')
+        self.assertEqual(caching.get_or_compute(key, compute), 'calculé')
+        compute.assert_not_called()
+
+
+    def test_cached_response_keeps_validators(self):
+        url = f'/api/providers/{self.provider.id}/'
+        etag = self.api.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Maison')
+        cls.subcategory = SubCategory.objects.create(category=category, name='Plomberie')
+        cls.provider = make_provider(1, cls.subcategory)
+        cls.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='secret'
+        )
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+
+    def test_not_modified_without_serialization(self):
+        url = f'/api/services/{ProviderService.objects.get().id}/'
+        response = self.api.get(url)
+        with mock.patch.object(ProviderServiceSerializer, 'to_representation') as to_representation:
+            # Le service, sa galerie et ses options, chargés comme pour la réponse
+            with self.assertNumQueries(3):
+                response = self.api.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        to_representation.assert_not_called()
+
+    def test_last_modified_only_without_related_sets(self):
+        category_url = f'/api/categories/{self.subcategory.category_id}/'
+        response = self.api.get(category_url)
+        self.assertEqual(
+            self.api.get(category_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+
+        # La galerie et les options du service ne changent pas son updated_at
+        service = ProviderService.objects.get()
+        url = f'/api/services/{service.id}/'
+        response = self.api.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertEqual(self.api.get(url, HTTP_IF_MODIFIED_SINCE=http_date()).status_code, 200)
+
+    def test_list_validators_follow_changes(self):
+        # Filtrée par catégorie : la sous-catégorie est sur la page (l'ETag ne dépend que de la page)
+        url = f'/api/subcategories/?category={self.subcategory.category_id}'
+        etag = self.api.get(url)['ETag']
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertFalse(self.api.get(url).has_header('Last-Modified'))
+
+        # La suppression d'un service change le nombre de services de la sous-catégorie
+        ProviderService.objects.get().delete()
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # L'ETag dépend de l'utilisateur
+        self.api.force_authenticate(self.provider.user)
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_conversation_inbox_is_conditional(self):
+        conversation = Conversation.objects.create(client=self.client_user, provider=self.provider)
+        url = f'/api/conversations/?user_id={self.client_user.id}'
+        etag = self.api.get(url)['ETag']
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Message.objects.create(conversation=conversation, sender=self.provider.user, content='Bonjour')
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['unread_count'], 1)
+
+
+class ProviderProfileQueryCountTests(TestCase):
+    """Le profil d'un prestataire est construit en un nombre fixe de requêtes."""
+    # prestataire + utilisateur, services, galeries, options, portfolio,
+    # certificats, avis récents, images des avis, favoris (validateur ETag)
+    QUERY_BUDGET = 9
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Maison')
+        subcategory = SubCategory.objects.create(category=category, name='Plomberie')
+        cls.provider = make_provider(1)
+        for i in range(20):
+            service = ProviderService.objects.create(
+                provider=cls.provider, subcategory=subcategory, title=f'Service {i}', description='...'
+            )
+            ServiceGalleryImage.objects.create(service=service, image=f'services/gallery/{i}.jpg')
+            ServiceOption.objects.create(service=service, name='Option')
+        for i in range(3):
+            Portfolio.objects.create(provider=cls.provider, title=f'Projet {i}', description='...')
+            Certificate.objects.create(
+                provider=cls.provider, title=f'Certificat {i}', issuing_organization='INEFOP',
+                issue_date='2024-01-01', file=f'certificates/{i}.pdf'
+            )
+        cls.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='secret'
+        )
+        for i in range(8):
+            review = Review.objects.create(
+                client=cls.client_user, provider=cls.provider, quality_rating=4,
+                punctuality_rating=4, value_rating=4, comment=f'Avis {i}'
+            )
+            ReviewImage.objects.create(review=review, image=f'review_images/{i}.jpg')
+        Favorite.objects.create(user=cls.client_user, provider=cls.provider)
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+
+    def test_retrieve_query_budget(self):
+        url = f'/api/providers/{self.provider.id}/'
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.api.get(url)
+        self.assertEqual(len(response.data['services']), 20)
+        self.assertEqual(len(response.data['reviews']), 5)
+        self.assertEqual(response.data['reviews'][0]['comment'], 'Avis 7')
+        self.assertFalse(response.data['is_favorited'])
+
+        self.api.force_authenticate(self.client_user)
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.api.get(url)
+        self.assertTrue(response.data['is_favorited'])
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media.name
+
+    def make_photo(self):
+        # Photo de téléphone 400x200 tournée via EXIF (orientation 6), avec des métadonnées
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Téléphone'
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_variants_generated_on_upload(self):
+        category = Category.objects.create(name='Maison')
+        subcategory = SubCategory.objects.create(category=category, name='Plomberie')
+        provider = make_provider(1)
+        service = ProviderService.objects.create(
+            provider=provider, subcategory=subcategory, title='Service',
+            description='...', image=self.make_photo()
+        )
+        self.assertEqual(tasks.run_pending(), 1)
+
+        for size, max_side in images.SIZES.items():
+            for fmt in images.FORMATS:
+                name = images.variant_name(service.image.name, size, fmt)
+                with Image.open(os.path.join(self.media_root, name)) as variant:
+                    # Orientation appliquée : le portrait est conservé, sans agrandissement
+                    self.assertEqual(variant.size, (min(max_side, 400) // 2, min(max_side, 400)))
+                    self.assertFalse(variant.getexif())
+
+        service.refresh_from_db()
+        self.assertEqual(service.variants_source, service.image.name)
+        # URLs construites à partir du modèle, sans interroger le stockage
+        with mock.patch.object(service.image.storage, 'exists') as exists:
+            response = APIClient().get(f'/api/services/{service.id}/')
+        exists.assert_not_called()
+        self.assertTrue(response.data['image_variants']['thumb']['webp'].endswith('photo_jpg_thumb.webp'))
+
+    def test_variant_names_keep_the_original_extension(self):
+        self.assertEqual(images.variant_name('service_images/photo.jpg', 'thumb', 'webp'),
+                         'service_images/photo_jpg_thumb.webp')
+        self.assertNotEqual(images.variant_name('service_images/photo.png', 'thumb', 'webp'),
+                            images.variant_name('service_images/photo.jpg', 'thumb', 'webp'))
+
+    def test_existing_variants_are_recorded_by_command(self):
+        category = Category.objects.create(name='Maison')
+        subcategory = SubCategory.objects.create(category=category, name='Plomberie')
+        service = ProviderService.objects.create(
+            provider=make_provider(1), subcategory=subcategory, title='Service',
+            description='...', image=self.make_photo()
+        )
+        images.generate_variants(service.image)
+        Task.objects.all().delete()
+
+        call_command('generate_image_variants', stdout=io.StringIO())
+        service.refresh_from_db()
+        self.assertEqual(service.variants_source, service.image.name)
+        self.assertFalse(APIClient().get(f'/api/services/{service.id}/').data['image_variants']['thumb']['webp']
+                         .endswith('photo.jpg'))
+
+
+class TaskQueueTests(TestCase):
+    def test_password_reset_email_is_queued(self):
+        user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        api = APIClient()
+        api.force_authenticate(user)
+        response = api.post(reverse('password_reset_request'), {'email': 'client@example.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(ResetPasswordCode.objects.get().code, mail.outbox[0].body)
+        self.assertEqual(Task.objects.get().status, 'done')
+
+    def test_idempotency_key(self):
+        first = tasks.enqueue('send_email', {'subject': 'a', 'message': 'b', 'recipients': []}, idempotency_key='k')
+        second = tasks.enqueue('send_email', {'subject': 'a', 'message': 'b', 'recipients': []}, idempotency_key='k')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_retries_with_backoff(self):
+        handler = mock.Mock(side_effect=ConnectionError('SMTP indisponible'))
+        with mock.patch.dict(tasks._registry, {'flaky': handler}):
+            task = tasks.enqueue('flaky', {'value': 1}, max_attempts=2)
+            with self.assertLogs('operation.tasks', 'WARNING'):
+                tasks.run_pending()
+            task.refresh_from_db()
+            self.assertEqual((task.status, task.attempts), ('pending', 1))
+            self.assertGreater(task.run_at, timezone.now() + tasks.backoff(1) - timezone.timedelta(seconds=5))
+            # Pas encore due
+            self.assertEqual(tasks.run_pending(), 0)
+
+            Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+            with self.assertLogs('operation.tasks', 'ERROR'):
+                tasks.run_pending()
+            task.refresh_from_db()
+            self.assertEqual((task.status, task.attempts), ('failed', 2))
+            self.assertIn('SMTP indisponible', task.last_error)
+        handler.assert_called_with(value=1)
+
+    def test_stale_task_fails_after_max_attempts(self):
+        handler = mock.Mock()
+        with mock.patch.dict(tasks._registry, {'crash': handler}):
+            task = tasks.enqueue('crash', max_attempts=2)
+            for attempt in (1, 2):
+                # Le worker meurt pendant l'exécution : la tâche reste « en cours »
+                self.assertEqual([t.attempts for t in tasks.claim('worker')], [attempt])
+                Task.objects.filter(pk=task.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+            with self.assertLogs('operation.tasks', 'ERROR'):
+                self.assertEqual(tasks.run_pending(), 0)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts, task.locked_by), ('failed', 2, ''))
+        handler.assert_not_called()
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_mode(self):
+        handler = mock.Mock()
+        with mock.patch.dict(tasks._registry, {'eager': handler}):
+            self.assertIsNone(tasks.enqueue('eager', {'value': 1}))
+        handler.assert_called_once_with(value=1)
+        self.assertFalse(Task.objects.exists())
+
+    def test_worker_survives_database_errors(self):
+        command = 'operation.management.commands.run_tasks'
+        outcomes = [DatabaseError('connexion perdue'), DatabaseError('connexion perdue'), 2, 0, KeyboardInterrupt]
+        with mock.patch(f'{command}.close_old_connections') as close, \
+                mock.patch(f'{command}.time.sleep') as sleep, \
+                mock.patch.object(tasks, 'run_pending', side_effect=outcomes), \
+                self.assertLogs(command, 'ERROR'):
+            out = io.StringIO()
+            call_command('run_tasks', '--sleep', '1', stdout=out)
+        self.assertIn('2 tâches traitées', out.getvalue())
+        # Connexions vérifiées à chaque tour, pause doublée après chaque erreur
+        self.assertGreaterEqual(close.call_count, len(outcomes))
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [1, 2, 1])
+
+        with mock.patch(f'{command}.close_old_connections'), \
+                mock.patch.object(tasks, 'run_pending', side_effect=DatabaseError('connexion perdue')):
+            with self.assertRaises(CommandError):
+                call_command('run_tasks', '--once', stdout=io.StringIO())
+
+
+class NotificationFanOutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider(1)
+        cls.provider_user = cls.provider.user
+        cls.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='secret'
+        )
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def unread(self, user):
+        user.refresh_from_db()
+        self.assertEqual(
+            user.unread_notification_count,
+            Notification.objects.filter(user=user, is_read=False).count()
+        )
+        return user.unread_notification_count
+
+    def test_events_are_notified_and_counted(self):
+        conversation = Conversation.objects.create(client=self.client_user, provider=self.provider)
+        Message.objects.create(conversation=conversation, sender=self.client_user, content='Bonjour')
+        Review.objects.create(
+            client=self.client_user, provider=self.provider, quality_rating=5,
+            punctuality_rating=5, value_rating=5, comment='Parfait'
+        )
+        Favorite.objects.create(user=self.client_user, provider=self.provider)
+        quote = QuoteRequest.objects.create(
+            client=self.client_user, provider=self.provider, subject='Devis', description='...'
+        )
+        self.assertEqual(
+            sorted(Notification.objects.filter(user=self.provider_user).values_list('type', flat=True)),
+            ['favorite', 'message', 'quote', 'review']
+        )
+        self.assertEqual(self.unread(self.provider_user), 4)
+
+        self.api.force_authenticate(self.provider_user)
+        self.api.post(f'/api/quote-requests/{quote.id}/update_status/', {'status': 'accepted'})
+        self.assertEqual(self.unread(self.client_user), 1)
+        self.assertEqual(self.unread(self.provider_user), 4)
+
+        with self.assertNumQueries(1):
+            response = self.api.get(reverse('notification-count'), {'user_id': self.provider_user.id})
+        self.assertEqual(response.data['count'], 4)
+
+    def test_read_actions_update_counter(self):
+        notifications.notify([self.client_user.id] * 3 + [self.provider_user.id], 'system', 'Info', '...')
+        for i in range(2):
+            notifications.notify([self.client_user.id], 'system', f'Info {i}', '...')
+        self.assertEqual(self.unread(self.client_user), 3)
+
+        self.api.force_authenticate(self.client_user)
+        first = Notification.objects.filter(user=self.client_user).first()
+        self.api.post(f'/api/notifications/{first.id}/mark_as_read/')
+        self.api.post(f'/api/notifications/{first.id}/mark_as_read/')
+        self.assertEqual(self.unread(self.client_user), 2)
+
+        self.api.post('/api/notifications/mark_all_as_read/')
+        self.assertEqual(self.unread(self.client_user), 0)
+        self.assertEqual(self.unread(self.provider_user), 1)
+
+    def test_unread_count_with_cached_identity(self):
+        cache.clear()
+        for i in range(2):
+            notifications.notify([self.client_user.id], 'system', f'Info {i}', '...')
+        authentication.load_identity(self.client_user.pk)
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.client_user)}')
+        # Identité en cache : seule la lecture du compteur touche la base
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/notifications/unread_count/')
+        self.assertEqual(response.data['count'], 2)
+
+    def test_large_fan_out_is_queued(self):
+        users = [make_provider(i).user_id for i in range(2, 6)]
+        with mock.patch.object(notifications, 'INLINE_LIMIT', 2):
+            notifications.notify(users, 'system', 'Maintenance', '...')
+        self.assertFalse(Notification.objects.exists())
+        tasks.run_pending()
+        self.assertEqual(Notification.objects.count(), 4)
+        self.assertEqual(User.objects.get(pk=users[0]).unread_notification_count, 1)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Maison')
+        cls.subcategory = SubCategory.objects.create(category=category, name='Plomberie')
+        cls.provider = make_provider(1, cls.subcategory)
+        cls.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='secret'
+        )
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+
+    def sync(self, **params):
+        response = self.api.get('/api/sync/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['resources']
+
+    def test_changes_and_deletions_since_cursor(self):
+        favorite = Favorite.objects.create(user=self.client_user, provider=self.provider)
+        notification = Notification.objects.get(user=self.provider.user)
+        own = Notification.objects.create(user=self.client_user, title='Info', content='...', type='system')
+
+        first = self.sync()
+        self.assertEqual(set(first), set(sync.RESOURCES))
+        self.assertEqual([row['id'] for row in first['favorites']['changed']], [favorite.id])
+        self.assertEqual([row['id'] for row in first['notifications']['changed']], [own.id])
+        self.assertEqual(len(first['services']['changed']), 1)
+
+        cursors = {name: data['cursor'] for name, data in first.items()}
+        unchanged = self.sync(**cursors)
+        self.assertTrue(all(not data['changed'] and not data['deleted'] for data in unchanged.values()))
+
+        notifications.mark_read(self.client_user.id)
+        favorite_id, service = favorite.id, ProviderService.objects.get()
+        service_id = service.id
+        favorite.delete()
+        notification.delete()
+        service.delete()
+        later = self.sync(**cursors)
+        self.assertEqual([row['id'] for row in later['notifications']['changed']], [own.id])
+        self.assertTrue(later['notifications']['changed'][0]['is_read'])
+        self.assertEqual(later['favorites']['deleted'], [favorite_id])
+        # La notification supprimée appartenait au prestataire
+        self.assertEqual(later['notifications']['deleted'], [])
+        self.assertEqual(later['services']['deleted'], [service_id])
+
+    def test_paginates_rows_sharing_a_timestamp(self):
+        for i in range(5):
+            Notification.objects.create(user=self.client_user, title=str(i), content='...', type='system')
+        Notification.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+
+        seen, cursor, has_more = [], '', True
+        while has_more:
+            data = self.sync(notifications=cursor, limit=2)['notifications']
+            seen += [row['id'] for row in data['changed']]
+            cursor, has_more = data['cursor'], data['has_more']
+        self.assertEqual(sorted(seen), list(Notification.objects.filter(user=self.client_user).values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_invalid_or_expired_cursor(self):
+        response = self.api.get('/api/sync/', {'favorites': 'pas-un-curseur'})
+        self.assertEqual(response.status_code, 400)
+
+        old = timezone.now() - timedelta(days=365)
+        data = self.sync(favorites=sync.encode_cursor((old, 0), (old, 0)))['favorites']
+        self.assertTrue(data['reset'])
+
+        Tombstone.objects.create(resource='favorites', object_id=1, owner_id=self.client_user.id, deleted_at=old)
+        self.assertEqual(sync.purge_tombstones(), 1)
+
+
+class RenderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Maison')
+        subcategory = SubCategory.objects.create(category=category, name='Plomberie')
+        for i in range(30):
+            make_provider(i, subcategory)
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+
+    def test_fast_renderer_matches_drf(self):
+        data = {
+            'price': Decimal('12.50'), 'when': timezone.now(), 'id': uuid.uuid4(),
+            'name': 'Luanda', 'nested': [{1: None}],
+        }
+        fast = renderers.FastJSONRenderer().render(data, 'application/json', {})
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data, 'application/json', {})))
+
+    def test_large_responses_are_compressed(self):
+        response = self.api.get('/api/providers/', {'page_size': 30}, HTTP_ACCEPT_ENCODING='gzip;q=1, identity;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['results']), 30)
+
+        small = self.api.get(reverse('search'), {'q': 'zzz'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+    def test_encoding_negotiation(self):
+        self.assertIsNone(middleware.choose_encoding('identity'))
+        self.assertIsNone(middleware.choose_encoding('gzip;q=0'))
+        self.assertEqual(middleware.choose_encoding('deflate, gzip;q=0.8'), 'gzip')
+        self.assertEqual(middleware.choose_encoding('br, gzip'), 'br' if middleware.brotli else 'gzip')
+
+    def test_breach_mitigations(self):
+        content = b'{"token": "secret"}' * 100
+        lengths = {len(middleware.compress(content, 'gzip', 100)) for _ in range(20)}
+        # Taille variable d'une réponse à l'autre, contenu intact
+        self.assertGreater(len(lengths), 1)
+        self.assertEqual(gzip.decompress(middleware.compress(content, 'gzip', 100)), content)
+
+        request = APIRequestFactory().post('/api/auth/login/', HTTP_ACCEPT_ENCODING='gzip')
+        response = HttpResponse(content, content_type='application/json')
+        response = middleware.CompressionMiddleware(lambda request: response)(request)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000, METRICS_TOKEN='secret-metrics', METRICS_FLUSH_INTERVAL=0)
+class LoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            cls.user = User.objects.create_user(
+                username='client', email='client@example.com', password='secret'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.url = reverse('login')
+
+    def login(self, password, email='client@example.com', **extra):
+        return self.api.post(self.url, {'email': email, 'password': password}, format='json', **extra)
+
+    def test_account_failures_are_throttled(self):
+        for _ in range(10):
+            self.assertEqual(self.login('mauvais').status_code, 400)
+        response = self.login('secret')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(response.has_header('Retry-After'))
+        # Un autre compte depuis la même adresse n'est pas bloqué
+        self.assertEqual(self.login('secret', email='autre@example.com').status_code, 404)
+
+    def test_failures_from_another_address_do_not_lock_the_owner(self):
+        for _ in range(10):
+            self.login('mauvais', REMOTE_ADDR='10.0.0.7')
+        self.assertEqual(self.login('secret', REMOTE_ADDR='10.0.0.7').status_code, 429)
+        self.assertEqual(self.login('secret', REMOTE_ADDR='10.0.0.8').status_code, 200)
+
+    def test_success_resets_account_failures(self):
+        for _ in range(9):
+            self.login('mauvais')
+        self.assertEqual(self.login('secret').status_code, 200)
+        for _ in range(9):
+            self.assertEqual(self.login('mauvais').status_code, 400)
+
+    def test_ip_throttle(self):
+        for i in range(30):
+            self.login('secret', email=f'inconnu{i}@example.com', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(self.login('secret', REMOTE_ADDR='10.0.0.1').status_code, 429)
+        self.assertEqual(self.login('secret', REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    def test_spoofed_forwarded_for_does_not_reset_ip_limit(self):
+        for i in range(30):
+            self.login('secret', email=f'inconnu{i}@example.com', REMOTE_ADDR='10.0.0.1',
+                       HTTP_X_FORWARDED_FOR=f'192.168.0.{i}')
+        response = self.login('secret', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='192.168.1.1')
+        self.assertEqual(response.status_code, 429)
+
+    def test_token_endpoint_is_throttled(self):
+        url = reverse('token_obtain_pair')
+        for _ in range(10):
+            response = self.api.post(url, {'username': 'client', 'password': 'mauvais'}, format='json')
+            self.assertEqual(response.status_code, 401)
+        response = self.api.post(url, {'username': 'client', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(response.has_header('Retry-After'))
+
+        cache.clear()
+        self.assertEqual(
+            self.api.post(url, {'username': 'client', 'password': 'secret'}, format='json').status_code, 200
+        )
+        for i in range(30):
+            self.api.post(url, {'username': f'inconnu{i}', 'password': 'x'}, format='json', REMOTE_ADDR='10.0.0.3')
+        response = self.api.post(
+            url, {'username': 'client', 'password': 'secret'}, format='json', REMOTE_ADDR='10.0.0.3'
+        )
+        self.assertEqual(response.status_code, 429)
+
+    def test_rehash_on_work_factor_change_and_metrics(self):
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.assertEqual(self.login('secret').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret-metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('password_hash_seconds_count{algorithm="pbkdf2_sha256",outcome="success"} 1',
+                      response.content.decode())
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_email_is_unique(self):
+        response = self.api.post(reverse('register'), {
+            'username': 'autre', 'password': 'secret', 'email': 'client@example.com',
+            'first_name': 'A', 'last_name': 'B',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.data)
+
+
+class CachedAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider(1)
+        cls.client_user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+
+    def setUp(self):
+        cache.clear()
+        self.backend = authentication.CachedJWTAuthentication()
+
+    def authenticate(self, user):
+        token = str(AccessToken.for_user(user))
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.backend.authenticate(request)[0]
+
+    def test_identity_is_resolved_without_queries(self):
+        with self.assertNumQueries(1):
+            self.authenticate(self.provider.user)
+        with self.assertNumQueries(0):
+            user = self.authenticate(self.provider.user)
+            self.assertEqual((user.pk, user.username, user.role), (self.provider.user.pk, 'provider1', 'provider'))
+            self.assertFalse(user.is_staff)
+            self.assertTrue(hasattr(user, 'provider_profile'))
+            self.assertEqual(user.provider_profile, self.provider)
+            self.assertIs(user.provider_profile.user, user)
+        # Les autres champs sont chargés ensemble à la première lecture
+        with self.assertNumQueries(1):
+            self.assertEqual((user.email, user.first_name), ('provider1@example.com', 'Prestataire'))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.provider_profile.company_name, 'Société 1')
+        self.authenticate(self.client_user)
+        with self.assertNumQueries(0):
+            self.assertFalse(hasattr(self.authenticate(self.client_user), 'provider_profile'))
+
+    def test_invalidated_when_identity_changes(self):
+        self.authenticate(self.client_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            provider = Provider.objects.create(user=self.client_user, company_name='Nouvelle')
+        self.assertEqual(self.authenticate(self.client_user).provider_profile, provider)
+
+        # Un champ hors identité ne vide pas le cache
+        self.client_user.last_login = timezone.now()
+        self.client_user.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            self.authenticate(self.client_user)
+
+        self.client_user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.client_user)
+
+
+class DashboardStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Plomberie')
+        cls.subcategory = SubCategory.objects.create(category=cls.category, name='Fuites')
+        cls.provider = make_provider(1, cls.subcategory)
+        cls.service = cls.provider.provider_services.get()
+        cls.client_user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        cls.admin = User.objects.create_user(username='admin', password='secret', is_staff=True, role='admin')
+        Review.objects.create(
+            client=cls.client_user, provider=cls.provider, service=cls.service, quality_rating=5,
+            punctuality_rating=4, value_rating=3, comment='Bien'
+        )
+        cls.disputes = [
+            Dispute.objects.create(client=cls.client_user, provider=cls.provider, title=f'Litige {i}', description='...')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def get_stats(self):
+        # Totaux, série quotidienne et noms des catégories, quelle que soit la taille des tables
+        with self.assertNumQueries(3):
+            response = self.api.get(reverse('dashboard-stats'), {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_rollups_follow_writes(self):
+        self.disputes[0].status = 'resolved'
+        self.disputes[0].save()
+        self.disputes[1].delete()
+        self.client_user.role = 'provider'
+        self.client_user.save(update_fields=['role'])
+
+        data = self.get_stats()
+        self.assertEqual(data['totals']['users'], 3)
+        self.assertEqual(data['totals']['disputes'], 2)
+        self.assertEqual(data['users_by_role'], {'client': 0, 'provider': 2, 'admin': 1})
+        self.assertEqual(data['disputes_by_status'], {'open': 1, 'under_review': 0, 'resolved': 1, 'closed': 0})
+        category = next(row for row in data['by_category'] if row['id'] == self.category.id)
+        self.assertEqual((category['services'], category['reviews']), (1, 1))
+        self.assertEqual(len(data['daily']['dates']), 7)
+        self.assertEqual(data['daily']['users'][-1], 3)
+        self.assertEqual(data['new_users_this_month'], 3)
+        self.assertEqual(data['user_registrations_by_month']['data'][-1], 3)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.service.delete()
+        expected = stats.dashboard(7)
+        DailyStat.objects.all().delete()
+        call_command('rebuild_daily_stats', '--all', stdout=io.StringIO())
+        self.assertEqual(stats.dashboard(7), expected)
+        self.assertEqual(expected['totals']['reviews'], 0)
+
+    def test_admin_only(self):
+        self.api.force_authenticate(self.client_user)
+        self.assertEqual(self.api.get(reverse('dashboard-stats')).status_code, 403)
+
+
+REPLICA = (settings.DATABASE_REPLICAS or [None])[0]
+
+
+@skipUnless(REPLICA, "Aucun réplica configuré (SECRETS['REPLICAS'])")
+class ReplicaRoutingTests(TransactionTestCase):
+    # Hors transaction de test : les lectures faites dans un bloc atomic restent sur le primaire
+    databases = {'default', REPLICA} if REPLICA else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        replicas._health.clear()
+        self.provider = make_provider(1)
+        self.client_user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.api = APIClient()
+
+    def read_databases(self, path, api=None, **params):
+        """Bases ayant servi des SELECT pendant la requête."""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = (api or self.api).get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return {
+            alias for alias, queries in (('default', primary), (REPLICA, replica))
+            if any(query['sql'].lstrip().upper().startswith('SELECT') for query in queries)
+        }
+
+    def test_safe_reads_go_to_replica(self):
+        self.assertEqual(self.read_databases('/api/categories/'), {REPLICA})
+        # Les vues qui l'exigent restent sur le primaire
+        self.api.force_authenticate(self.client_user)
+        self.assertEqual(self.read_databases(reverse('sync'), favorites=''), {'default'})
+
+    def test_writer_is_pinned_to_primary(self):
+        token = str(AccessToken.for_user(self.client_user))
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.read_databases('/api/favorites/')
+        self.assertEqual(self.read_databases('/api/categories/'), {REPLICA})
+
+        response = self.api.post('/api/favorites/toggle/', {'provider_id': self.provider.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.read_databases('/api/favorites/'), {'default'})
+        # Un autre client n'est pas concerné
+        self.assertEqual(self.read_databases('/api/categories/', api=APIClient(REMOTE_ADDR='10.0.0.9')), {REPLICA})
+
+        # Fin de la fenêtre d'épinglage (identité de l'utilisateur remise en cache)
+        cache.clear()
+        self.read_databases('/api/favorites/')
+        self.assertEqual(self.read_databases('/api/categories/'), {REPLICA})
+
+    def test_lagging_or_unreachable_replica_is_skipped(self):
+        with mock.patch.object(replicas, 'replica_lag', return_value=30.0):
+            self.assertEqual(self.read_databases('/api/categories/'), {'default'})
+        # Le résultat de la mesure est conservé REPLICA_LAG_CHECK_INTERVAL secondes
+        self.assertEqual(self.read_databases('/api/categories/'), {'default'})
+
+        replicas._health.clear()
+        with mock.patch.object(replicas, 'replica_lag', side_effect=DatabaseError('injoignable')):
+            self.assertEqual(self.read_databases('/api/categories/'), {'default'})
+        replicas._health.clear()
+        self.assertEqual(self.read_databases('/api/categories/'), {REPLICA})
+
+
+class ReplicaClientKeyTests(TestCase):
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1})
+    def test_anonymous_clients_behind_proxy_are_distinct(self):
+        factory = APIRequestFactory()
+
+        def key(forwarded_for):
+            return replicas.client_key(factory.get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=forwarded_for))
+
+        self.assertNotEqual(key('192.168.0.1'), key('192.168.0.2'))
+        # Seule l'entrée ajoutée par le proxy de confiance compte
+        self.assertEqual(key('1.2.3.4, 192.168.0.1'), key('192.168.0.1'))
+
+
+class StatementTimeoutTests(TestCase):
+    def test_timeout_per_view(self):
+        self.assertEqual(timeouts.view_timeout(resolve('/api/providers/nearby/').func), 2)
+        self.assertEqual(timeouts.view_timeout(resolve(reverse('search')).func), 2)
+        self.assertEqual(timeouts.view_timeout(resolve(reverse('dashboard-stats')).func), 30)
+        with self.settings(DATABASE_STATEMENT_TIMEOUT=7):
+            self.assertEqual(timeouts.view_timeout(resolve('/api/providers/').func), 7)
+
+    def test_canceled_query_returns_503(self):
+        class QueryCanceled(Exception):
+            pgcode = timeouts.QUERY_CANCELED
+
+        error = OperationalError('canceling statement due to statement timeout')
+        error.__cause__ = QueryCanceled()
+        with mock.patch.object(views.CategoryViewSet, 'list', side_effect=error):
+            response = self.client.get('/api/categories/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(timeouts.RETRY_AFTER))
+
+    def test_set_once_per_transaction(self):
+        class Connection:
+            in_atomic_block = True
+            statement_timeout_ms = statement_timeout_pending = None
+
+            def __init__(self):
+                self.run_on_commit = []
+                self.connection = mock.MagicMock()
+
+            def on_commit(self, func):
+                self.run_on_commit.append((set(), func, False))
+
+        fake = Connection()
+        wrapper = timeouts.StatementTimeout(fake, 2000)
+        execute = mock.Mock()
+        sets = fake.connection.cursor.return_value.__enter__.return_value.execute
+
+        wrapper(execute, 'SELECT 1', None, False, {})
+        wrapper(execute, 'SELECT 2', None, False, {})
+        self.assertEqual(sets.call_count, 1)
+
+        # Annulation : le SET est défait, il est reposé
+        fake.run_on_commit = []
+        wrapper(execute, 'SELECT 3', None, False, {})
+        self.assertEqual(sets.call_count, 2)
+
+        # Validation : le réglage reste en place pour la session
+        for _, func, _ in fake.run_on_commit:
+            func()
+        fake.in_atomic_block, fake.run_on_commit = False, []
+        wrapper(execute, 'SELECT 4', None, False, {})
+        self.assertEqual(sets.call_count, 2)
+        self.assertEqual(execute.call_count, 4)
+
+    @skipUnless(connection.vendor == 'postgresql', "statement_timeout est propre à PostgreSQL")
+    def test_timeout_is_set_on_session(self):
+        self.client.get(reverse('search'), {'q': 'plombier'})
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW statement_timeout')
+            self.assertEqual(cursor.fetchone()[0], '2s')
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Maison')
+        SubCategory.objects.create(category=category, name='Plomberie')
+        call_command(
+            'seed_data', '--providers=5', '--services=12', '--clients=4', '--reviews=20',
+            '--conversations=3', '--messages=10', stdout=io.StringIO(),
+        )
+
+    def test_seed_data_maintains_denormalized_fields(self):
+        self.assertEqual(Provider.objects.filter(geohash='').count(), 0)
+        self.assertEqual(sum(Provider.objects.values_list('rating_count', flat=True)), 20)
+        self.assertEqual(Message.objects.count(), 10)
+        for conversation in Conversation.objects.all():
+            last = conversation.messages.order_by('-created_at', '-id').first()
+            self.assertEqual(conversation.last_message_id, last.pk)
+            self.assertEqual(conversation.updated_at, last.created_at)
+            unread = conversation.messages.filter(is_read=False)
+            self.assertEqual(conversation.provider_unread_count, unread.filter(sender=conversation.client).count())
+        self.assertEqual(stats.dashboard()['totals']['reviews'], 20)
+        with self.assertRaises(CommandError):
+            call_command('seed_data', stdout=io.StringIO())
+
+    def test_report_and_baseline_comparison(self):
+        report, missing = benchmarks.run(requests=3, warmup=1)
+        self.assertEqual(missing, [])
+        self.assertEqual(set(report['scenarios']), {
+            'provider_list', 'provider_detail', 'nearby', 'search', 'conversation_inbox',
+            'conversation_messages', 'notification_count', 'login',
+        })
+        for result in report['scenarios'].values():
+            self.assertEqual(result['errors'], 0)
+            self.assertEqual(set(result['latency_ms']), {'p50', 'p95', 'p99', 'mean', 'max'})
+            self.assertGreater(result['bytes']['mean'], 0)
+        self.assertEqual(report['scenarios']['notification_count']['queries']['max'], 1)
+
+        self.assertEqual(benchmarks.compare(report, report), [])
+        slower = json.loads(json.dumps(report))
+        slower['scenarios']['search']['latency_ms']['p95'] *= 2
+        slower['scenarios']['login']['queries']['max'] += 1
+        regressions = benchmarks.compare(slower, report)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('search : p95'))
+
+    def test_percentile(self):
+        self.assertEqual(benchmarks.percentile(range(1, 101), 50), 50.5)
+        self.assertEqual(benchmarks.percentile([4.0], 99), 4.0)
+        self.assertIsNone(benchmarks.percentile([], 50))
+
+
+@override_settings(METRICS_TOKEN='secret-metrics', METRICS_FLUSH_INTERVAL=3600)
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Maison')
+        subcategory = SubCategory.objects.create(category=category, name='Plomberie')
+        cls.provider = make_provider(1, subcategory)
+        cls.client_user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        cls.conversation = Conversation.objects.create(client=cls.client_user, provider=cls.provider)
+        Message.objects.create(conversation=cls.conversation, sender=cls.client_user, content='Bonjour')
+
+    def setUp(self):
+        metrics.flush()
+        cache.clear()
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret-metrics')
+        return {
+            line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in response.content.decode().splitlines() if not line.startswith('#')
+        }
+
+    def test_observations_per_view_and_action(self):
+        url = f'/api/conversations/{self.conversation.pk}/messages/'
+        counter = benchmarks.QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.client.get(url, {'user_id': self.client_user.pk})
+        self.assertEqual(response.status_code, 200)
+        self.client.get('/api/providers/')
+        self.client.get('/introuvable/')
+
+        # Observations gardées par le worker jusqu'au report (ici à l'export)
+        self.assertIsNone(cache.get('metrics:http_request_db_queries:series'))
+        samples = self.scrape()
+        labels = 'view="ConversationViewSet.messages",method="GET"'
+        self.assertEqual(samples[f'http_request_duration_seconds_count{{{labels},status="2xx"}}'], 1)
+        self.assertEqual(samples[f'http_request_db_queries_sum{{{labels}}}'], counter.count)
+        self.assertGreater(samples[f'http_request_db_seconds_sum{{{labels}}}'], 0)
+        self.assertGreater(samples[f'http_request_serializer_seconds_sum{{{labels}}}'], 0)
+        self.assertEqual(samples[f'http_response_size_bytes_sum{{{labels}}}'], len(response.content))
+        self.assertEqual(samples['http_request_duration_seconds_count{view="ProviderViewSet.list",method="GET",status="2xx"}'], 1)
+        self.assertEqual(samples['http_request_duration_seconds_count{view="unmatched",method="GET",status="4xx"}'], 1)
+
+    def test_view_labels(self):
+        factory = APIRequestFactory()
+        for path, method, label in (
+            ('/providers/nearby/', 'get', 'NearbyProvidersView'),
+            ('/api/providers/nearby/', 'get', 'ProviderViewSet.nearby'),
+            ('/notifications/count/', 'get', 'get_notification_count'),
+            ('/api/auth/login/', 'post', 'LoginView'),
+            ('/api/services/', 'post', 'ProviderServiceViewSet.create'),
+        ):
+            request = getattr(factory, method)(path)
+            request.resolver_match = resolve(path)
+            self.assertEqual(instrumentation.view_label(request), label)
+
+    def test_nested_serializer_data_counted_once(self):
+        seen = []
+
+        class InnerSerializer(serializers.Serializer):
+            name = serializers.CharField()
+
+        class OuterSerializer(serializers.Serializer):
+            def to_representation(self, instance):
+                data = InnerSerializer({'name': instance}).data
+                seen.append(measure.serializing)
+                return data
+
+        measure = instrumentation.RequestMeasure()
+        token = instrumentation._current.set(measure)
+        try:
+            OuterSerializer('a').data
+        finally:
+            instrumentation._current.reset(token)
+        # Le serializer imbriqué n'a pas clos la mesure du serializer extérieur
+        self.assertEqual(seen, [True])
+        self.assertFalse(measure.serializing)
+        self.assertGreater(measure.serializer_seconds, 0)
@@ -0,0 +1,74 @@
+"""
+Limitation des tentatives de connexion, stockée dans le cache par défaut.
+
+- LoginIPThrottle : toutes les tentatives d'une même adresse IP (taux
+  `login_ip` de DEFAULT_THROTTLE_RATES). L'adresse est REMOTE_ADDR, ou
+  l'entrée de X-Forwarded-For ajoutée par le dernier des NUM_PROXIES
+  proxys de confiance : un X-Forwarded-For forgé ne change pas la clé.
+- LoginAccountThrottle : uniquement les échecs sur un même identifiant
+  depuis une même adresse IP (taux `login_account`). Les échecs d'un tiers
+  ne bloquent que sa propre adresse pour ce compte : le propriétaire, depuis
+  la sienne, se connecte normalement. Des essais répartis sur plusieurs
+  adresses restent bornés, adresse par adresse, par LoginIPThrottle. La vue appelle
+  `record_failure()` après un mot de passe refusé et `reset()` après une
+  connexion réussie ; elle désigne le champ identifiant par
+  `login_field` ('email' par défaut).
+"""
+import hashlib
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginIPThrottle(SimpleRateThrottle):
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginAccountThrottle(SimpleRateThrottle):
+    """
+    Échecs (identifiant, adresse IP) comptés sur une fenêtre fixe de `duration` secondes ouverte par le
+    premier échec : un compteur incrémenté atomiquement (cache.add puis
+    cache.incr), sans relire ni réécrire d'historique.
+    """
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        field = getattr(view, 'login_field', 'email')
+        login = request.data.get(field) if hasattr(request.data, 'get') else None
+        if not login or not isinstance(login, str):
+            return None
+        # Même adresse que LoginIPThrottle (NUM_PROXIES)
+        raw = f'{login.strip().lower()}|{self.get_ident(request)}'
+        ident = hashlib.sha256(raw.encode('utf-8')).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        return self.cache.get(self.key, 0) < self.num_requests
+
+    def wait(self):
+        # Fin de la fenêtre inconnue : au plus sa durée
+        return self.duration
+
+    def record_failure(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return
+        if self.cache.add(key, 1, self.duration):
+            return
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # Fenêtre expirée entre add() et incr()
+            self.cache.add(key, 1, self.duration)
+
+    def reset(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is not None:
+            self.cache.delete(key)
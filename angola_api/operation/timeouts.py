@@ -0,0 +1,127 @@
+"""
+Durée maximale des requêtes SQL exécutées pendant une requête HTTP
+(PostgreSQL).
+
+Chaque connexion utilisée par la requête reçoit un `statement_timeout`. La
+valeur vient de l'attribut `statement_timeout` (en secondes) de la vue, ou du
+paramètre de même nom passé à @action pour une action de viewset, et à défaut
+de settings.DATABASE_STATEMENT_TIMEOUT. None ou 0 : pas de limite.
+
+Le réglage est posé à la première requête SQL sur chaque connexion, et
+seulement s'il diffère de celui déjà en place : avec des connexions
+persistantes (CONN_MAX_AGE), le cas courant ne coûte aucun aller-retour. Un
+SET exécuté dans une transaction n'est posé qu'une fois : il reste en place
+jusqu'à la fin de la transaction, et après elle si elle est validée ; une
+annulation (ou celle du savepoint qui l'englobe) le défait, et il est alors
+reposé à la requête suivante. Les commandes et les tâches d'arrière-plan ne
+sont pas limitées.
+
+Une requête SQL interrompue par le serveur donne une réponse 503 avec
+Retry-After au lieu d'une erreur 500.
+"""
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import JsonResponse
+
+# SQLSTATE query_canceled (statement_timeout atteint)
+QUERY_CANCELED = '57014'
+RETRY_AFTER = 5
+
+
+@receiver(connection_created)
+def forget_statement_timeout(sender, connection, **kwargs):
+    # Nouvelle session : aucun réglage en place
+    connection.statement_timeout_ms = None
+    connection.statement_timeout_pending = None
+
+
+def current_timeout(connection):
+    """Réglage en place sur la session (en millisecondes), None s'il est inconnu."""
+    pending = getattr(connection, 'statement_timeout_pending', None)
+    if pending is not None:
+        milliseconds, committed = pending
+        # Le rappel on_commit disparaît si la transaction (ou le savepoint) est annulée
+        if connection.in_atomic_block and any(func is committed for _, func, _ in connection.run_on_commit):
+            return milliseconds
+        connection.statement_timeout_pending = None
+    return getattr(connection, 'statement_timeout_ms', None)
+
+
+def view_timeout(view_func):
+    """Limite en secondes de la vue résolue (None : pas de limite)."""
+    initkwargs = getattr(view_func, 'initkwargs', None) or {}
+    if initkwargs.get('statement_timeout') is not None:
+        return initkwargs['statement_timeout']
+    timeout = getattr(getattr(view_func, 'cls', view_func), 'statement_timeout', None)
+    if timeout is not None:
+        return timeout
+    return getattr(settings, 'DATABASE_STATEMENT_TIMEOUT', None)
+
+
+def is_statement_timeout(exc):
+    cause = exc.__cause__
+    code = getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)
+    return isinstance(exc, OperationalError) and code == QUERY_CANCELED
+
+
+class StatementTimeout:
+    """execute_wrapper qui met la session au réglage voulu avant la requête SQL."""
+
+    def __init__(self, connection, milliseconds):
+        self.connection = connection
+        self.milliseconds = milliseconds
+
+    def __call__(self, execute, sql, params, many, context):
+        connection = self.connection
+        if current_timeout(connection) != self.milliseconds:
+            # Curseur DB-API : le réglage ne compte pas parmi les requêtes de la vue
+            with connection.connection.cursor() as cursor:
+                cursor.execute(f'SET statement_timeout = {self.milliseconds:d}')
+            if connection.in_atomic_block:
+                # En place jusqu'à la fin de la transaction ; statement_timeout_ms garde la
+                # valeur de la session, rétablie si elle est annulée
+                milliseconds = self.milliseconds
+
+                def committed():
+                    connection.statement_timeout_ms = milliseconds
+
+                connection.on_commit(committed)
+                connection.statement_timeout_pending = (milliseconds, committed)
+            else:
+                connection.statement_timeout_ms = self.milliseconds
+        return execute(sql, params, many, context)
+
+
+class StatementTimeoutMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            request._statement_timeouts = stack
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stack = getattr(request, '_statement_timeouts', None)
+        if stack is None:
+            return None
+        milliseconds = int((view_timeout(view_func) or 0) * 1000)
+        for alias in connections:
+            connection = connections[alias]
+            if connection.vendor == 'postgresql':
+                stack.enter_context(connection.execute_wrapper(StatementTimeout(connection, milliseconds)))
+        return None
+
+    def process_exception(self, request, exception):
+        if not is_statement_timeout(exception):
+            return None
+        response = JsonResponse(
+            {"detail": "Le serveur met trop de temps à répondre, réessayez dans quelques instants."},
+            status=503,
+        )
+        response['Retry-After'] = str(RETRY_AFTER)
+        return response
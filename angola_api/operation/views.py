@@ -1,25 +1,31 @@
 from django.forms import ValidationError
 from django.shortcuts import render
-import math
 # Create your views here.
-from rest_framework import viewsets, generics, status, filters
+from rest_framework import viewsets, generics, status
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Q, Count, Avg
+from django.db import IntegrityError
+from django.http import HttpResponse, HttpResponseForbidden
+from django.db.models import Q, Count, Avg, Prefetch
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
 from datetime import timedelta
 from .models import QuoteRequest, ResetPasswordCode
 from rest_framework.views import APIView
-from django.core.mail import send_mail
 import random
 import string
 from django.conf import settings
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
 # from django.contrib.gis.geos import Point
 # from django.contrib.gis.measure import D
 # from django.contrib.gis.db.models.functions import Distance
@@ -31,12 +37,17 @@ from .models import (
 )
 from .serializers import (
     QuoteRequestSerializer, UserSerializer, UserUpdateSerializer, CategorySerializer, SubCategorySerializer,
-    ProviderListSerializer, ProviderDetailSerializer, ProviderServiceSerializer,
+    ProviderListSerializer, NearbyProviderSerializer, ProviderDetailSerializer, ProviderServiceSerializer,
     PortfolioSerializer, CertificateSerializer, ReviewSerializer,
     FavoriteSerializer, ConversationSerializer, MessageSerializer,
-    DisputeSerializer, DisputeEvidenceSerializer, NotificationSerializer,
+    DisputeSerializer, DisputeEvidenceSerializer, NotificationSerializer, OutgoingMessageSerializer,
     ReportSerializer, RegisterSerializer
 )
+from . import catalog, metrics, notifications, passwords, realtime, search, stats, sync, tasks
+from .caching import CachedResponseMixin
+from .conditional import ConditionalGetMixin
+from .throttles import LoginAccountThrottle, LoginIPThrottle
+from .pagination import MessageCursorPagination, NotificationCursorPagination, ReviewCursorPagination
 from .permissions import IsOwnerOrReadOnly, IsProviderOwner, IsClientOrProviderOwner
 
 User = get_user_model()
@@ -49,6 +60,8 @@ class StandardResultsSetPagination(PageNumberPagination):
 
 class LoginView(APIView):
     permission_classes = (AllowAny,)
+    # Tentatives par IP et échecs par compte, voir throttles.py
+    throttle_classes = (LoginIPThrottle, LoginAccountThrottle)
     """
     Vue pour la connexion avec email et mot de passe
     Retourne les informations utilisateur et les tokens
@@ -63,21 +76,24 @@ class LoginView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Chercher l'utilisateur par email
+        # Chercher l'utilisateur par email (contrainte d'unicité, voir User.Meta)
         try:
             user = User.objects.get(email=email)
         except User.DoesNotExist:
+            LoginAccountThrottle().record_failure(request, self)
             return Response(
                 {"detail": "Aucun compte trouvé avec cet email"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Vérifier le mot de passe
-        if not user.check_password(password):
+        # Vérifier le mot de passe (rehaché si la politique a changé)
+        if not passwords.check_password(user, password):
+            LoginAccountThrottle().record_failure(request, self)
             return Response(
                 {"detail": "Mot de passe incorrect"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        LoginAccountThrottle().reset(request, self)
         
         # Si l'utilisateur n'est pas actif
         if not user.is_active:
@@ -101,6 +117,21 @@ class LoginView(APIView):
         
         return Response(response_data, status=status.HTTP_200_OK)
     
+class TokenView(TokenObtainPairView):
+    """Jetons JWT par nom d'utilisateur et mot de passe, avec les limites de LoginView."""
+    throttle_classes = (LoginIPThrottle, LoginAccountThrottle)
+    login_field = User.USERNAME_FIELD
+
+    def post(self, request, *args, **kwargs):
+        try:
+            response = super().post(request, *args, **kwargs)
+        except AuthenticationFailed:
+            LoginAccountThrottle().record_failure(request, self)
+            raise
+        LoginAccountThrottle().reset(request, self)
+        return response
+
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
@@ -159,19 +190,12 @@ class PasswordResetRequestView(APIView):
         L'équipe Angola
         """
         
-        try:
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [email],
-                fail_silently=False,
-            )
-        except Exception as e:
-            return Response(
-                {"detail": f"Erreur lors de l'envoi de l'email: {str(e)}"}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        # Envoi en arrière-plan (commande run_tasks), avec nouvelles tentatives
+        tasks.enqueue(
+            'send_email',
+            {'subject': subject, 'message': message, 'recipients': [email]},
+            idempotency_key=f'password-reset:{reset_code.pk}',
+        )
         
         return Response(
             {"detail": "Code de réinitialisation envoyé"}, 
@@ -277,7 +301,7 @@ class PasswordResetConfirmView(APIView):
             {"detail": "Mot de passe réinitialisé avec succès"}, 
             status=status.HTTP_200_OK
         )
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
@@ -307,24 +331,27 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [search.FullTextSearchFilter]
     search_fields = ['name', 'description']
+    full_text_search = staticmethod(search.search_catalog)
     
     # def get_permissions(self):
     #     if self.action in ['create', 'update', 'partial_update', 'destroy']:
     #         return [IsAdminUser()]
     #     return [AllowAny()]
-class SubCategoryViewSet(viewsets.ModelViewSet):
+class SubCategoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SubCategory.objects.all()
     serializer_class = SubCategorySerializer
+    conditional_related_sets = ('providerservice',)
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, search.FullTextSearchFilter]
     filterset_fields = ['category']  # Permet de filtrer par category_id
     search_fields = ['name', 'description']
+    full_text_search = staticmethod(search.search_catalog)
     
     def get_queryset(self):
         queryset = SubCategory.objects.all()
@@ -346,15 +373,16 @@ class SubCategoryViewSet(viewsets.ModelViewSet):
     # Méthode pour fournir le nombre de services par sous-catégorie
     @action(detail=False, methods=['get'])
     def with_service_count(self, request):
-        queryset = self.get_queryset()
+        queryset = self.get_queryset().select_related('category').annotate(
+            service_count=Count('providerservice')
+        ).order_by('id')
         page = self.paginate_queryset(queryset)
         
         # Ajouter le nombre de services pour chaque sous-catégorie
         results = []
         for subcategory in (page or queryset):
-            service_count = ProviderService.objects.filter(subcategory=subcategory).count()
             subcategory_data = SubCategorySerializer(subcategory).data
-            subcategory_data['service_count'] = service_count
+            subcategory_data['service_count'] = subcategory.service_count
             results.append(subcategory_data)
             
         if page is not None:
@@ -367,18 +395,50 @@ class SubCategoryViewSet(viewsets.ModelViewSet):
     #         return [IsAdminUser()]
     #     return [AllowAny()]
 
-class ProviderViewSet(viewsets.ModelViewSet):
+# Au-delà de ce rayon, le préfiltrage par geohash ne réduit plus assez les lignes lues
+NEARBY_MAX_RADIUS_KM = 100
+NEARBY_MAX_LIMIT = 50
+
+
+def parse_nearby_params(query_params):
+    """
+    Paramètres d'une recherche de proximité : (latitude, longitude, rayon,
+    limit). Le rayon est ramené à NEARBY_MAX_RADIUS_KM et `limit` entre 1 et
+    NEARBY_MAX_LIMIT (None sans `limit` : réponse paginée). Lève ValueError
+    si les coordonnées ou le rayon sont absents ou invalides.
+    """
+    latitude = float(query_params.get('latitude', ''))
+    longitude = float(query_params.get('longitude', ''))
+    radius = float(query_params.get('radius', 10))
+    limit = query_params.get('limit')
+    limit = max(1, min(int(limit), NEARBY_MAX_LIMIT)) if limit else None
+    # Les comparaisons écartent aussi NaN
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and radius > 0):
+        raise ValueError("Coordonnées ou rayon invalides")
+    return latitude, longitude, min(radius, NEARBY_MAX_RADIUS_KM), limit
+
+
+class ProviderViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Provider.objects.all()
     serializer_class = ProviderListSerializer
     permission_classes = [AllowAny]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, search.FullTextSearchFilter]
     filterset_fields = ['is_verified', 'is_featured']
     search_fields = ['user__username', 'user__first_name', 'user__last_name', 'company_name']
+    full_text_search = staticmethod(search.search_providers)
+    cache_groups = ('providers',)
+    conditional_related_fields = ('user',)
+    conditional_related_sets = ('provider_services',)
+    # Limite SQL par action (paramètre de @action), voir timeouts.py
+    statement_timeout = None
     
 
     def get_queryset(self):
-        queryset = Provider.objects.all().order_by('user__username')
+        if self.action == 'retrieve':
+            return Provider.objects.with_profile_data(self.request.user)
+
+        queryset = Provider.objects.with_listing_data().order_by('user__username')
         
         # Filtrage par catégorie
         category_id = self.request.query_params.get('category_id')
@@ -392,6 +452,15 @@ class ProviderViewSet(viewsets.ModelViewSet):
             return ProviderDetailSerializer
         return ProviderListSerializer
     
+    def get_conditional_relations(self):
+        if self.action == 'retrieve':
+            # Le profil inclut services, portfolio, certificats, derniers avis et favori ; les
+            # agrégats des avis sont sur la ligne du prestataire
+            return self.conditional_related_fields, (
+                'provider_services', 'portfolio', 'certificates', 'recent_reviews', 'favorited_by'
+            )
+        return super().get_conditional_relations()
+    
     def get_permissions(self):
         if self.action in ['update', 'partial_update']:
             return [IsProviderOwner()]
@@ -405,7 +474,7 @@ class ProviderViewSet(viewsets.ModelViewSet):
         if not hasattr(user, 'provider_profile'):
             return Response({"detail": "You are not a provider"}, status=status.HTTP_400_BAD_REQUEST)
         
-        provider = user.provider_profile
+        provider = Provider.objects.with_profile_data(user).get(pk=user.provider_profile.pk)
         serializer = ProviderDetailSerializer(provider, context={'request': request})
         return Response(serializer.data)
     
@@ -462,9 +531,11 @@ class ProviderViewSet(viewsets.ModelViewSet):
             return Response({"detail": "category_id parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
         
         # Get providers that have services in this category
-        providers = Provider.objects.filter(
-            provider_services__subcategory__category_id=category_id
-        ).distinct()
+        providers = Provider.objects.with_listing_data().filter(
+            id__in=ProviderService.objects.filter(
+                subcategory__category_id=category_id
+            ).values('provider_id')
+        ).order_by('user__username')
         
         page = self.paginate_queryset(providers)
         if page is not None:
@@ -481,9 +552,11 @@ class ProviderViewSet(viewsets.ModelViewSet):
             return Response({"detail": "subcategory_id parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
         
         # Get providers that have services in this subcategory
-        providers = Provider.objects.filter(
-            provider_services__subcategory_id=subcategory_id
-        ).distinct()
+        providers = Provider.objects.with_listing_data().filter(
+            id__in=ProviderService.objects.filter(
+                subcategory_id=subcategory_id
+            ).values('provider_id')
+        ).order_by('user__username')
         
         page = self.paginate_queryset(providers)
         if page is not None:
@@ -509,62 +582,44 @@ class ProviderViewSet(viewsets.ModelViewSet):
         serializer = CategorySerializer(categories, many=True)
         return Response(serializer.data)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], statement_timeout=2)
     def nearby(self, request):
-        lat = request.query_params.get('latitude')
-        lng = request.query_params.get('longitude')
-        radius = request.query_params.get('radius', 10)  # Default 10km
-        
-        if not lat or not lng:
+        if not request.query_params.get('latitude') or not request.query_params.get('longitude'):
             return Response({"detail": "latitude and longitude parameters are required"}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            lat = float(lat)
-            lng = float(lng)
-            radius = float(radius)
+            lat, lng, radius, limit = parse_nearby_params(request.query_params)
         except ValueError:
             return Response({"detail": "Invalid coordinates or radius"}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Filtrer les prestataires avec latitude et longitude non nulles
-        providers = Provider.objects.filter(
-            longitude__isnull=False,
-            latitude__isnull=False
-        )
+        # Filtrage par geohash puis distance haversine calculée et triée en base
+        providers = Provider.objects.with_listing_data().nearby(lat, lng, radius)
         
-        # Calculer une zone approximative basée sur le rayon (approche simplifiée)
-        # 1 degré de latitude ≈ 111 km
-        # 1 degré de longitude ≈ 111 km * cos(latitude)
-        lat_radius = radius / 111.0
-        lng_radius = radius / (111.0 * math.cos(math.radians(lat)))
-        
-        providers = providers.filter(
-            latitude__gte=lat - lat_radius,
-            latitude__lte=lat + lat_radius,
-            longitude__gte=lng - lng_radius,
-            longitude__lte=lng + lng_radius
-        )
-        
-        # Tri par distance approximative (Pythagore)
-        providers = sorted(providers, key=lambda p: (
-            (p.latitude - lat) ** 2 + (p.longitude - lng) ** 2
-        ))
+        # Requête des k plus proches voisins : pas de pagination
+        if limit:
+            serializer = NearbyProviderSerializer(providers[:limit], many=True, context=self.get_serializer_context())
+            return Response(serializer.data)
         
         page = self.paginate_queryset(providers)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
+            serializer = NearbyProviderSerializer(page, many=True, context=self.get_serializer_context())
             return self.get_paginated_response(serializer.data)
         
-        serializer = self.get_serializer(providers, many=True)
+        serializer = NearbyProviderSerializer(providers, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
     
-class ProviderServiceViewSet(viewsets.ModelViewSet):
+class ProviderServiceViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ProviderService.objects.all()
     serializer_class = ProviderServiceSerializer
     permission_classes = [AllowAny]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, search.FullTextSearchFilter]
     filterset_fields = ['subcategory', 'is_available', 'price_type']
     search_fields = ['title', 'description']
+    full_text_search = staticmethod(search.search_services)
+    cache_groups = ('services',)
+    conditional_related_fields = ('subcategory', 'subcategory__category')
+    conditional_related_sets = ('gallery_images', 'options')
     
     def get_serializer_context(self):
         """
@@ -575,10 +630,13 @@ class ProviderServiceViewSet(viewsets.ModelViewSet):
         return context
 
     def get_queryset(self):
+        queryset = ProviderService.objects.select_related('subcategory__category').prefetch_related(
+            'gallery_images', 'options'
+        ).order_by('-created_at', '-id')
         provider_id = self.request.query_params.get('provider_id')
         if provider_id:
-            return ProviderService.objects.filter(provider_id=provider_id)
-        return ProviderService.objects.all()
+            return queryset.filter(provider_id=provider_id)
+        return queryset
     
     def perform_create(self, serializer):
         """
@@ -746,7 +804,7 @@ class ProviderServiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
-class PortfolioViewSet(viewsets.ModelViewSet):
+class PortfolioViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Portfolio.objects.all()
     serializer_class = PortfolioSerializer
     permission_classes = [IsAuthenticated]
@@ -778,7 +836,7 @@ class PortfolioViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(portfolio, many=True)
         return Response(serializer.data)
 
-class CertificateViewSet(viewsets.ModelViewSet):
+class CertificateViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Certificate.objects.all()
     serializer_class = CertificateSerializer
     permission_classes = [IsAuthenticated]
@@ -810,11 +868,14 @@ class CertificateViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(certificates, many=True)
         return Response(serializer.data)
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = ReviewCursorPagination
+    cache_groups = ('reviews',)
+    conditional_related_fields = ('client',)
+    conditional_related_sets = ('images',)
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['provider', 'service']
     
@@ -852,13 +913,16 @@ class ReviewViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(reviews, many=True)
         return Response(serializer.data)
 
-class FavoriteViewSet(viewsets.ModelViewSet):
+class FavoriteViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Favorite.objects.all()
     serializer_class = FavoriteSerializer
+    conditional_related_fields = ('provider', 'provider__user')
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Favorite.objects.filter(user=self.request.user)
+        return Favorite.objects.filter(user=self.request.user).order_by('-created_at').prefetch_related(
+            Prefetch('provider', queryset=Provider.objects.with_listing_data())
+        )
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -879,10 +943,12 @@ class FavoriteViewSet(viewsets.ModelViewSet):
             Favorite.objects.create(user=request.user, provider=provider)
             return Response({"status": "added to favorites"})
 
-class ConversationViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Conversation.objects.all().order_by('-updated_at')
     serializer_class = ConversationSerializer
+    conditional_related_fields = ('client', 'provider__user')
     permission_classes = [AllowAny]  # Pour accepter les requêtes avec userId
+    max_message_batch = 100
     
     def get_queryset(self):
         # Récupérer l'ID utilisateur de la requête
@@ -893,32 +959,24 @@ class ConversationViewSet(viewsets.ModelViewSet):
             
         try:
             user_id = int(user_id)
-            user = User.objects.get(id=user_id)
+            user = User.objects.select_related('provider_profile').get(id=user_id)
         except (ValueError, User.DoesNotExist):
             return Conversation.objects.none()
             
         # Vérifier si l'utilisateur est un prestataire ou un client
+        queryset = Conversation.objects.select_related('client', 'provider__user', 'last_message')
         if hasattr(user, 'provider_profile'):
-            return Conversation.objects.filter(provider=user.provider_profile)
+            return queryset.filter(provider=user.provider_profile)
         else:
-            return Conversation.objects.filter(client=user)
+            return queryset.filter(client=user)
     
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        page = self.paginate_queryset(queryset)
-        
-        user_id = request.query_params.get('user_id')
+    def get_serializer_context(self):
+        # Compteur de non-lus et dernier message vus par l'utilisateur `user_id`
+        context = super().get_serializer_context()
+        user_id = self.request.query_params.get('user_id')
         if user_id:
-            context = {'user_id': user_id}
-        else:
-            context = {}
-        
-        if page is not None:
-            serializer = self.get_serializer(page, many=True, context=context)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(queryset, many=True, context=context)
-        return Response(serializer.data)
+            context['user_id'] = user_id
+        return context
     
     @action(detail=True, methods=['get'])
     def messages(self, request, pk=None):
@@ -944,35 +1002,15 @@ class ConversationViewSet(viewsets.ModelViewSet):
         
         # Marquer les messages comme lus pour cet utilisateur
         # (tous les messages envoyés par l'autre personne)
-        if hasattr(user, 'provider_profile') and conversation.provider.id == user.provider_profile.id:
-            # L'utilisateur est le prestataire, marquer les messages du client comme lus
-            Message.objects.filter(
-                conversation=conversation,
-                sender=conversation.client,
-                is_read=False
-            ).update(is_read=True)
-        else:
-            # L'utilisateur est le client, marquer les messages du prestataire comme lus
-            Message.objects.filter(
-                conversation=conversation,
-                sender=conversation.provider.user,
-                is_read=False
-            ).update(is_read=True)
-        
-        # Mettre à jour la date de la conversation
-        conversation.updated_at = timezone.now()
-        conversation.save()
+        conversation.mark_read_by(user.id)
         
-        # Récupérer les messages
-        messages = conversation.messages.all().order_by('created_at')
-        page = self.paginate_queryset(messages)
+        # Récupérer les messages (pagination par curseur : before / after / since)
+        messages = conversation.messages.select_related('sender')
+        paginator = MessageCursorPagination()
+        page = paginator.paginate_queryset(messages, request, view=self)
         
-        if page is not None:
-            serializer = MessageSerializer(page, many=True, context={'user_id': user_id})
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = MessageSerializer(messages, many=True, context={'user_id': user_id})
-        return Response(serializer.data)
+        serializer = MessageSerializer(page, many=True, context={'user_id': user_id})
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def send_message(self, request, pk=None):
@@ -1000,20 +1038,74 @@ class ConversationViewSet(viewsets.ModelViewSet):
         ):
             return Response({"detail": "Accès non autorisé"}, status=status.HTTP_403_FORBIDDEN)
         
-        # Créer le message
+        # Créer le message (la conversation est mise à jour par Message.save)
         message = Message.objects.create(
             conversation=conversation,
             sender=user,
             content=content
         )
         
-        # Mettre à jour la date de la conversation
-        conversation.updated_at = timezone.now()
-        conversation.save()
-        
         serializer = MessageSerializer(message, context={'user_id': user_id})
         return Response(serializer.data)
     
+    @action(detail=True, methods=['post'])
+    def send_messages(self, request, pk=None):
+        """
+        Envoi groupé de messages (y compris ceux mis en attente hors ligne) :
+        {"user_id", "messages": [{"client_message_id", "content"}], "read_up_to"}.
+        Les messages sont insérés en une requête, les renvois d'un même
+        client_message_id sont ignorés et la conversation n'est mise à jour
+        qu'une fois. `read_up_to` marque comme lus les messages reçus jusqu'à
+        cet id.
+        """
+        user_id = request.data.get('user_id')
+        items = request.data.get('messages') or []
+        read_up_to = request.data.get('read_up_to')
+        
+        if not user_id or (not items and read_up_to is None):
+            return Response(
+                {"detail": "user_id et messages (ou read_up_to) sont requis"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.max_message_batch:
+            return Response(
+                {"detail": f"{self.max_message_batch} messages au maximum par envoi"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        items_serializer = OutgoingMessageSerializer(data=items, many=True)
+        items_serializer.is_valid(raise_exception=True)
+        
+        try:
+            user_id = int(user_id)
+            read_up_to = int(read_up_to) if read_up_to is not None else None
+            user = User.objects.select_related('provider_profile').get(id=user_id)
+        except (ValueError, TypeError, User.DoesNotExist):
+            return Response({"detail": "Utilisateur non trouvé"}, status=status.HTTP_404_NOT_FOUND)
+        
+        conversation = self.get_object()
+        if not conversation.is_participant(user):
+            return Response({"detail": "Accès non autorisé"}, status=status.HTTP_403_FORBIDDEN)
+        
+        messages, created = [], []
+        if items_serializer.validated_data:
+            try:
+                messages, created = conversation.add_messages(user, items_serializer.validated_data)
+            except IntegrityError:
+                # Même lot renvoyé en parallèle : les messages existent désormais
+                messages, created = conversation.add_messages(user, items_serializer.validated_data)
+            notifications.messages_created(conversation, created)
+        
+        read_count = 0
+        if read_up_to is not None:
+            read_count = conversation.mark_read_by(user.id, up_to=read_up_to)
+        
+        serializer = MessageSerializer(messages, many=True, context={'user_id': user_id})
+        return Response({
+            "messages": serializer.data,
+            "created": len(created),
+            "read_count": read_count,
+        })
+    
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         user_id = request.data.get('user_id')
@@ -1037,20 +1129,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Accès non autorisé"}, status=status.HTTP_403_FORBIDDEN)
         
         # Marquer les messages comme lus
-        if hasattr(user, 'provider_profile') and conversation.provider.id == user.provider_profile.id:
-            # L'utilisateur est le prestataire, marquer les messages du client comme lus
-            count = Message.objects.filter(
-                conversation=conversation,
-                sender=conversation.client,
-                is_read=False
-            ).update(is_read=True)
-        else:
-            # L'utilisateur est le client, marquer les messages du prestataire comme lus
-            count = Message.objects.filter(
-                conversation=conversation,
-                sender=conversation.provider.user,
-                is_read=False
-            ).update(is_read=True)
+        count = conversation.mark_read_by(user.id)
         
         return Response({"count": count, "status": "success"})
     
@@ -1097,9 +1176,6 @@ class ConversationViewSet(viewsets.ModelViewSet):
                 sender=user,
                 content=initial_message
             )
-            # Mettre à jour la date de la conversation
-            conversation.updated_at = timezone.now()
-            conversation.save()
         
         serializer = ConversationSerializer(conversation, context={'user_id': user_id})
         return Response(serializer.data)
@@ -1114,13 +1190,12 @@ def get_notification_count(request):
     
     try:
         user_id = int(user_id)
-        user = User.objects.get(id=user_id)
         
-        # Compte les notifications non lues pour cet utilisateur
-        count = Notification.objects.filter(user=user, is_read=False).count()
+        # Compteur dénormalisé : lecture par clé primaire
+        count = notifications.unread_count(user_id)
         
         return Response({"count": count}, status=status.HTTP_200_OK)
-    except (ValueError, User.DoesNotExist):
+    except ValueError:
         return Response({"count": 0}, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
@@ -1135,19 +1210,23 @@ def mark_all_notifications_read(request):
         user_id = int(user_id)
         user = User.objects.get(id=user_id)
         
-        # Marque toutes les notifications comme lues
-        count = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+        # Marque toutes les notifications comme lues et remet le compteur à jour
+        count = notifications.mark_read(user.id)
         
         return Response({"count": count, "status": "success"}, status=status.HTTP_200_OK)
     except (ValueError, User.DoesNotExist):
         return Response({"detail": "Utilisateur non trouvé"}, status=status.HTTP_404_NOT_FOUND)
 
   
-class DisputeViewSet(viewsets.ModelViewSet):
+class DisputeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Dispute.objects.all()
     serializer_class = DisputeSerializer
+    conditional_related_fields = ('client', 'provider__user', 'service')
+    conditional_related_sets = ('evidence',)
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+    # Filtre ?status= servi par les index (client|provider, status)
+    filterset_fields = ['status']
     
     def get_queryset(self):
         user = self.request.user
@@ -1176,6 +1255,10 @@ class DisputeViewSet(viewsets.ModelViewSet):
             description=description,
             file=file
         )
+        notifications.dispute_updated(
+            dispute, f"{request.user.username} a ajouté une preuve au litige « {dispute.title} »",
+            actor_id=request.user.id,
+        )
         
         serializer = DisputeEvidenceSerializer(evidence)
         return Response(serializer.data)
@@ -1195,37 +1278,46 @@ class DisputeViewSet(viewsets.ModelViewSet):
         dispute.status = status_value
         dispute.resolution_note = resolution_note
         dispute.save()
+        notifications.dispute_updated(
+            dispute, f"« {dispute.title} » : {dispute.get_status_display()}", actor_id=request.user.id
+        )
         
         serializer = self.get_serializer(dispute)
         return Response(serializer.data)
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NotificationCursorPagination
     
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user).order_by('-created_at')
     
+    def perform_update(self, serializer):
+        was_read = serializer.instance.is_read
+        notification = serializer.save()
+        if notification.is_read != was_read:
+            notifications.adjust_unread(notification.user_id, -1 if notification.is_read else 1)
+    
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        notifications.mark_read(request.user.id, [notification.pk])
         return Response({"status": "marked as read"})
     
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
-        notifications = self.get_queryset().filter(is_read=False)
-        notifications.update(is_read=True)
+        notifications.mark_read(request.user.id)
         return Response({"status": "all notifications marked as read"})
     
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
-        count = self.get_queryset().filter(is_read=False).count()
-        return Response({"count": count})
+        # Une requête sur la clé primaire : l'utilisateur authentifié est une instance
+        # partielle (voir authentication.py) qui ne porte pas le compteur
+        return Response({"count": notifications.unread_count(request.user.pk)})
 
-class ReportViewSet(viewsets.ModelViewSet):
+class ReportViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Report.objects.all()
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
@@ -1257,10 +1349,13 @@ class ReportViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(report)
         return Response(serializer.data)
     
-class QuoteRequestViewSet(viewsets.ModelViewSet):
+class QuoteRequestViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = QuoteRequest.objects.all()
     serializer_class = QuoteRequestSerializer
+    conditional_related_fields = ('client', 'provider__user', 'service')
     # permission_classes = [IsAuthenticated]
+    # Filtre ?status= servi par les index (client|provider, status)
+    filterset_fields = ['status']
     
     def get_queryset(self):
         user = self.request.user
@@ -1286,8 +1381,11 @@ class QuoteRequestViewSet(viewsets.ModelViewSet):
         # Vérifier que l'utilisateur est autorisé à modifier le statut
         user = request.user
         if hasattr(user, 'provider_profile') and quote_request.provider == user.provider_profile:
+            changed = quote_request.status != status_value
             quote_request.status = status_value
             quote_request.save()
+            if changed:
+                notifications.quote_status_changed(quote_request, actor_id=user.id)
             serializer = self.get_serializer(quote_request)
             return Response(serializer.data)
         else:
@@ -1304,9 +1402,11 @@ class ProviderByCategoryView(generics.ListAPIView):
             return Provider.objects.none()
             
         # Récupérer les prestataires qui ont des services dans cette catégorie
-        return Provider.objects.filter(
-            provider_services__subcategory__category_id=category_id
-        ).distinct()
+        return Provider.objects.with_listing_data().filter(
+            id__in=ProviderService.objects.filter(
+                subcategory__category_id=category_id
+            ).values('provider_id')
+        ).order_by('user__username')
 
 class ProviderBySubcategoryView(generics.ListAPIView):
     serializer_class = ProviderListSerializer
@@ -1317,48 +1417,190 @@ class ProviderBySubcategoryView(generics.ListAPIView):
         if not subcategory_id:
             return Provider.objects.none()
             
-        return Provider.objects.filter(
-            provider_services__subcategory_id=subcategory_id
-        ).distinct()
+        return Provider.objects.with_listing_data().filter(
+            id__in=ProviderService.objects.filter(
+                subcategory_id=subcategory_id
+            ).values('provider_id')
+        ).order_by('user__username')
 
 class NearbyProvidersView(generics.ListAPIView):
-    serializer_class = ProviderListSerializer
+    serializer_class = NearbyProviderSerializer
     permission_classes = [AllowAny]
+    statement_timeout = 2
     
     def get_queryset(self):
-        latitude = self.request.query_params.get('latitude')
-        longitude = self.request.query_params.get('longitude')
-        radius = self.request.query_params.get('radius', 10.0)
-        
-        if not latitude or not longitude:
-            return Provider.objects.none()
-            
         try:
-            latitude = float(latitude)
-            longitude = float(longitude)
-            radius = float(radius)
-        except (ValueError, TypeError):
+            latitude, longitude, radius, _ = parse_nearby_params(self.request.query_params)
+        except ValueError:
             return Provider.objects.none()
         
-        # Si vous utilisez PostgreSQL avec PostGIS, vous pouvez utiliser une requête géospatiale.
-        # Sinon, vous pouvez faire une approximation avec des calculs sur les coordonnées.
-        
-        # Filtrer les prestataires avec latitude et longitude non nulles
-        providers = Provider.objects.filter(
-            longitude__isnull=False,
-            latitude__isnull=False
-        )
-        
-        # Calculer une zone approximative basée sur le rayon (approche simplifiée)
-        # 1 degré de latitude ≈ 111 km
-        # 1 degré de longitude ≈ 111 km * cos(latitude)
-        import math
-        lat_radius = radius / 111.0
-        lng_radius = radius / (111.0 * math.cos(math.radians(latitude)))
-        
-        return providers.filter(
-            latitude__gte=latitude - lat_radius,
-            latitude__lte=latitude + lat_radius,
-            longitude__gte=longitude - lng_radius,
-            longitude__lte=longitude + lng_radius
-        )
\ No newline at end of file
+        # Filtrage par geohash puis distance haversine calculée et triée en base
+        return Provider.objects.with_listing_data().nearby(latitude, longitude, radius)
+    
+    def list(self, request, *args, **kwargs):
+        try:
+            limit = parse_nearby_params(request.query_params)[3]
+        except ValueError:
+            limit = None
+        if limit:
+            # Les k plus proches voisins, sans pagination (comme /api/providers/nearby/)
+            serializer = self.get_serializer(self.get_queryset()[:limit], many=True)
+            return Response(serializer.data)
+        return super().list(request, *args, **kwargs)
+
+
+class SearchView(APIView):
+    """
+    Recherche globale : services et prestataires classés ensemble par pertinence.
+
+    Paramètres: `q` (obligatoire), `type` (services, providers ou les deux
+    séparés par une virgule), `limit` (20 par défaut, 50 au maximum).
+    """
+    permission_classes = [AllowAny]
+    statement_timeout = 2
+    default_limit = 20
+    max_limit = 50
+    result_types = ('services', 'providers')
+
+    def get(self, request):
+        term = request.query_params.get('q', '').strip()
+        if not term:
+            return Response({"detail": "Le paramètre q est requis"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except (TypeError, ValueError):
+            limit = self.default_limit
+        limit = max(1, min(limit, self.max_limit))
+        types = request.query_params.get('type')
+        types = [t for t in types.split(',') if t in self.result_types] if types else self.result_types
+
+        context = {'request': request}
+        results = []
+        if 'services' in types:
+            services = search.search_services(
+                ProviderService.objects.filter(is_available=True).select_related('subcategory__category')
+                .prefetch_related('gallery_images', 'options'),
+                term,
+            )[:limit]
+            for service in services:
+                results.append({
+                    'type': 'service',
+                    'score': service.score,
+                    'provider_id': service.provider_id,
+                    'data': ProviderServiceSerializer(service, context=context).data,
+                })
+        if 'providers' in types:
+            providers = search.search_providers(Provider.objects.with_listing_data(), term)[:limit]
+            for provider in providers:
+                results.append({
+                    'type': 'provider',
+                    'score': provider.score,
+                    'data': ProviderListSerializer(provider, context=context).data,
+                })
+
+        # Tri stable : à score égal, l'ordre de chaque type est conservé
+        results.sort(key=lambda result: result['score'], reverse=True)
+        return Response({'query': term, 'count': len(results[:limit]), 'results': results[:limit]})
+
+
+class CatalogTreeView(APIView):
+    """
+    Catégories, sous-catégories et nombre de services disponibles en une seule
+    réponse, servie depuis le cache et revalidable via ETag / Last-Modified.
+    """
+    permission_classes = [AllowAny]
+    # Reconstruite juste après une invalidation et gardée 24 h : lue sur le primaire
+    replica_reads = False
+
+    def get(self, request):
+        tree = catalog.get_tree()
+        etag = f'"{tree["version"]}"'
+        last_modified = tree['last_modified'].timestamp()
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = Response({'version': tree['version'], 'categories': tree['categories']})
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Toujours revalider : le catalogue change rarement mais sans préavis
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+
+class SyncView(APIView):
+    """
+    Synchronisation incrémentale pour l'application mobile.
+
+    Chaque ressource demandée est passée en paramètre avec le curseur reçu
+    lors de la synchro précédente (vide pour une première synchro) :
+    `?conversations=<curseur>&favorites=`. Sans paramètre, toutes les
+    ressources sont synchronisées depuis le début. `limit` (200 par défaut,
+    500 au maximum) borne le nombre de lignes par ressource.
+    """
+    permission_classes = [IsAuthenticated]
+    # Le curseur avance jusqu'à "maintenant" : un réplica en retard ferait sauter des lignes
+    replica_reads = False
+
+    def get(self, request):
+        requested = [name for name in sync.RESOURCES if name in request.query_params] or list(sync.RESOURCES)
+        try:
+            limit = int(request.query_params.get('limit', sync.DEFAULT_LIMIT))
+        except (TypeError, ValueError):
+            limit = sync.DEFAULT_LIMIT
+        limit = max(1, min(limit, sync.MAX_LIMIT))
+
+        context = {'request': request, 'user_id': request.user.id}
+        resources = {}
+        for name in requested:
+            try:
+                resources[name] = sync.changes(
+                    sync.RESOURCES[name], request.user, request.query_params.get(name) or None, limit, context
+                )
+            except ValueError as exc:
+                return Response({"detail": f"{name} : {exc}"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'resources': resources})
+
+
+class DashboardStatsView(APIView):
+    """
+    Statistiques du tableau de bord d'administration, lues dans les agrégats
+    quotidiens (voir stats.py). `days` (30 par défaut, 365 au maximum) fixe
+    la longueur de la série quotidienne.
+    """
+    permission_classes = [IsAdminUser]
+    # Console d'administration : budget plus large que les vues publiques
+    statement_timeout = 30
+
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', stats.DEFAULT_DAYS))
+        except (TypeError, ValueError):
+            days = stats.DEFAULT_DAYS
+        days = max(1, min(days, stats.MAX_DAYS))
+        return Response(stats.dashboard(days))
+
+
+class StreamTicketView(APIView):
+    """
+    Ticket à usage unique pour ouvrir le flux temps réel avec EventSource
+    (`/api/stream/?ticket=...`), qui ne peut pas envoyer d'en-tête
+    Authorization (voir realtime.py).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        ticket, expires_in = realtime.issue_ticket(request.user.pk)
+        return Response({'ticket': ticket, 'expires_in': expires_in})
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Métriques au format texte de Prometheus (voir metrics.py). L'accès
+    demande l'en-tête `Authorization: Bearer <settings.METRICS_TOKEN>` ;
+    sans jeton configuré, l'endpoint est fermé.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token or not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')